@@ -1,5 +1,6 @@
 import 'package:flutter/material.dart';
 import '../services/api_service.dart';
+import '../services/sync_service.dart';
 
 class DataScreen extends StatefulWidget {
   const DataScreen({super.key});
@@ -73,8 +74,10 @@ class _DataScreenState extends State<DataScreen> {
           endpoint = '/data/monthly';
           break;
         case 4:
-          endpoint = '/data/yearly';
-          break;
+          await SyncService.pull();
+          setState(() => _periodRecords = SyncService.records);
+          setState(() => _isLoading = false);
+          return;
         default:
           endpoint = '/data/weekly';
       }
@@ -37,7 +37,8 @@ class _PomodoroScreenState extends State<PomodoroScreen> {
   Future<void> _fetchStats() async {
     try {
       final response = await ApiService.get('/data/daily');
-      final sessions = response['pomodoro_sessions'] as List? ?? [];
+      final sessions = (response['pomodoro_sessions'] as List? ?? [])
+          .where((s) => s['session_type'] != 'break').toList();
       setState(() {
         _completedCount = sessions.where((s) => s['status'] == 'completed').length;
         _totalMinutes = sessions.fold(0, (sum, s) => sum + (s['actual_duration_minutes'] as int? ?? 0));
@@ -67,6 +68,10 @@ class _PomodoroScreenState extends State<PomodoroScreen> {
         }
         return;
       }
+    } else {
+      try {
+        await ApiService.post('/pomodoro/resume', {'session_id': _sessionId});
+      } catch (_) {}
     }
     
     setState(() => _isRunning = true);
@@ -80,14 +85,24 @@ class _PomodoroScreenState extends State<PomodoroScreen> {
     });
   }
   
-  void _pauseTimer() {
+  void _stopTicking() {
     setState(() => _isRunning = false);
     _timer?.cancel();
     _timer = null;
   }
   
+  // The server expires sessions on its own, so it has to know the clock is stopped.
+  Future<void> _pauseTimer() async {
+    _stopTicking();
+    if (_sessionId != null) {
+      try {
+        await ApiService.post('/pomodoro/pause', {'session_id': _sessionId});
+      } catch (_) {}
+    }
+  }
+  
   Future<void> _resetTimer() async {
-    _pauseTimer();
+    _stopTicking();
     setState(() {
       _remainingSeconds = _selectedDuration * 60;
       _sessionId = null;
@@ -95,7 +110,7 @@ class _PomodoroScreenState extends State<PomodoroScreen> {
   }
   
   Future<void> _completeTimer() async {
-    _pauseTimer();
+    _stopTicking();
     
     if (_sessionId != null) {
       try {
@@ -1,4 +1,7 @@
+import 'dart:async';
 import 'dart:convert';
+import 'dart:io';
+import 'dart:math';
 import 'package:http/http.dart' as http;
 import 'package:shared_preferences/shared_preferences.dart';
 import 'package:flutter/foundation.dart';
@@ -6,14 +9,22 @@ import 'package:flutter/foundation.dart';
 class ApiService {
   static String _baseUrl = 'http://localhost:5000/api';
   static String? _token;
+  static String _deviceId = '';
   static String? _internalUrl;
   static String? _externalUrl;
   static bool _useInternal = true;
+  static const int _maxWriteRetries = 2;
   
   static Future<void> initialize() async {
     try {
       final prefs = await SharedPreferences.getInstance();
       _token = prefs.getString('token');
+      _deviceId = prefs.getString('deviceId') ?? '';
+      if (_deviceId.isEmpty) {
+        _deviceId = 'android-${DateTime.now().millisecondsSinceEpoch.toRadixString(36)}'
+            '${Random.secure().nextInt(1 << 32).toRadixString(36)}';
+        await prefs.setString('deviceId', _deviceId);
+      }
       _internalUrl = prefs.getString('internalServerUrl');
       _externalUrl = prefs.getString('externalServerUrl');
       
@@ -140,6 +151,7 @@ class ApiService {
   static String? get externalUrl => _externalUrl;
   static bool get isUsingInternal => _useInternal;
   static String? get token => _token;
+  static String get deviceId => _deviceId;
   
   static Future<void> setToken(String token) async {
     _token = token;
@@ -165,13 +177,31 @@ class ApiService {
   }
   
   static Future<Map<String, dynamic>> post(String endpoint, Map<String, dynamic> data) async {
-    final response = await http.post(Uri.parse('$_baseUrl$endpoint'), headers: _headers(), body: jsonEncode(data));
-    return _handleResponse(response);
+    return _write((headers) => http.post(Uri.parse('$_baseUrl$endpoint'), headers: headers, body: jsonEncode(data)));
   }
   
   static Future<Map<String, dynamic>> put(String endpoint, Map<String, dynamic> data) async {
-    final response = await http.put(Uri.parse('$_baseUrl$endpoint'), headers: _headers(), body: jsonEncode(data));
-    return _handleResponse(response);
+    return _write((headers) => http.put(Uri.parse('$_baseUrl$endpoint'), headers: headers, body: jsonEncode(data)));
+  }
+  
+  static String _idempotencyKey() {
+    final random = Random.secure();
+    return List.generate(16, (_) => random.nextInt(256).toRadixString(16).padLeft(2, '0')).join();
+  }
+  
+  // One key per write, kept across retries, so a write resent after a lost
+  // response is replayed by the server instead of applied twice.
+  static Future<Map<String, dynamic>> _write(Future<http.Response> Function(Map<String, String>) send) async {
+    final headers = _headers(extra: {'Idempotency-Key': _idempotencyKey()});
+    for (var attempt = 1;; attempt++) {
+      try {
+        return _handleResponse(await send(headers).timeout(const Duration(seconds: 15)));
+      } on Exception catch (e) {
+        final transient = e is SocketException || e is TimeoutException || e is http.ClientException;
+        if (!transient || attempt > _maxWriteRetries) rethrow;
+        await Future.delayed(Duration(milliseconds: 500 * attempt));
+      }
+    }
   }
   
   static Map<String, dynamic> _handleResponse(http.Response response) {
@@ -0,0 +1,72 @@
+import 'dart:convert';
+import 'package:flutter/foundation.dart';
+import 'package:shared_preferences/shared_preferences.dart';
+import 'api_service.dart';
+
+class SyncService {
+  static String? _cacheKey;
+  static int? _cursor;
+  static Map<String, dynamic> _records = {};
+  static Map<String, dynamic> _summaries = {};
+  static Future<void>? _pulling;
+  
+  static List<dynamic> get records =>
+      _records.values.toList()..sort((a, b) => (b['date'] as String).compareTo(a['date'] as String));
+  static List<dynamic> get summaries =>
+      _summaries.values.toList()..sort((a, b) => (b['id'] as int).compareTo(a['id'] as int));
+  
+  static Future<void> _load() async {
+    final prefs = await SharedPreferences.getInstance();
+    final key = 'syncCache:${prefs.getString('userId') ?? ''}';
+    if (key == _cacheKey) return;
+    final saved = jsonDecode(prefs.getString(key) ?? '{}') as Map<String, dynamic>;
+    _cacheKey = key;
+    _cursor = saved['cursor'];
+    _records = Map<String, dynamic>.from(saved['records'] ?? {});
+    _summaries = Map<String, dynamic>.from(saved['summaries'] ?? {});
+  }
+  
+  static Future<void> _persist() async {
+    final prefs = await SharedPreferences.getInstance();
+    await prefs.setString(_cacheKey!, jsonEncode({'cursor': _cursor, 'records': _records, 'summaries': _summaries}));
+  }
+  
+  static Future<void> _reload() async {
+    // live=1: the reset cursor comes from the live change log, so the
+    // reload must not be served from the older analytics snapshot.
+    final results = await Future.wait([ApiService.get('/data/yearly?live=1'), ApiService.get('/summaries?limit=100')]);
+    _records = {for (final r in results[0]['records'] ?? []) r['id'].toString(): r};
+    _summaries = {for (final s in results[1]['summaries'] ?? []) s['id'].toString(): s};
+  }
+  
+  static void _apply(Map<String, dynamic> change) {
+    final target = change['entity'] == 'daily_record' ? _records : change['entity'] == 'ai_summary' ? _summaries : null;
+    if (target == null) return;
+    final id = change['entity_id'].toString();
+    if (change['op'] == 'delete') {
+      target.remove(id);
+    } else {
+      target[id] = change['data'];
+    }
+  }
+  
+  static Future<void> _run() async {
+    await _load();
+    while (true) {
+      var endpoint = '/sync?device_id=${Uri.encodeQueryComponent(ApiService.deviceId)}';
+      if (_cursor != null) endpoint += '&cursor=$_cursor';
+      final response = await ApiService.get(endpoint);
+      if (response['reset'] == true) await _reload();
+      for (final change in response['changes'] ?? []) {
+        _apply(Map<String, dynamic>.from(change));
+      }
+      _cursor = response['cursor'];
+      await _persist();
+      if (response['has_more'] != true) return;
+    }
+  }
+  
+  static Future<void> pull() {
+    return _pulling ??= _run().catchError((e) => debugPrint('Sync error: $e')).whenComplete(() => _pulling = null);
+  }
+}
@@ -0,0 +1,306 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import database
+from time_engine import add_activity_minutes
+
+# timesetor-admin: bulk maintenance over the database.py layer. Per-user jobs
+# are sharded across a process pool, checkpointed so an interrupted run picks
+# up where it stopped, and throttled to a duty cycle so a live server keeps
+# most of the database to itself.
+
+AGGREGATE_COLUMNS = {
+    'actual_entertainment_minutes': 'entertainment_minutes',
+    'actual_study_minutes': 'study_minutes',
+    'actual_rest_minutes': 'rest_minutes',
+    'virtual_entertainment_minutes': 'virtual_entertainment_minutes',
+    'virtual_study_minutes': 'virtual_study_minutes',
+    'virtual_rest_minutes': 'virtual_rest_minutes',
+}
+
+def recompute_aggregates(user_id: int, options: Dict) -> Dict:
+    stats = {}
+    for row in database.get_daily_activity_totals(user_id):
+        day = stats.setdefault(row['daily_record_id'], dict.fromkeys(AGGREGATE_COLUMNS.values(), 0.0))
+        add_activity_minutes(day, row['activity_type'], row['duration_seconds'] or 0,
+                             row['virtual_seconds'] or 0)
+
+    records = database.get_daily_records_between(user_id, date.min, date.max)
+    updated = 0
+    for record in records:
+        day = stats.get(record['id'], {})
+        values = {column: int(round(day.get(key, 0))) for column, key in AGGREGATE_COLUMNS.items()}
+        if any(record[column] != value for column, value in values.items()):
+            database.update_daily_record(record['id'], **values)
+            updated += 1
+    return {'days': len(records), 'updated': updated}
+
+def rebuild_rollups(user_id: int, options: Dict) -> Dict:
+    drifted = database.get_drifted_app_rollups(user_id)
+    for daily_record_id in drifted:
+        database.rebuild_app_rollup(daily_record_id)
+    return {'rebuilt': len(drifted)}
+
+_ai_service = None
+
+def regenerate_summaries(user_id: int, options: Dict) -> Dict:
+    global _ai_service
+    if _ai_service is None:
+        from ai_service import AIService
+        _ai_service = AIService()
+
+    end = date.today()
+    missing = database.get_daily_records_without_summary(user_id, end - timedelta(days=options['days'] - 1), end)
+    generated = 0
+    for record in missing:
+        summary = _ai_service.generate_daily_summary(record)
+        if summary:
+            day = date.fromisoformat(record['date'])
+            database.add_ai_summary(user_id, 'daily', day, day, summary, record)
+            generated += 1
+    return {'missing': len(missing), 'generated': generated, 'ai_failed': len(missing) - generated}
+
+def compact_user(user_id: int, options: Dict) -> Dict:
+    days = rows_removed = 0
+    while True:
+        records = database.get_compactable_daily_records(date.today(), options['stale_days'], 500,
+                                                         user_id=user_id)
+        if not records:
+            break
+        for record in records:
+            result = database.compact_time_logs(record['id'])
+            days += 1
+            rows_removed += result['rows_before'] - result['rows_after']
+    return {'days': days, 'rows_removed': rows_removed}
+
+def export_user(user_id: int, options: Dict) -> Dict:
+    data = database.export_user(user_id)
+    if data is None:
+        return {'missing': 1}
+    return {'exported': 1, 'output': json.dumps(data, ensure_ascii=False)}
+
+def import_user(line: str, options: Dict) -> Dict:
+    if database.import_user(json.loads(line)) is None:
+        return {'skipped': 1}
+    return {'imported': 1}
+
+JOBS = {
+    'aggregates': (recompute_aggregates, 'Recompute daily_records activity totals from time_logs'),
+    'rollups': (rebuild_rollups, 'Rebuild per-app rollups of compacted days that no longer match time_logs'),
+    'summaries': (regenerate_summaries, 'Generate missing daily AI summaries for completed days'),
+    'compact': (compact_user, 'Compact time_logs of closed days, then vacuum'),
+    'export': (export_user, 'Export users and everything they own as JSON lines'),
+    'import': (import_user, 'Import users from an export; existing usernames are skipped'),
+}
+
+def run_chunk(job: str, items: List[Tuple], options: Dict) -> List[Tuple]:
+    func = JOBS[job][0]
+    duty = options['duty']
+    results = []
+    for key, item in items:
+        started = time.perf_counter()
+        try:
+            results.append((key, func(item, options), None))
+        except Exception as e:
+            results.append((key, {}, f"{type(e).__name__}: {e}"))
+        if duty < 1:
+            # Idle long enough that this worker holds the database only `duty`
+            # of the time; slower work under load means longer pauses.
+            time.sleep((time.perf_counter() - started) * (1 - duty) / duty)
+    return results
+
+class Checkpoint:
+    def __init__(self, path: str, job: str, params: Dict):
+        self.path = path
+        self.job = job
+        self.params = params
+        self.done = set()
+        self.totals = {}
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state['job'] != self.job or state['params'] != self.params:
+            raise SystemExit(f"{self.path} belongs to a different run ({state['job']} {state['params']}); "
+                             f"pass --restart to discard it")
+        self.done = set(state['done'])
+        self.totals = state['totals']
+        return True
+
+    def save(self):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'job': self.job, 'params': self.params, 'done': sorted(self.done),
+                       'totals': self.totals}, f)
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def run_job(job: str, items: List[Tuple], options: Dict, checkpoint: Checkpoint, workers: int,
+            chunk_size: int, on_output: Optional[Callable[[str], None]] = None,
+            progress_seconds: float = 2.0, checkpoint_seconds: float = 5.0) -> Dict:
+    pending = [(key, item) for key, item in items if key not in checkpoint.done]
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    failures = {}
+    started = time.monotonic()
+    last_progress = last_checkpoint = started
+    completed_here = 0
+
+    # Spawned, not forked: a forked child would share the parent's database
+    # connections. Workers import database.py without touching the database.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        in_flight = set()
+        next_chunk = 0
+        try:
+            while next_chunk < len(chunks) or in_flight:
+                while next_chunk < len(chunks) and len(in_flight) < workers * 2:
+                    in_flight.add(pool.submit(run_chunk, job, chunks[next_chunk], options))
+                    next_chunk += 1
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    for key, counts, error in future.result():
+                        completed_here += 1
+                        if error:
+                            failures[key] = error
+                            continue
+                        output = counts.pop('output', None)
+                        if output is not None and on_output is not None:
+                            on_output(output)
+                        checkpoint.done.add(key)
+                        for name, value in counts.items():
+                            checkpoint.totals[name] = checkpoint.totals.get(name, 0) + value
+
+                now = time.monotonic()
+                if now - last_progress >= progress_seconds or not (in_flight or next_chunk < len(chunks)):
+                    rate = completed_here / max(now - started, 1e-9)
+                    remaining = len(pending) - completed_here
+                    print(f"{job}: {len(checkpoint.done)}/{len(items)} done, {len(failures)} failed, "
+                          f"{rate:.1f}/s, eta {remaining / rate if rate else 0:.0f}s", file=sys.stderr, flush=True)
+                    last_progress = now
+                if now - last_checkpoint >= checkpoint_seconds:
+                    checkpoint.save()
+                    last_checkpoint = now
+        except KeyboardInterrupt:
+            for future in in_flight:
+                future.cancel()
+            checkpoint.save()
+            raise SystemExit(f"\n{job} interrupted; run the same command again to resume from {checkpoint.path}")
+
+    if failures:
+        # Failed items are not marked done, so a rerun retries just those.
+        checkpoint.save()
+        for key, error in sorted(failures.items())[:20]:
+            print(f"  {key}: {error}", file=sys.stderr)
+    else:
+        checkpoint.remove()
+    return {'items': len(items), 'failed': len(failures), **checkpoint.totals,
+            'elapsed_s': round(time.monotonic() - started, 1)}
+
+def run_indexes(args) -> int:
+    report = database.check_indexes(repair=args.repair)
+    for key, value in report.items():
+        print(f"{key:<10} {value}")
+    final = report.get('after', report)
+    return 1 if final['missing'] or final['invalid'] or final['errors'] else 0
+
+def main():
+    parser = argparse.ArgumentParser(prog='timesetor-admin', description='Bulk maintenance across users')
+    jobs = parser.add_subparsers(dest='job', required=True)
+
+    for name, (_, help_text) in JOBS.items():
+        job = jobs.add_parser(name, help=help_text, description=help_text)
+        job.add_argument('--users', type=lambda v: [int(u) for u in v.split(',')],
+                         help='comma-separated user ids (default: all users)')
+        job.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1))
+        job.add_argument('--chunk-size', type=int, default=20, help='users handed to a worker at once')
+        job.add_argument('--duty', type=float, default=0.5,
+                         help='fraction of time each worker may spend on the database (1 = no throttling)')
+        job.add_argument('--checkpoint', help='checkpoint file (default: admin-<job>.checkpoint.json)')
+        job.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+        if name == 'summaries':
+            job.add_argument('--days', type=int, default=30, help='look back this many days')
+        elif name == 'compact':
+            job.add_argument('--stale-days', type=int, default=1,
+                             help='days after which an unfinished day is treated as closed')
+            job.add_argument('--no-vacuum', action='store_true')
+            job.add_argument('--convert-vacuum', action='store_true',
+                             help='switch an older SQLite file to incremental vacuum with one full '
+                                  'VACUUM; this locks the database, so stop the server first')
+        elif name == 'export':
+            job.add_argument('output', help='JSON lines file to write')
+        elif name == 'import':
+            job.add_argument('input', help='JSON lines file written by export')
+
+    indexes = jobs.add_parser('indexes', help='Check that expected indexes exist and are consistent')
+    indexes.add_argument('--repair', action='store_true', help='create missing and rebuild broken indexes')
+    args = parser.parse_args()
+
+    if args.job == 'indexes':
+        sys.exit(run_indexes(args))
+    if not 0 < args.duty <= 1:
+        parser.error('--duty must be in (0, 1]')
+
+    options = {}
+    if args.job == 'summaries':
+        from ai_service import AIService
+        if not AIService().is_enabled():
+            parser.error('AI service not configured')
+        options['days'] = args.days
+    elif args.job == 'compact':
+        options['stale_days'] = args.stale_days
+
+    if args.job == 'import':
+        with open(args.input, 'r', encoding='utf-8') as f:
+            items = [(number, line) for number, line in enumerate(f, 1) if line.strip()]
+        params = dict(options, input=os.path.abspath(args.input))
+    else:
+        items = [(user_id, user_id) for user_id in (args.users or database.get_user_ids())]
+        params = dict(options, users=args.users)
+        if args.job == 'export':
+            params['output'] = os.path.abspath(args.output)
+
+    checkpoint = Checkpoint(args.checkpoint or f"admin-{args.job}.checkpoint.json", args.job, params)
+    if args.restart:
+        checkpoint.remove()
+    elif checkpoint.load():
+        print(f"Resuming {args.job} from {checkpoint.path}: {len(checkpoint.done)} already done",
+              file=sys.stderr)
+
+    options['duty'] = args.duty
+    output_file = None
+    on_output = None
+    if args.job == 'export':
+        # A resumed export appends; users finished after the last checkpoint
+        # may appear twice, which import skips.
+        output_file = open(args.output, 'a' if checkpoint.done else 'w', encoding='utf-8', buffering=1)
+        on_output = lambda line: output_file.write(line + '\n')
+    size_before = database.get_database_size() if args.job == 'compact' else None
+
+    try:
+        report = run_job(args.job, items, options, checkpoint, max(1, args.workers),
+                         max(1, args.chunk_size), on_output)
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+    if args.job == 'compact' and not args.no_vacuum:
+        report['vacuum'] = database.incremental_vacuum(convert=args.convert_vacuum)['mode']
+        report['bytes_reclaimed'] = size_before['bytes'] - database.get_database_size()['bytes']
+    for key, value in report.items():
+        print(f"{key:<16} {value}")
+    sys.exit(1 if report['failed'] else 0)
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,15 @@
-import requests
 import json
 from datetime import datetime, date, timedelta
 from typing import Dict, List, Optional
 import os
-import yaml
+import time
+
+import metrics
 
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.yaml")
 
 def load_config():
+    import yaml
     with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
         return yaml.safe_load(f)
 
@@ -23,6 +25,11 @@ class AIService:
         if not self.is_enabled():
             return None
         
+        # requests costs more to import than the rest of the server; only
+        # servers with AI enabled ever pay for it.
+        import requests
+        
+        start = time.perf_counter()
         try:
             headers = {
                 'Content-Type': 'application/json',
@@ -48,10 +55,14 @@ class AIService:
                 return result['choices'][0]['message']['content']
             else:
                 print(f"AI API error: {response.status_code} - {response.text}")
+                metrics.AI_CALL_ERRORS.inc()
                 return None
         except Exception as e:
             print(f"AI API call failed: {e}")
+            metrics.AI_CALL_ERRORS.inc()
             return None
+        finally:
+            metrics.AI_CALL_LATENCY.observe(time.perf_counter() - start)
     
     def generate_daily_summary(self, daily_data: Dict) -> Optional[str]:
         if not self.is_enabled():
@@ -0,0 +1,174 @@
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from time_engine import get_config, get_config_version
+
+ACTIVITY_TYPES = ('entertainment', 'study', 'rest')
+DEFAULT_ACTIVITY = 'rest'
+
+class _TrieNode:
+    __slots__ = ('children', 'value')
+
+    def __init__(self):
+        self.children = {}
+        self.value = None
+
+class PatternSet:
+    def __init__(self, rules: Dict[str, str] = None):
+        self.exact = {}
+        self.root = _TrieNode()
+        self.has_prefixes = False
+        for pattern, activity in (rules or {}).items():
+            self.add(pattern, activity)
+
+    def add(self, pattern: str, activity: str):
+        pattern = pattern.strip()
+        if pattern.endswith('*'):
+            node = self.root
+            for segment in pattern[:-1].rstrip('.').split('.'):
+                if not segment:
+                    continue
+                child = node.children.get(segment)
+                if child is None:
+                    child = node.children[segment] = _TrieNode()
+                node = child
+            node.value = activity
+            self.has_prefixes = True
+        else:
+            self.exact[pattern] = activity
+
+    def match(self, package: str) -> Optional[str]:
+        activity = self.exact.get(package)
+        if activity is not None or not self.has_prefixes:
+            return activity
+
+        # Longest matching prefix wins, e.g. com.tencent.mm.* over com.tencent.*
+        node = self.root
+        found = node.value
+        for segment in package.split('.'):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.value is not None:
+                found = node.value
+        return found
+
+def rules_from_lists(entertainment_apps: Iterable[str], study_apps: Iterable[str]) -> Dict[str, str]:
+    rules = {}
+    for package in study_apps or ():
+        rules[package] = 'study'
+    # The old linear check tested entertainment first, so it wins on overlap.
+    for package in entertainment_apps or ():
+        rules[package] = 'entertainment'
+    return rules
+
+class _UserCache:
+    __slots__ = ('rules', 'activities')
+
+    def __init__(self, rules: Optional[PatternSet]):
+        self.rules = rules
+        self.activities = {}
+
+class AppClassifier:
+    def __init__(self, entertainment_apps: Iterable[str], study_apps: Iterable[str],
+                 override_loader: Callable[[int], Dict[str, str]] = None,
+                 cache_size: int = 4096, max_users: int = 10000):
+        self.rules = PatternSet(rules_from_lists(entertainment_apps, study_apps))
+        self.override_loader = override_loader
+        self.cache_size = cache_size
+        self.max_users = max_users
+        # Each user's overrides and results sit together, so a settings change
+        # drops them with one pop. The generation moves on every invalidation;
+        # a lookup that loaded overrides before one does not store them.
+        self._users = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _user_cache(self, user_id: Optional[int]) -> _UserCache:
+        cache = self._users.get(user_id)
+        if cache is not None:
+            return cache
+
+        generation = self._generation
+        rules = None
+        if user_id is not None and self.override_loader:
+            raw = self.override_loader(user_id)
+            rules = PatternSet(clean_overrides(raw)) if raw else None
+        cache = _UserCache(rules)
+        with self._lock:
+            if generation == self._generation:
+                if len(self._users) >= self.max_users:
+                    # Clearing is cheaper than LRU bookkeeping and the hot set refills fast.
+                    self._users.clear()
+                cache = self._users.setdefault(user_id, cache)
+        return cache
+
+    def classify(self, package: str, user_id: int = None) -> str:
+        if not package:
+            return DEFAULT_ACTIVITY
+
+        cache = self._user_cache(user_id)
+        activities = cache.activities
+        activity = activities.get(package)
+        if activity is not None:
+            return activity
+
+        activity = cache.rules.match(package) if cache.rules is not None else None
+        if activity is None:
+            activity = self.rules.match(package) or DEFAULT_ACTIVITY
+
+        if len(activities) >= self.cache_size:
+            activities.clear()
+        activities[package] = activity
+        return activity
+
+    def classify_many(self, packages: Iterable[str], user_id: int = None) -> List[str]:
+        classify = self.classify
+        return [classify(package, user_id) for package in packages]
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self._generation += 1
+            self._users.pop(user_id, None)
+
+def clean_overrides(raw) -> Dict[str, str]:
+    if not isinstance(raw, dict):
+        return {}
+    return {
+        str(pattern): activity
+        for pattern, activity in raw.items()
+        if activity in ACTIVITY_TYPES and pattern
+    }
+
+_classifier = None
+_classifier_version = None
+_classifier_lock = threading.Lock()
+_override_loader = None
+
+def set_override_loader(loader: Callable[[int], Dict[str, str]]):
+    global _override_loader, _classifier
+    _override_loader = loader
+    _classifier = None
+
+def get_classifier() -> AppClassifier:
+    global _classifier, _classifier_version
+    version = get_config_version()
+    classifier = _classifier
+    if classifier is not None and _classifier_version == version:
+        return classifier
+
+    with _classifier_lock:
+        if _classifier is None or _classifier_version != version:
+            android = get_config().get('android', {})
+            _classifier = AppClassifier(
+                android.get('entertainment_apps', []),
+                android.get('study_apps', []),
+                override_loader=_override_loader
+            )
+            _classifier_version = version
+        return _classifier
+
+def invalidate_user(user_id: int):
+    classifier = _classifier
+    if classifier is not None:
+        classifier.invalidate_user(user_id)
@@ -0,0 +1,160 @@
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import serializer
+
+class AsyncApp:
+    def __init__(self, wsgi_app, max_workers: int = 32, max_pending: int = 1024):
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='timesetor-worker')
+        self.routes = {}
+        self._slots = None
+
+    def route(self, path: str, methods: Tuple[str, ...] = ('GET',)):
+        def decorator(handler):
+            for method in methods:
+                self.routes[(method, path)] = handler
+            return handler
+        return decorator
+
+    async def run_blocking(self, func: Callable, *args):
+        # Blocking SQLite/crypto work goes through a fixed pool; the semaphore
+        # keeps the backlog of queued jobs bounded as well.
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is not None:
+            await handler(scope, receive, send)
+            return
+
+        body = await read_body(receive)
+        environ = build_environ(scope, body)
+        status, headers, content = await self.run_blocking(self._call_wsgi, environ)
+        await send_response(send, status, headers, content)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _call_wsgi(self, environ: Dict):
+        response = {}
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = headers
+            return chunks.append
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                chunks.append(chunk)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], b''.join(chunks)
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    return b''.join(chunks)
+
+def build_environ(scope: Dict, body: bytes) -> Dict:
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            environ[name] = value
+            continue
+        key = 'HTTP_' + name
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def header_value(scope: Dict, name: bytes) -> Optional[str]:
+    for raw_name, raw_value in scope.get('headers', []):
+        if raw_name.lower() == name:
+            return raw_value.decode('latin-1')
+    return None
+
+async def send_response(send, status: int, headers: List[Tuple[str, str]], content: bytes):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), str(value).encode('latin-1'))
+                    for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': content})
+
+async def send_json(send, data, status: int = 200, headers: List[Tuple[str, str]] = None):
+    content = serializer.dumps(data)
+    await send_response(send, status, [('Content-Type', 'application/json'),
+                                       ('Access-Control-Allow-Origin', '*')] + (headers or []),
+                        content)
+
+def serve(async_app: AsyncApp, host: str, port: int, backlog: int = 4096,
+          keepalive_seconds: int = 75):
+    try:
+        import uvicorn
+    except ImportError:
+        print("Async mode requires uvicorn: pip install uvicorn")
+        raise
+
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+    uvicorn.run(async_app, host=host, port=port, backlog=backlog,
+                timeout_keep_alive=keepalive_seconds, log_level='warning', lifespan='on')
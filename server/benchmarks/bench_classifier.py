@@ -0,0 +1,58 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_classifier import AppClassifier
+from time_engine import get_config
+
+def linear_classify(app_name: str, entertainment_apps: list, study_apps: list) -> str:
+    if app_name in entertainment_apps:
+        return 'entertainment'
+    elif app_name in study_apps:
+        return 'study'
+    return 'rest'
+
+def make_events(count: int, entertainment_apps: list, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    other = [f"com.vendor{i}.app{j}" for i in range(50) for j in range(4)]
+    tencent = ['com.tencent.tmgp.sgame', 'com.tencent.qqlive', 'com.tencent.weread']
+    population = list(entertainment_apps) + other + tencent
+    return [rng.choice(population) for _ in range(count)]
+
+def timed(label: str, func, count: int):
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    print(f"{label:<48} {seconds:8.3f} s  {count / seconds:12.0f} events/s")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify app-usage events')
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100)
+    args = parser.parse_args()
+
+    android = get_config().get('android', {})
+    entertainment = list(android.get('entertainment_apps', []))
+    study = list(android.get('study_apps', []))
+    events = make_events(args.events, entertainment)
+
+    overrides = {user_id: {'com.tencent.*': 'entertainment', 'com.vendor3.*': 'study'}
+                 for user_id in range(0, args.users, 2)}
+    classifier = AppClassifier(entertainment, study, override_loader=overrides.get)
+
+    print(f"Classifying {args.events} events, {len(entertainment) + len(study)} configured apps")
+    timed('linear list scan (old update_activity)',
+          lambda: [linear_classify(e, entertainment, study) for e in events], args.events)
+    timed('AppClassifier.classify_many, no user',
+          lambda: classifier.classify_many(events), args.events)
+    timed(f'AppClassifier.classify, {args.users} users w/ overrides',
+          lambda: [classifier.classify(e, i % args.users) for i, e in enumerate(events)],
+          args.events)
+
+if __name__ == '__main__':
+    main()
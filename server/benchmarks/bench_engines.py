@@ -0,0 +1,96 @@
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import measure, save_results, load_results
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'engines.json')
+
+def make_engines(count: int) -> list:
+    from time_engine import TimeEngine
+    import user_config
+
+    wake = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    engines = []
+    for user_id in range(count):
+        engine = TimeEngine(user_id, config_override=user_config.get_effective_config(user_id).config)
+        engine.initialize_day(wake, wake - timedelta(hours=9), wake - timedelta(hours=8))
+        engine.set_entertainment_multiplier(1.5 + user_id % 7 * 0.25)
+        engine.update_activity(('rest', 'entertainment', 'study')[user_id % 3])
+        engine.get_virtual_time(wake + timedelta(seconds=user_id))
+        engines.append(engine)
+    return engines
+
+def bytes_per_engine(count: int) -> float:
+    import user_config
+
+    user_config.invalidate()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    engines = make_engines(count)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    # The list holding the engines is benchmark overhead, not engine state.
+    allocated -= sys.getsizeof(engines)
+    del engines
+    user_config.invalidate()
+    return allocated / count
+
+def run(user_counts: list, iterations: int) -> dict:
+    import user_config
+    user_config.set_settings_loader(lambda user_id: {})
+
+    results = {}
+    for count in user_counts:
+        results[f'engine.bytes[{count} users]'] = {'bytes': bytes_per_engine(count)}
+
+    engines = make_engines(3)
+    base = datetime.now()
+    for engine in engines:
+        results[f'engine.get_virtual_time[{engine.current_activity}]'] = measure(
+            lambda i: engine.get_virtual_time(base + timedelta(seconds=i)), iterations)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='TimeEngine memory and call cost')
+    parser.add_argument('--users', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    args = parser.parse_args()
+
+    # get_effective_config() looks up each user's settings in the database, so
+    # point it at a scratch one rather than the real server database.
+    scratch = tempfile.TemporaryDirectory(prefix='timesetor_bench_')
+    os.environ['TIMESETOR_DB_PATH'] = os.path.join(scratch.name, 'bench.db')
+
+    results = run(args.users, args.iterations)
+    baseline = load_results(args.compare) if args.compare else {}
+
+    print(f"{'benchmark':<44} {'value':>14} {'baseline':>14} {'change':>8}")
+    for name, stats in results.items():
+        key, unit = ('bytes', 'B') if 'bytes' in stats else ('mean_us', 'us')
+        value = stats[key]
+        line = f"{name:<44} {value:>11.2f} {unit:<2}"
+        before = baseline.get(name, {}).get(key)
+        if before:
+            line += f" {before:>11.2f} {unit:<2} {(value - before) / before:>+8.1%}"
+        print(line)
+
+    save_results(args.output, results, {'users': args.users, 'iterations': args.iterations})
+    print(f"\nResults written to {args.output}")
+    scratch.cleanup()
+
+if __name__ == '__main__':
+    main()
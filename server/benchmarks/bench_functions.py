@@ -0,0 +1,59 @@
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto import generate_key, generate_token, verify_token
+from time_engine import (
+    TimeEngine, approach_time, calculate_entertainment_multiplier,
+    calculate_daily_stats
+)
+from harness import measure
+
+def make_time_logs(count: int) -> list:
+    activities = ['entertainment', 'study', 'rest']
+    speeds = [2.0, 1.5, 0.5]
+    return [
+        {
+            'duration_seconds': 30 + i % 300,
+            'speed_multiplier': speeds[i % 3],
+            'activity_type': activities[i % 3],
+        }
+        for i in range(count)
+    ]
+
+def run(iterations: int = 20000) -> dict:
+    results = {}
+    
+    engine = TimeEngine(1)
+    wake = datetime.now().replace(hour=9, minute=30, second=0, microsecond=0)
+    engine.initialize_day(wake, wake - timedelta(hours=10), wake - timedelta(hours=9))
+    engine.update_activity('entertainment')
+    base = datetime.now()
+    results['func.get_virtual_time'] = measure(
+        lambda i: engine.get_virtual_time(base + timedelta(seconds=i)), iterations)
+    
+    results['func.approach_time'] = measure(
+        lambda i: approach_time(i % 1440, 480, 0.1), iterations)
+    
+    expected_sleep = wake.replace(hour=23)
+    virtual_wake = wake.replace(hour=9, minute=0)
+    yesterday_virtual_sleep = virtual_wake - timedelta(hours=9)
+    results['func.calculate_entertainment_multiplier'] = measure(
+        lambda i: calculate_entertainment_multiplier(
+            wake, expected_sleep, virtual_wake, yesterday_virtual_sleep, 2.0, 4.0),
+        iterations)
+    
+    key = generate_key(date.today().isoformat(), 'bench_salt')
+    token = generate_token(1, datetime.now(), key)
+    results['func.verify_token'] = measure(
+        lambda i: verify_token(token, key), iterations)
+    
+    logs = make_time_logs(500)
+    sleep = wake + timedelta(hours=14)
+    results['func.calculate_daily_stats[500 logs]'] = measure(
+        lambda i: calculate_daily_stats(wake, sleep, virtual_wake, sleep, logs),
+        max(1, iterations // 20))
+    
+    return results
@@ -0,0 +1,77 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import measure, summarize, print_table, save_results, load_results, compare_results
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'ratelimit.json')
+
+def run(iterations: int, threads: int) -> dict:
+    import ratelimit
+
+    results = {}
+    # Per-request cost should not grow with the number of tracked keys.
+    for keys in (100, 10000, 100000):
+        limiter = ratelimit.RateLimiter({'max_keys': keys * 2})
+        for user_id in range(keys):
+            limiter.check(user_id, f"device-{user_id}", '/api/time/current')
+        results[f"check[{keys} users]"] = measure(
+            lambda i: limiter.check(i % keys, f"device-{i % keys}", '/api/time/current'), iterations)
+
+    shedder = ratelimit.LoadShedder({'max_in_flight': 1 << 30, 'p99_ms': 1000})
+    def admit_release(i):
+        shedder.admit()
+        shedder.release(0.001)
+    results['shedder.admit+release'] = measure(admit_release, iterations)
+
+    # The same checks from several threads at once, as a threaded server makes them.
+    limiter = ratelimit.RateLimiter({'max_keys': 200000})
+    latencies = []
+    lock = threading.Lock()
+    def worker(offset: int):
+        local = []
+        clock = time.perf_counter_ns
+        for i in range(iterations):
+            user_id = (offset * iterations + i) % 10000
+            t0 = clock()
+            limiter.check(user_id, None, '/api/time/current')
+            local.append(clock() - t0)
+        with lock:
+            latencies.extend(local)
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter_ns()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    results[f"check[{threads} threads]"] = summarize(latencies, time.perf_counter_ns() - started)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-request cost of the rate limiter and load shedder')
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    args = parser.parse_args()
+
+    results = run(args.iterations, args.threads)
+    print_table(results)
+
+    if args.compare:
+        print()
+        for row in compare_results(load_results(args.compare), results):
+            flag = '  REGRESSION' if row['regression'] else ''
+            print(f"{row['name']:<44} p50 {row['before']:>10.1f} -> {row['after']:>10.1f} us "
+                  f"({row['change']:+.1%}){flag}")
+
+    save_results(args.output, results, vars(args))
+    print(f"\nResults written to {args.output}")
+
+if __name__ == '__main__':
+    main()
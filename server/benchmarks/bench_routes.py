@@ -0,0 +1,115 @@
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import measure
+
+def seed_history(database, user_id: int, days: int, logs_per_day: int):
+    conn = database.get_connection()
+    try:
+        cursor = conn.cursor()
+        today = date.today()
+        for offset in range(days, 0, -1):
+            day = today - timedelta(days=offset)
+            wake = datetime.combine(day, datetime.min.time()).replace(hour=8)
+            sleep = wake + timedelta(hours=15)
+            cursor.execute(
+                """INSERT INTO daily_records
+                   (user_id, date, real_wake_time, real_sleep_time, virtual_wake_time,
+                    virtual_sleep_time, real_wake_time_display, target_entertainment_hours,
+                    target_study_hours, actual_entertainment_minutes, actual_study_minutes,
+                    actual_rest_minutes, status)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, 2.0, 4.0, ?, ?, ?, 'completed')""",
+                (user_id, day.isoformat(), wake.isoformat(), sleep.isoformat(),
+                 wake.isoformat(), sleep.isoformat(), '08:00',
+                 offset % 180, offset % 240, offset % 600)
+            )
+            record_id = cursor.lastrowid
+            cursor.executemany(
+                """INSERT INTO time_logs
+                   (user_id, daily_record_id, real_timestamp, virtual_timestamp,
+                    virtual_time_display, activity_type, speed_multiplier, duration_seconds)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(user_id, record_id, (wake + timedelta(minutes=i)).isoformat(),
+                  (wake + timedelta(minutes=i)).isoformat(), '08:00',
+                  ('rest', 'study', 'entertainment')[i % 3], 1.0, 60)
+                 for i in range(logs_per_day)]
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+def run(iterations: int = 500, users: int = 20, history_days: int = 365,
+        logs_per_day: int = 20) -> dict:
+    # database.py reads DB_PATH on import, so point it at the scratch file first.
+    import database
+    import main
+    
+    client = main.create_app().test_client()
+    tokens = []
+    for n in range(users):
+        response = client.post('/api/auth/register', json={
+            'username': f"bench_user_{n}", 'password': 'bench'
+        })
+        body = response.get_json()
+        seed_history(database, body['user_id'], history_days, logs_per_day)
+        headers = {'Authorization': f"Bearer {body['token']}"}
+        client.post('/api/time/wake', json={}, headers=headers)
+        tokens.append(headers)
+    
+    def auth(i):
+        return tokens[i % len(tokens)]
+    
+    def check(response):
+        if response.status_code >= 400:
+            raise RuntimeError(f"{response.request.path} -> {response.status_code}: {response.get_data(as_text=True)}")
+    
+    activities = ['entertainment', 'study', 'rest', 'auto']
+    apps = ['com.tencent.mm', 'com.example.notes', 'com.bilibili', None]
+    session_ids = {}
+    
+    def pomodoro_start(i):
+        response = client.post('/api/pomodoro/start', json={'duration_minutes': 25}, headers=auth(i))
+        check(response)
+        session_ids[i % len(tokens)] = response.get_json()['session_id']
+    
+    def pomodoro_end(i):
+        check(client.post('/api/pomodoro/end', json={
+            'session_id': session_ids.get(i % len(tokens)),
+            'actual_duration_minutes': 25,
+            'next_type': 'break'
+        }, headers=auth(i)))
+    
+    today = date.today()
+    range_start = (today - timedelta(days=30)).isoformat()
+    range_query = f"/api/data/range?start={range_start}&end={today.isoformat()}"
+    
+    routes = {
+        'GET /api/time/current':
+            lambda i: check(client.get('/api/time/current', headers=auth(i))),
+        'POST /api/activity/update':
+            lambda i: check(client.post('/api/activity/update', json={
+                'activity_type': activities[i % 4], 'app_name': apps[i % 4]
+            }, headers=auth(i))),
+        'POST /api/pomodoro/start': pomodoro_start,
+        'POST /api/pomodoro/end': pomodoro_end,
+        'GET /api/pomodoro/status':
+            lambda i: check(client.get('/api/pomodoro/status', headers=auth(i))),
+        'GET /api/data/daily':
+            lambda i: check(client.get('/api/data/daily', headers=auth(i))),
+        'GET /api/data/weekly':
+            lambda i: check(client.get('/api/data/weekly', headers=auth(i))),
+        'GET /api/data/monthly':
+            lambda i: check(client.get('/api/data/monthly', headers=auth(i))),
+        'GET /api/data/yearly':
+            lambda i: check(client.get('/api/data/yearly', headers=auth(i))),
+        'GET /api/data/range':
+            lambda i: check(client.get(range_query, headers=auth(i))),
+    }
+    
+    results = {}
+    for name, func in routes.items():
+        results[f"route.{name}"] = measure(func, iterations)
+    return results
@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import measure, print_table, save_results, load_results, compare_results
+from bench_routes import seed_history
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'serializer.json')
+
+def run(days: int, iterations: int) -> dict:
+    # database.py reads DB_PATH on import, so point it at the scratch file first.
+    import database
+    import main
+    import serializer
+    from flask.json.provider import DefaultJSONProvider
+
+    client = main.create_app().test_client()
+    body = client.post('/api/auth/register', json={'username': 'serializer', 'password': 'bench'}).get_json()
+    user_id = body['user_id']
+    headers = {'Authorization': f"Bearer {body['token']}"}
+    seed_history(database, user_id, days, 0)
+
+    conn = database.get_connection()
+    rows = conn.execute("SELECT * FROM daily_records WHERE user_id = ? ORDER BY date DESC LIMIT ?",
+                        (user_id, days)).fetchall()
+    conn.close()
+    row_set = database.get_recent_daily_records(user_id, days)
+    flask_provider = DefaultJSONProvider(main.app)
+
+    encoders = {
+        'encode.flask dict(row)': lambda i: flask_provider.dumps({'records': [dict(row) for row in rows]}),
+        'encode.stdlib RowSet': lambda i: serializer.dumps_python({'records': row_set}),
+    }
+    if serializer.orjson is not None:
+        encoders['encode.orjson RowSet'] = lambda i: serializer.dumps_orjson({'records': row_set})
+
+    results = {}
+    for name, encode in encoders.items():
+        stats = measure(encode, iterations)
+        size = len(encode(0))
+        stats['records_per_sec'] = stats['ops_per_sec'] * len(row_set)
+        stats['mb_per_sec'] = stats['ops_per_sec'] * size / 1e6
+        results[f"{name}[{len(row_set)} days]"] = stats
+
+    # End to end, including the query and the Flask response.
+    results['route.GET /api/data/yearly'] = measure(
+        lambda i: client.get('/api/data/yearly', headers=headers).get_data(), iterations)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON encoding cost for a year of daily records')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory(prefix='timesetor_bench_')
+    os.environ['TIMESETOR_DB_PATH'] = os.path.join(scratch.name, 'bench.db')
+    os.environ.pop('TIMESETOR_DB_URL', None)
+
+    results = run(args.days, args.iterations)
+    print_table(results)
+    print(f"\n{'encoder':<44} {'records/s':>12} {'MB/s':>8}")
+    for name, stats in results.items():
+        if 'records_per_sec' in stats:
+            print(f"{name:<44} {stats['records_per_sec']:>12.0f} {stats['mb_per_sec']:>8.1f}")
+
+    if args.compare:
+        print()
+        for row in compare_results(load_results(args.compare), results):
+            flag = '  REGRESSION' if row['regression'] else ''
+            print(f"{row['name']:<44} p50 {row['before']:>10.1f} -> {row['after']:>10.1f} us "
+                  f"({row['change']:+.1%}){flag}")
+
+    save_results(args.output, results, vars(args))
+    print(f"\nResults written to {args.output}")
+    scratch.cleanup()
+
+if __name__ == '__main__':
+    main()
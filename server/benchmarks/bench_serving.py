@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import percentile
+
+SERVER_CODE = {
+    'threaded': ("import main; app = main.create_app(); "
+                 "app.run(host='127.0.0.1', port={port}, debug=False, threaded=True)"),
+    'async': ("import main, asgi; "
+              "asgi.serve(main.create_asgi_app(), '127.0.0.1', {port}, keepalive_seconds=600)"),
+}
+
+def raise_fd_limit():
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    except (ImportError, ValueError, OSError):
+        return None
+
+def process_status(pid: int) -> dict:
+    status = {}
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('VmRSS', 'Threads'):
+                    status[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return {'rss_kb': status.get('VmRSS'), 'threads': status.get('Threads')}
+
+def spawn(mode: str, port: int, db_path: str):
+    env = dict(os.environ)
+    env['TIMESETOR_DB_PATH'] = db_path
+    process = subprocess.Popen([sys.executable, '-c', SERVER_CODE[mode].format(port=port)],
+                               cwd=SERVER_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(base_url + '/api/health', timeout=0.5)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+async def open_idle(port: int, count: int, batch: int = 200):
+    connections = []
+    failures = 0
+    for start in range(0, count, batch):
+        results = await asyncio.gather(
+            *[asyncio.open_connection('127.0.0.1', port) for _ in range(min(batch, count - start))],
+            return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                failures += 1
+            else:
+                connections.append(result)
+    return connections, failures
+
+def probe(base_url: str, headers: dict, samples: int) -> dict:
+    http = requests.Session()
+    latencies = []
+    errors = 0
+    for _ in range(samples):
+        t0 = time.perf_counter_ns()
+        try:
+            response = http.get(base_url + '/api/time/current', headers=headers, timeout=10)
+            if response.status_code != 200:
+                errors += 1
+        except requests.RequestException:
+            errors += 1
+        latencies.append(time.perf_counter_ns() - t0)
+    latencies.sort()
+    return {
+        'p50_ms': percentile(latencies, 0.5) / 1e6,
+        'p99_ms': percentile(latencies, 0.99) / 1e6,
+        'errors': errors,
+    }
+
+def run_mode(mode: str, port: int, idle: int, samples: int) -> dict:
+    scratch = tempfile.mkdtemp(prefix='timesetor_serving_')
+    process, base_url = spawn(mode, port, os.path.join(scratch, 'serving.db'))
+    try:
+        token = requests.post(base_url + '/api/auth/register', json={
+            'username': 'serving', 'password': 'bench'
+        }).json()['token']
+        headers = {'Authorization': f"Bearer {token}"}
+        requests.post(base_url + '/api/time/wake', json={}, headers=headers)
+
+        baseline = probe(base_url, headers, samples)
+        before = process_status(process.pid)
+
+        loop = asyncio.new_event_loop()
+        connections, failures = loop.run_until_complete(open_idle(port, idle))
+        time.sleep(1.0)
+        loaded = probe(base_url, headers, samples)
+        after = process_status(process.pid)
+        for _, writer in connections:
+            writer.close()
+        loop.close()
+
+        return {
+            'mode': mode,
+            'idle_requested': idle,
+            'idle_open': len(connections),
+            'connect_failures': failures,
+            'probe_no_idle': baseline,
+            'probe_idle_held': loaded,
+            'server_before': before,
+            'server_loaded': after,
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare threaded and async serving under idle connections')
+    parser.add_argument('--idle', type=int, default=2000, help='idle connections to hold open')
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--port', type=int, default=5060)
+    parser.add_argument('--modes', default='threaded,async')
+    args = parser.parse_args()
+
+    limit = raise_fd_limit()
+    if limit is not None and limit < args.idle + 100:
+        print(f"Warning: open file limit is {limit}, fewer than --idle {args.idle}")
+
+    for offset, mode in enumerate(args.modes.split(',')):
+        result = run_mode(mode, args.port + offset, args.idle, args.samples)
+        before = result['server_before']
+        loaded = result['server_loaded']
+        print(f"\n== {mode}: {result['idle_open']}/{result['idle_requested']} idle connections open "
+              f"({result['connect_failures']} failed) ==")
+        print(f"probe /api/time/current, no idle:   p50 {result['probe_no_idle']['p50_ms']:.2f} ms  "
+              f"p99 {result['probe_no_idle']['p99_ms']:.2f} ms")
+        print(f"probe /api/time/current, idle held: p50 {result['probe_idle_held']['p50_ms']:.2f} ms  "
+              f"p99 {result['probe_idle_held']['p99_ms']:.2f} ms  "
+              f"errors {result['probe_idle_held']['errors']}")
+        print(f"server threads {before['threads']} -> {loaded['threads']}, "
+              f"RSS {before['rss_kb']} -> {loaded['rss_kb']} kB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import summarize, print_table, save_results, load_results, compare_results
+from bench_routes import seed_history
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'snapshot.json')
+
+def analytics_reader(database, user_ids: list, use_snapshot: bool, stop: threading.Event, counts: list):
+    today = date.today()
+    year_ago = today - timedelta(days=365)
+    i = 0
+    while not stop.is_set():
+        user_id = user_ids[i % len(user_ids)]
+        database.get_recent_daily_records(user_id, 365, snapshot=use_snapshot)
+        database.get_time_logs_between(user_id, year_ago, today, snapshot=use_snapshot)
+        counts.append(1)
+        i += 1
+
+def snapshot_refresher(database, interval: float, stop: threading.Event, timings: list):
+    while not stop.wait(interval):
+        started = time.perf_counter_ns()
+        database.refresh_snapshot()
+        timings.append(time.perf_counter_ns() - started)
+
+def write_phase(database, writer_user: int, record_id: int, seconds: float, pause: float) -> tuple:
+    latencies = []
+    clock = time.perf_counter_ns
+    started = clock()
+    deadline = time.monotonic() + seconds
+    i = 0
+    while time.monotonic() < deadline:
+        t0 = clock()
+        # The same pair of commits /api/activity/update and its aggregates make.
+        database.add_time_log(writer_user, record_id, datetime.now(), 'study', 5.0, 5)
+        database.update_daily_record(record_id, actual_study_minutes=i)
+        latencies.append(clock() - t0)
+        i += 1
+        time.sleep(pause)
+    return latencies, clock() - started
+
+def run(users: int, history_days: int, logs_per_day: int, readers: int, seconds: float,
+        pause_ms: float, refresh_seconds: float) -> dict:
+    import database
+
+    user_ids = [database.create_user(f"analytics_{n}", 'bench') for n in range(users)]
+    for user_id in user_ids:
+        seed_history(database, user_id, history_days, logs_per_day)
+    writer_user = database.create_user('writer', 'bench')
+    record_id = database.get_or_create_daily_record(writer_user, date.today())['id']
+
+    database.enable_snapshot(max_staleness_seconds=max(refresh_seconds * 4, 60))
+    results = {}
+    for phase, reader_count, use_snapshot in (('idle', 0, False), ('live analytics', readers, False),
+                                              ('snapshot analytics', readers, True)):
+        stop = threading.Event()
+        counts, refresh_timings = [], []
+        threads = [threading.Thread(target=analytics_reader,
+                                    args=(database, user_ids, use_snapshot, stop, counts))
+                   for _ in range(reader_count)]
+        if use_snapshot:
+            database.refresh_snapshot()
+            threads.append(threading.Thread(target=snapshot_refresher,
+                                            args=(database, refresh_seconds, stop, refresh_timings)))
+        for thread in threads:
+            thread.start()
+        latencies, wall_ns = write_phase(database, writer_user, record_id, seconds, pause_ms / 1000)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        stats = summarize(latencies, wall_ns)
+        stats['max_us'] = max(latencies) / 1000
+        stats['analytics_reads'] = len(counts)
+        results[f"write[{phase}]"] = stats
+        if refresh_timings:
+            results['snapshot.refresh'] = summarize(refresh_timings, sum(refresh_timings))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Write latency while analytics reads run on the live file or on the snapshot')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--history-days', type=int, default=365)
+    parser.add_argument('--logs-per-day', type=int, default=50)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--pause-ms', type=float, default=5, help='pause between writes')
+    parser.add_argument('--refresh-seconds', type=float, default=2)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    args = parser.parse_args()
+
+    # database.py reads DB_PATH on import, so point it at the scratch file first.
+    scratch = tempfile.TemporaryDirectory(prefix='timesetor_bench_')
+    os.environ['TIMESETOR_DB_PATH'] = os.path.join(scratch.name, 'bench.db')
+    os.environ.pop('TIMESETOR_DB_URL', None)
+
+    results = run(args.users, args.history_days, args.logs_per_day, args.readers,
+                  args.seconds, args.pause_ms, args.refresh_seconds)
+    print_table(results)
+    print(f"\n{'phase':<44} {'max us':>10} {'analytics reads':>16}")
+    for name, stats in results.items():
+        if name.startswith('write['):
+            print(f"{name:<44} {stats['max_us']:>10.0f} {stats['analytics_reads']:>16}")
+
+    if args.compare:
+        print()
+        for row in compare_results(load_results(args.compare), results, 'p99_us'):
+            flag = '  REGRESSION' if row['regression'] else ''
+            print(f"{row['name']:<44} p99 {row['before']:>10.1f} -> {row['after']:>10.1f} us "
+                  f"({row['change']:+.1%}){flag}")
+
+    save_results(args.output, results, vars(args))
+    print(f"\nResults written to {args.output}")
+    scratch.cleanup()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import measure, summarize, print_table, save_results, load_results, compare_results
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'timer_wheel.json')
+
+def run(iterations: int, sessions_list) -> dict:
+    from timer_wheel import TimerWheel
+
+    results = {}
+    now = time.time()
+    for sessions in sessions_list:
+        # Pending pomodoros spread over the next 25 minutes, one per user.
+        wheel = TimerWheel(1.0)
+        for user_id in range(sessions):
+            wheel.schedule(user_id, now + (user_id % 1500), user_id)
+        results[f"schedule[{sessions} pending]"] = measure(
+            lambda i: wheel.schedule(i % sessions, now + 60 + i % 1500, i), iterations)
+        results[f"cancel+schedule[{sessions} pending]"] = measure(
+            lambda i: (wheel.cancel(i % sessions), wheel.schedule(i % sessions, now + 60 + i % 1500, i)),
+            iterations)
+
+        # One tick of the wheel thread: scans its slot and pops what is due.
+        latencies = []
+        started = time.perf_counter_ns()
+        for second in range(1, 301):
+            t0 = time.perf_counter_ns()
+            wheel.advance(now + second)
+            latencies.append(time.perf_counter_ns() - t0)
+        results[f"advance 1s[{sessions} pending]"] = summarize(latencies, time.perf_counter_ns() - started)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Cost of scheduling, cancelling and expiring pomodoro timers')
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--sessions', type=lambda v: [int(n) for n in v.split(',')], default=[1000, 100000],
+                        help='comma-separated pending timer counts')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    args = parser.parse_args()
+
+    results = run(args.iterations, args.sessions)
+    print_table(results)
+
+    if args.compare:
+        print()
+        for row in compare_results(load_results(args.compare), results):
+            flag = '  REGRESSION' if row['regression'] else ''
+            print(f"{row['name']:<44} p50 {row['before']:>10.1f} -> {row['after']:>10.1f} us "
+                  f"({row['change']:+.1%}){flag}")
+
+    save_results(args.output, results, vars(args))
+    print(f"\nResults written to {args.output}")
+
+if __name__ == '__main__':
+    main()
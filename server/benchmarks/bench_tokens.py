@@ -0,0 +1,44 @@
+import os
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto import KeyRing, generate_key, generate_token, verify_token
+
+SALT = "bench_salt"
+ITERATIONS = 20000
+
+def bench(label: str, func, iterations: int = ITERATIONS):
+    func()
+    seconds = timeit.timeit(func, number=iterations)
+    per_call_us = seconds / iterations * 1e6
+    print(f"{label:<40} {per_call_us:8.2f} us/verify  {iterations / seconds:10.0f} ops/s")
+    return per_call_us
+
+def main():
+    ring = KeyRing(SALT, days=2)
+    now = datetime.now()
+    today_key = generate_key(date.today().isoformat(), SALT)
+    yesterday_key = generate_key((date.today() - timedelta(days=1)).isoformat(), SALT)
+    
+    legacy_today = generate_token(1, now, today_key)
+    legacy_yesterday = generate_token(1, now, yesterday_key)
+    ring_token = ring.issue_token(1, now)
+    unknown_kid = "19700101." + legacy_today
+    
+    assert ring.verify(legacy_today) == 1
+    assert ring.verify(legacy_yesterday) == 1
+    assert ring.verify(ring_token) == 1
+    assert ring.verify(unknown_kid) is None
+    
+    print(f"Token verify cost ({ITERATIONS} iterations each)")
+    bench("verify_token (single key, legacy)", lambda: verify_token(legacy_today, today_key))
+    bench("KeyRing.verify legacy, today's key", lambda: ring.verify(legacy_today))
+    bench("KeyRing.verify legacy, yesterday's key", lambda: ring.verify(legacy_yesterday))
+    bench("KeyRing.verify key id token", lambda: ring.verify(ring_token))
+    bench("KeyRing.verify unknown key id", lambda: ring.verify(unknown_kid))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+def percentile(sorted_values: List[int], fraction: float) -> int:
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(latencies_ns: List[int], wall_ns: int) -> Dict:
+    latencies_ns = sorted(latencies_ns)
+    count = len(latencies_ns)
+    return {
+        'iterations': count,
+        'p50_us': percentile(latencies_ns, 0.50) / 1000,
+        'p95_us': percentile(latencies_ns, 0.95) / 1000,
+        'p99_us': percentile(latencies_ns, 0.99) / 1000,
+        'mean_us': (sum(latencies_ns) / count / 1000) if count else 0,
+        'ops_per_sec': (count / (wall_ns / 1e9)) if wall_ns else 0,
+    }
+
+def measure(func: Callable, iterations: int, warmup: int = 10) -> Dict:
+    for i in range(warmup):
+        func(i)
+    
+    latencies = []
+    clock = time.perf_counter_ns
+    started = clock()
+    for i in range(iterations):
+        t0 = clock()
+        func(i)
+        latencies.append(clock() - t0)
+    return summarize(latencies, clock() - started)
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode('utf-8').strip()
+    except Exception:
+        return None
+
+def save_results(path: str, results: Dict[str, Dict], params: Dict = None):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    payload = {
+        'created_at': datetime.now().isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params or {},
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+
+def load_results(path: str) -> Dict[str, Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['results']
+
+def compare_results(baseline: Dict[str, Dict], current: Dict[str, Dict],
+                    metric: str = 'p50_us', threshold: float = 0.2) -> List[Dict]:
+    rows = []
+    for name, stats in current.items():
+        if name not in baseline or metric not in stats:
+            continue
+        before = baseline[name].get(metric) or 0
+        after = stats[metric]
+        change = (after - before) / before if before else 0.0
+        rows.append({
+            'name': name,
+            'before': before,
+            'after': after,
+            'change': change,
+            'regression': change > threshold,
+        })
+    return rows
+
+def print_table(results: Dict[str, Dict]):
+    print(f"{'benchmark':<44} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10} {'ops/s':>12}")
+    for name, stats in results.items():
+        print(f"{name:<44} {stats['p50_us']:>10.1f} {stats['p95_us']:>10.1f} "
+              f"{stats['p99_us']:>10.1f} {stats['ops_per_sec']:>12.0f}")
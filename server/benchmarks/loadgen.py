@@ -0,0 +1,330 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import requests
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import percentile
+
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+LOCK_MARKER = 'database is locked'
+
+ENTERTAINMENT_APPS = ['com.tencent.mm', 'com.bilibili', 'com.sina.weibo', 'com.zhihu.android']
+OTHER_APPS = ['com.android.settings', 'com.example.notes', 'com.android.chrome']
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.monotonic()
+            self.latencies = {}
+            self.errors = {}
+            self.status_counts = {}
+
+    def record(self, route: str, latency_ns: int, status: int, error: bool):
+        with self.lock:
+            self.latencies.setdefault(route, []).append(latency_ns)
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            if error:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            routes = {}
+            total = 0
+            total_errors = 0
+            for route, values in self.latencies.items():
+                values = sorted(values)
+                histogram = [0] * (len(BUCKETS_MS) + 1)
+                for value in values:
+                    ms = value / 1e6
+                    for index, bound in enumerate(BUCKETS_MS):
+                        if ms <= bound:
+                            histogram[index] += 1
+                            break
+                    else:
+                        histogram[-1] += 1
+                errors = self.errors.get(route, 0)
+                routes[route] = {
+                    'requests': len(values),
+                    'errors': errors,
+                    'error_rate': errors / len(values),
+                    'p50_ms': percentile(values, 0.50) / 1e6,
+                    'p95_ms': percentile(values, 0.95) / 1e6,
+                    'p99_ms': percentile(values, 0.99) / 1e6,
+                    'histogram_ms': dict(zip([str(b) for b in BUCKETS_MS] + ['+Inf'], histogram)),
+                }
+                total += len(values)
+                total_errors += errors
+            return {
+                'elapsed_seconds': elapsed,
+                'requests': total,
+                'errors': total_errors,
+                'error_rate': (total_errors / total) if total else 0.0,
+                'throughput_rps': (total / elapsed) if elapsed else 0.0,
+                'status_counts': dict(self.status_counts),
+                'routes': routes,
+            }
+
+class LockCounter:
+    def __init__(self, stream):
+        self.count = 0
+        self.thread = threading.Thread(target=self._pump, args=(stream,), daemon=True)
+        self.thread.start()
+
+    def _pump(self, stream):
+        for line in iter(stream.readline, b''):
+            if LOCK_MARKER.encode('utf-8') in line:
+                self.count += 1
+
+class Device:
+    def __init__(self, base_url: str, user: dict, index: int, stats: Stats,
+                 stop: threading.Event, args):
+        self.base_url = base_url
+        self.user = user
+        self.device_id = f"{user['username']}-dev{index}"
+        self.stats = stats
+        self.stop = stop
+        self.args = args
+        self.http = requests.Session()
+        self.rng = random.Random(hash(self.device_id))
+        self.token = None
+        self.pomodoro_session = None
+        self.pomodoro_until = 0.0
+
+    def call(self, method: str, route: str, body: dict = None,
+             ok_statuses=(200,)) -> dict:
+        headers = {'Authorization': f"Bearer {self.token}"} if self.token else {}
+        t0 = time.perf_counter_ns()
+        try:
+            response = self.http.request(method, self.base_url + route, json=body,
+                                         headers=headers, timeout=self.args.timeout)
+            status = response.status_code
+        except requests.RequestException:
+            response = None
+            status = 0
+        latency = time.perf_counter_ns() - t0
+        self.stats.record(f"{method} {route.split('?')[0]}", latency, status,
+                          status not in ok_statuses)
+        if response is not None and status in ok_statuses:
+            try:
+                return response.json()
+            except ValueError:
+                return {}
+        return None
+
+    def login(self):
+        data = self.call('POST', '/api/auth/login', {
+            'username': self.user['username'], 'password': self.user['password']
+        })
+        if data:
+            self.token = data['token']
+            self.call('POST', '/api/device/register', {
+                'device_id': self.device_id,
+                'device_name': self.device_id,
+                'device_type': 'android' if self.rng.random() < 0.7 else 'web'
+            })
+
+    def switch_apps(self):
+        for _ in range(self.rng.randint(1, self.args.burst_size)):
+            if self.rng.random() < 0.5:
+                app = self.rng.choice(ENTERTAINMENT_APPS)
+            else:
+                app = self.rng.choice(OTHER_APPS)
+            self.call('POST', '/api/activity/update', {
+                'activity_type': 'auto', 'app_name': app, 'device_id': self.device_id
+            })
+
+    def pomodoro_tick(self, now: float):
+        if self.pomodoro_session is None:
+            data = self.call('POST', '/api/pomodoro/start', {'duration_minutes': 25})
+            if data:
+                self.pomodoro_session = data['session_id']
+                self.pomodoro_until = now + self.args.pomodoro_seconds
+        elif now >= self.pomodoro_until:
+            self.call('POST', '/api/pomodoro/end', {
+                'session_id': self.pomodoro_session,
+                'actual_duration_minutes': 25,
+                'next_type': 'break'
+            })
+            self.pomodoro_session = None
+
+    def run(self):
+        self.login()
+        if not self.token:
+            return
+
+        next_poll = time.monotonic()
+        while not self.stop.is_set():
+            now = time.monotonic()
+            if now < next_poll:
+                self.stop.wait(next_poll - now)
+                continue
+            next_poll += 1.0 / self.args.poll_hz
+
+            self.call('GET', '/api/time/current')
+
+            roll = self.rng.random()
+            if roll < self.args.switch_probability:
+                self.switch_apps()
+            elif roll < self.args.switch_probability + self.args.pomodoro_probability \
+                    or self.pomodoro_session is not None:
+                self.pomodoro_tick(now)
+
+class User:
+    def __init__(self, base_url: str, prefix: str, index: int, stats: Stats,
+                 stop: threading.Event, args):
+        self.credentials = {'username': f"{prefix}_u{index}", 'password': 'load'}
+        self.stats = stats
+        self.stop = stop
+        self.args = args
+        self.base_url = base_url
+        self.devices = []
+        self.threads = []
+
+    def wake(self):
+        # The first device does the signup and morning wake-up for the account.
+        first = Device(self.base_url, self.credentials, 0, self.stats, self.stop, self.args)
+        first.call('POST', '/api/auth/register', self.credentials)
+        first.login()
+        # 400 means the account already woke up today, e.g. on a reused database.
+        first.call('POST', '/api/time/wake', {}, ok_statuses=(200, 400))
+        self.devices.append(first)
+        for index in range(1, self.args.devices):
+            self.devices.append(Device(self.base_url, self.credentials, index,
+                                       self.stats, self.stop, self.args))
+
+    def start(self):
+        for device in self.devices:
+            thread = threading.Thread(target=device.run, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def sleep(self):
+        if self.devices and self.devices[0].token:
+            self.devices[0].call('POST', '/api/time/sleep', {}, ok_statuses=(200, 400))
+
+def spawn_server(port: int):
+    scratch = tempfile.mkdtemp(prefix='timesetor_load_')
+    env = dict(os.environ)
+    env['TIMESETOR_DB_PATH'] = os.path.join(scratch, 'load.db')
+    code = ("import main; app = main.create_app(); "
+            f"app.run(host='127.0.0.1', port={port}, debug=False, threaded=True)")
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=SERVER_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(base_url + '/api/health', timeout=0.5)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('Server did not start')
+
+def print_stage(users: int, devices: int, snapshot: dict, locks: int):
+    print(f"\n=== {users} users x {devices} devices: {snapshot['throughput_rps']:.1f} req/s, "
+          f"error rate {snapshot['error_rate']:.2%}, 'database is locked' x{locks} ===")
+    print(f"{'route':<32} {'reqs':>7} {'err':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, data in sorted(snapshot['routes'].items()):
+        print(f"{route:<32} {data['requests']:>7} {data['errors']:>6} "
+              f"{data['p50_ms']:>8.1f} {data['p95_ms']:>8.1f} {data['p99_ms']:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Closed-loop device fleet load generator')
+    parser.add_argument('--url', help='base URL of a running server; omit to spawn one')
+    parser.add_argument('--port', type=int, default=5055, help='port for a spawned server')
+    parser.add_argument('--server-log', help='stderr log of --url server, scanned for lock errors')
+    parser.add_argument('--ramp', default='5,10,25,50', help='comma separated user counts')
+    parser.add_argument('--devices', type=int, default=2, help='devices per user')
+    parser.add_argument('--stage-seconds', type=float, default=20)
+    parser.add_argument('--poll-hz', type=float, default=1.0)
+    parser.add_argument('--switch-probability', type=float, default=0.1,
+                        help='chance per poll of a burst of app switches')
+    parser.add_argument('--burst-size', type=int, default=5)
+    parser.add_argument('--pomodoro-probability', type=float, default=0.02)
+    parser.add_argument('--pomodoro-seconds', type=float, default=10,
+                        help='compressed length of a pomodoro work session')
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--output', help='write stage reports as JSON')
+    args = parser.parse_args()
+
+    process = None
+    lock_counter = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        process, base_url = spawn_server(args.port)
+        lock_counter = LockCounter(process.stderr)
+
+    prefix = f"load_{uuid.uuid4().hex[:8]}"
+    stats = Stats()
+    stop = threading.Event()
+    users = []
+    stages = []
+
+    def lock_count():
+        if lock_counter is not None:
+            return lock_counter.count
+        if args.server_log and os.path.exists(args.server_log):
+            with open(args.server_log, 'r', encoding='utf-8', errors='replace') as f:
+                return f.read().count(LOCK_MARKER)
+        return 0
+
+    try:
+        for target in [int(n) for n in args.ramp.split(',')]:
+            locks_before = lock_count()
+            stats.reset()
+            new_users = []
+            while len(users) < target:
+                user = User(base_url, prefix, len(users), stats, stop, args)
+                user.wake()
+                users.append(user)
+                new_users.append(user)
+            for user in new_users:
+                user.start()
+
+            time.sleep(args.stage_seconds)
+            snapshot = stats.snapshot()
+            locks = lock_count() - locks_before
+            snapshot.update({'users': target, 'devices_per_user': args.devices,
+                             'database_locked': locks})
+            stages.append(snapshot)
+            print_stage(target, args.devices, snapshot, locks)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for user in users:
+            for thread in user.threads:
+                thread.join(timeout=args.timeout)
+        # End of the simulated day: everyone goes to sleep.
+        stats.reset()
+        for user in users:
+            user.sleep()
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'base_url': base_url, 'args': vars(args), 'stages': stages}, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'latest.json')
+
+def main():
+    parser = argparse.ArgumentParser(description='TimeSetor server micro-benchmarks')
+    parser.add_argument('--suite', choices=['all', 'routes', 'functions'], default='all')
+    parser.add_argument('--iterations', type=int, default=500,
+                        help='requests per route (pure functions run 40x this)')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--history-days', type=int, default=365)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    parser.add_argument('--metric', default='p50_us')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown that counts as a regression')
+    args = parser.parse_args()
+    
+    scratch = tempfile.TemporaryDirectory(prefix='timesetor_bench_')
+    os.environ['TIMESETOR_DB_PATH'] = os.path.join(scratch.name, 'bench.db')
+    
+    from harness import save_results, load_results, compare_results, print_table
+    
+    results = {}
+    if args.suite in ('all', 'functions'):
+        import bench_functions
+        results.update(bench_functions.run(args.iterations * 40))
+    if args.suite in ('all', 'routes'):
+        import bench_routes
+        results.update(bench_routes.run(args.iterations, args.users, args.history_days))
+    
+    print_table(results)
+    save_results(args.output, results, {
+        'suite': args.suite,
+        'iterations': args.iterations,
+        'users': args.users,
+        'history_days': args.history_days,
+    })
+    print(f"\nResults written to {args.output}")
+    
+    exit_code = 0
+    if args.compare:
+        rows = compare_results(load_results(args.compare), results, args.metric, args.threshold)
+        print(f"\nComparison on {args.metric} (threshold {args.threshold:+.0%})")
+        for row in rows:
+            flag = 'REGRESSION' if row['regression'] else ''
+            print(f"{row['name']:<44} {row['before']:>10.1f} -> {row['after']:>10.1f} "
+                  f"{row['change']:>+8.1%} {flag}")
+            if row['regression']:
+                exit_code = 1
+    
+    scratch.cleanup()
+    sys.exit(exit_code)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+
+def _resolve(future, version: int):
+    if not future.done():
+        future.set_result(version)
+
+class ChangeFeed:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._conditions = {}
+        self._futures = {}
+        self._forget_later = set()
+        # Versions start from the process start time, so a client holding a
+        # version from before a restart always sees the new state as newer.
+        self._base = int(time.time() * 1000)
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, self._base)
+
+    def forget(self, user_id: int):
+        # Called when a user goes idle so the per-user maps stay bounded. The
+        # base moves up past the dropped version, so the user's next version
+        # is still newer than anything a client may be holding.
+        with self._lock:
+            if user_id in self._conditions or user_id in self._futures:
+                self._forget_later.add(user_id)
+            else:
+                self._forget_locked(user_id)
+
+    def _forget_locked(self, user_id: int):
+        self._forget_later.discard(user_id)
+        version = self._versions.pop(user_id, None)
+        if version is not None and version > self._base:
+            self._base = version
+
+    def publish(self, user_id: int) -> int:
+        with self._lock:
+            version = self._versions.get(user_id, self._base) + 1
+            self._versions[user_id] = version
+            self._forget_later.discard(user_id)
+            waiting = self._conditions.get(user_id)
+            futures = self._futures.pop(user_id, None)
+
+        if waiting is not None:
+            condition = waiting[0]
+            with condition:
+                condition.notify_all()
+        if futures:
+            for loop, future in futures:
+                loop.call_soon_threadsafe(_resolve, future, version)
+        return version
+
+    def wait(self, user_id: int, since: int, timeout: float) -> int:
+        # Entries are [condition, waiter count] and go away with the last waiter.
+        with self._lock:
+            waiting = self._conditions.get(user_id)
+            if waiting is None:
+                waiting = self._conditions[user_id] = [threading.Condition(), 0]
+            waiting[1] += 1
+
+        condition = waiting[0]
+        deadline = time.monotonic() + timeout
+        try:
+            with condition:
+                while self.version(user_id) <= since:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    condition.wait(remaining)
+            return self.version(user_id)
+        finally:
+            with self._lock:
+                waiting[1] -= 1
+                if not waiting[1]:
+                    del self._conditions[user_id]
+                    if user_id in self._forget_later and user_id not in self._futures:
+                        self._forget_locked(user_id)
+
+    async def wait_async(self, user_id: int, since: int, timeout: float) -> int:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        entry = (loop, future)
+        with self._lock:
+            version = self._versions.get(user_id, self._base)
+            if version > since:
+                return version
+            self._futures.setdefault(user_id, set()).add(entry)
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return self.version(user_id)
+        finally:
+            with self._lock:
+                waiters = self._futures.get(user_id)
+                if waiters is not None:
+                    waiters.discard(entry)
+                    if not waiters:
+                        del self._futures[user_id]
+                        if user_id in self._forget_later and user_id not in self._conditions:
+                            self._forget_locked(user_id)
+
+feed = ChangeFeed()
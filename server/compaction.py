@@ -0,0 +1,82 @@
+import argparse
+import threading
+import time
+from datetime import date
+from typing import Dict
+
+from database import (
+    get_compactable_daily_records, compact_time_logs, get_database_size, incremental_vacuum
+)
+
+def run_compaction(today: date = None, stale_days: int = 1, batch_size: int = 500,
+                   vacuum: bool = True) -> Dict:
+    started = time.perf_counter()
+    today = today or date.today()
+    size_before = get_database_size()
+
+    days = rows_before = rows_after = 0
+    while True:
+        records = get_compactable_daily_records(today, stale_days, batch_size)
+        if not records:
+            break
+        for record in records:
+            result = compact_time_logs(record['id'])
+            days += 1
+            rows_before += result['rows_before']
+            rows_after += result['rows_after']
+
+    vacuum_mode = incremental_vacuum()['mode'] if vacuum else None
+    size_after = get_database_size()
+
+    report = {
+        'days': days,
+        'rows_before': rows_before,
+        'rows_after': rows_after,
+        'rows_removed': rows_before - rows_after,
+        'bytes_before': size_before['bytes'],
+        'bytes_after': size_after['bytes'],
+        'bytes_reclaimed': size_before['bytes'] - size_after['bytes'],
+        'vacuum': vacuum_mode,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+    print(f"time_logs compaction: {days} days, {report['rows_removed']} rows removed, "
+          f"{report['bytes_reclaimed']} bytes reclaimed in {report['elapsed_ms']} ms")
+    if vacuum_mode == 'none':
+        print("Free pages not reclaimed: run timesetor-admin compact --convert-vacuum once, "
+              "with the server stopped, to switch the database to incremental vacuum")
+    return report
+
+def _schedule_loop(config: Dict):
+    time.sleep(config.get('initial_delay_seconds', 300))
+    interval = config.get('interval_hours', 24) * 3600
+    while True:
+        try:
+            run_compaction(stale_days=config.get('stale_days', 1),
+                           batch_size=config.get('batch_size', 500),
+                           vacuum=config.get('vacuum', True))
+        except Exception as e:
+            print(f"time_logs compaction failed: {e}")
+        time.sleep(interval)
+
+def start_scheduler(config: Dict) -> threading.Thread:
+    thread = threading.Thread(target=_schedule_loop, args=(config,),
+                              name='time-log-compaction', daemon=True)
+    thread.start()
+    return thread
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge repeated time_logs segments of closed days')
+    parser.add_argument('--today', type=date.fromisoformat,
+                        help='treat this date as today (days before it may be closed)')
+    parser.add_argument('--stale-days', type=int, default=1,
+                        help='days after which an unfinished day is treated as closed')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--no-vacuum', action='store_true')
+    args = parser.parse_args()
+
+    report = run_compaction(args.today, args.stale_days, args.batch_size, not args.no_vacuum)
+    for key, value in report.items():
+        print(f"{key:<16} {value}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import argparse
+import itertools
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from time_engine import (
+    get_config, to_minutes, minutes_to_time_str, calculate_virtual_wake_time,
+    calculate_expected_sleep_time, calculate_entertainment_multiplier
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Each day the user is assumed to follow the app: they wake at the virtual
+# wake time shown yesterday and go to bed at the expected sleep time, which
+# in turn is what the next day's virtual sleep is measured against.
+
+def build_grid(rates: List[float], wake_starts: List[int], sleep_starts: List[int]) -> Dict[str, List]:
+    combinations = list(itertools.product(rates, wake_starts, sleep_starts))
+    return {
+        'rate': [c[0] for c in combinations],
+        'wake': [c[1] for c in combinations],
+        'sleep': [c[2] for c in combinations]
+    }
+
+def simulate_scalar(rate: float, wake: int, sleep: int, time_config: Dict, days: int) -> Dict:
+    today = date.today()
+    midnight = datetime.combine(today, datetime.min.time())
+    target_wake = to_minutes(time_config['target_wake_time'])
+    target_sleep = to_minutes(time_config['target_sleep_time'])
+    entertainment_hours = time_config['target_entertainment_hours']
+    study_hours = time_config['target_study_hours']
+
+    wakes, sleeps, multipliers = [wake], [sleep], []
+    virtual_sleep = None
+    for _ in range(days):
+        real_wake = midnight + timedelta(minutes=wake)
+        virtual_wake, _ = calculate_virtual_wake_time(real_wake, target_wake, rate)
+        yesterday_sleep = midnight + timedelta(minutes=sleep - (1440 if sleep >= 720 else 0))
+        expected_sleep = calculate_expected_sleep_time(yesterday_sleep, target_sleep, rate)
+        multipliers.append(calculate_entertainment_multiplier(
+            real_wake, expected_sleep, virtual_wake, virtual_sleep,
+            entertainment_hours, study_hours))
+
+        wake = virtual_wake.hour * 60 + virtual_wake.minute
+        sleep = expected_sleep.hour * 60 + expected_sleep.minute
+        virtual_sleep = expected_sleep - timedelta(days=1)
+        wakes.append(wake)
+        sleeps.append(sleep)
+    return {'wake': wakes, 'sleep': sleeps, 'multiplier': multipliers}
+
+def approach_time_batch(current, target: int, rate):
+    diff = target - current
+    step = np.trunc(diff * rate).astype(np.int64)
+    forward = np.where(diff > 720, current - np.trunc((1440 - diff) * rate).astype(np.int64), current + step)
+    backward = np.where(diff < -720, current + np.trunc((1440 + diff) * rate).astype(np.int64), current + step)
+    moved = np.where(diff > 0, forward, backward) % 1440
+    return np.where(np.abs(diff) <= 1, target, moved)
+
+def entertainment_multiplier_batch(wake, expected_sleep, virtual_wake, virtual_sleep,
+                                   entertainment_hours: float, study_hours: float):
+    real_awake = expected_sleep + np.where(expected_sleep < 720, 1440, 0) - wake
+    if virtual_sleep is None:
+        virtual_awake = np.full(wake.shape, 1440.0)
+    else:
+        virtual_awake = 1440 - (virtual_wake - virtual_sleep)
+        virtual_awake = np.where(virtual_awake < 0, virtual_awake + 1440, virtual_awake)
+
+    entertainment = entertainment_hours * 60
+    study = study_hours * 60
+    x = (2 * virtual_awake - study - real_awake + entertainment) / (2 * entertainment)
+    x = np.clip(x, 0.5, 10.0)
+    x = np.where(real_awake - entertainment - study <= 0, 10.0, x)
+    return np.where(virtual_awake - entertainment - study <= 0, 1.0, x)
+
+def simulate_batch(grid: Dict[str, List], time_config: Dict, days: int) -> Dict:
+    if np is None:
+        raise RuntimeError("Batched simulation requires numpy: pip install numpy")
+
+    target_wake = to_minutes(time_config['target_wake_time'])
+    target_sleep = to_minutes(time_config['target_sleep_time'])
+    rate = np.asarray(grid['rate'], dtype=np.float64)
+    wake = np.asarray(grid['wake'], dtype=np.int64)
+    sleep = np.asarray(grid['sleep'], dtype=np.int64)
+
+    wakes = np.empty((days + 1, len(rate)), dtype=np.int64)
+    sleeps = np.empty((days + 1, len(rate)), dtype=np.int64)
+    multipliers = np.empty((days, len(rate)), dtype=np.float64)
+    wakes[0], sleeps[0] = wake, sleep
+
+    virtual_sleep = None
+    for day in range(days):
+        virtual_wake = approach_time_batch(wake, target_wake, rate)
+        expected_sleep = approach_time_batch(sleep, target_sleep, rate)
+        multipliers[day] = entertainment_multiplier_batch(
+            wake, expected_sleep, virtual_wake, virtual_sleep,
+            time_config['target_entertainment_hours'], time_config['target_study_hours'])
+
+        # Relative to the next day's midnight, last night's expected sleep is
+        # yesterday if it was before midnight and early today otherwise.
+        virtual_sleep = expected_sleep - np.where(expected_sleep >= 720, 1440, 0)
+        wake, sleep = virtual_wake, expected_sleep
+        wakes[day + 1], sleeps[day + 1] = wake, sleep
+    return {'wake': wakes, 'sleep': sleeps, 'multiplier': multipliers}
+
+def simulate(grid: Dict[str, List], time_config: Dict = None, days: int = 56) -> Dict:
+    time_config = time_config or get_config()['time']
+    if np is not None:
+        return simulate_batch(grid, time_config, days)
+
+    runs = [simulate_scalar(rate, wake, sleep, time_config, days)
+            for rate, wake, sleep in zip(grid['rate'], grid['wake'], grid['sleep'])]
+    return {key: [list(values) for values in zip(*(run[key] for run in runs))]
+            for key in ('wake', 'sleep', 'multiplier')}
+
+def distance(minutes: int, target: int) -> int:
+    return abs((minutes - target + 720) % 1440 - 720)
+
+def days_to_converge(trajectory, target: int, tolerance: int = 0) -> List[Optional[int]]:
+    days = len(trajectory)
+    count = len(trajectory[0])
+    result = []
+    for column in range(count):
+        converged = None
+        for day in range(days - 1, -1, -1):
+            if distance(int(trajectory[day][column]), target) > tolerance:
+                break
+            converged = day
+        result.append(converged)
+    return result
+
+def check_against_scalar(grid: Dict[str, List], time_config: Dict, days: int) -> int:
+    batch = simulate_batch(grid, time_config, days)
+    mismatches = 0
+    for column, (rate, wake, sleep) in enumerate(zip(grid['rate'], grid['wake'], grid['sleep'])):
+        scalar = simulate_scalar(rate, wake, sleep, time_config, days)
+        same = (list(batch['wake'][:, column]) == scalar['wake']
+                and list(batch['sleep'][:, column]) == scalar['sleep']
+                and np.allclose(batch['multiplier'][:, column], scalar['multiplier']))
+        if not same:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"mismatch: rate={rate} wake={minutes_to_time_str(wake)} "
+                      f"sleep={minutes_to_time_str(sleep)}")
+    return mismatches
+
+def report(grid: Dict[str, List], result: Dict, time_config: Dict, tolerance: int = 0) -> List[Dict]:
+    target_wake = to_minutes(time_config['target_wake_time'])
+    target_sleep = to_minutes(time_config['target_sleep_time'])
+    wake_days = days_to_converge(result['wake'], target_wake, tolerance)
+    sleep_days = days_to_converge(result['sleep'], target_sleep, tolerance)
+    final_wake, final_sleep = result['wake'][-1], result['sleep'][-1]
+    final_multipliers = result['multiplier'][-1]
+
+    by_rate = {}
+    for column, rate in enumerate(grid['rate']):
+        both = None if wake_days[column] is None or sleep_days[column] is None \
+            else max(wake_days[column], sleep_days[column])
+        # approach_time truncates each step to whole minutes, so small rates
+        # stall a few minutes short of the target instead of reaching it.
+        stalled = max(distance(int(final_wake[column]), target_wake),
+                      distance(int(final_sleep[column]), target_sleep))
+        by_rate.setdefault(rate, []).append((both, stalled, float(final_multipliers[column])))
+
+    rows = []
+    for rate, runs in sorted(by_rate.items()):
+        converged = sorted(days for days, _, _ in runs if days is not None)
+        rows.append({
+            'rate': rate,
+            'runs': len(runs),
+            'converged': len(converged),
+            'median_days': converged[len(converged) // 2] if converged else None,
+            'max_days': converged[-1] if converged else None,
+            'max_stall_minutes': max(stalled for _, stalled, _ in runs),
+            'final_multiplier': min(m for _, _, m in runs),
+            'final_multiplier_max': max(m for _, _, m in runs)
+        })
+    return rows
+
+def _minutes_range(start: str, end: str, step: int) -> List[int]:
+    start_minutes, end_minutes = to_minutes(start), to_minutes(end)
+    span = (end_minutes - start_minutes) % 1440
+    return [(start_minutes + offset) % 1440 for offset in range(0, span + 1, step)]
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate day-over-day schedule convergence')
+    parser.add_argument('--rates', default='0.05,0.1,0.15,0.2,0.3,0.5')
+    parser.add_argument('--wake', default='04:00-14:00', help='range of starting wake times')
+    parser.add_argument('--sleep', default='20:00-06:00', help='range of starting sleep times')
+    parser.add_argument('--step', type=int, default=15, help='minutes between starting times')
+    parser.add_argument('--days', type=int, default=56)
+    parser.add_argument('--tolerance', type=int, default=5,
+                        help='minutes from target that count as converged')
+    parser.add_argument('--check', action='store_true',
+                        help='compare every run against the scalar time_engine functions')
+    args = parser.parse_args()
+
+    time_config = get_config()['time']
+    rates = [float(r) for r in args.rates.split(',') if r]
+    grid = build_grid(rates,
+                      _minutes_range(*args.wake.split('-'), args.step),
+                      _minutes_range(*args.sleep.split('-'), args.step))
+    runs = len(grid['rate'])
+
+    started = time.perf_counter()
+    result = simulate(grid, time_config, args.days)
+    elapsed = time.perf_counter() - started
+    backend = 'numpy' if np is not None else 'scalar (numpy not installed)'
+    print(f"{runs} runs x {args.days} days in {elapsed * 1000:.1f} ms using {backend}")
+    print(f"targets: wake {time_config['target_wake_time']}, sleep {time_config['target_sleep_time']}")
+
+    if args.check:
+        if np is None:
+            parser.error('--check requires numpy')
+        started = time.perf_counter()
+        mismatches = check_against_scalar(grid, time_config, args.days)
+        print(f"scalar check: {runs - mismatches}/{runs} runs identical "
+              f"({time.perf_counter() - started:.1f} s)")
+
+    print(f"\nconverged = within {args.tolerance} min of both targets for the rest of the run")
+    print(f"{'rate':>6} {'runs':>6} {'conv':>6} {'median d':>9} {'max d':>6} {'stall':>6} {'final multiplier':>18}")
+    for row in report(grid, result, time_config, args.tolerance):
+        median = '-' if row['median_days'] is None else row['median_days']
+        longest = '-' if row['max_days'] is None else row['max_days']
+        print(f"{row['rate']:>6.2f} {row['runs']:>6} {row['converged']:>6} {median:>9} {longest:>6} "
+              f"{row['max_stall_minutes']:>6} "
+              f"{row['final_multiplier']:>8.2f}-{row['final_multiplier_max']:<8.2f}")
+
+if __name__ == '__main__':
+    main()
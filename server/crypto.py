@@ -1,8 +1,6 @@
 import hashlib
 import base64
-from datetime import datetime, date
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
+from datetime import datetime, date, timedelta
 import os
 import json
 
@@ -25,11 +23,16 @@ def unpad_data(data: bytes) -> bytes:
     padding_length = data[-1]
     return data[:-padding_length]
 
+def _cipher(key: bytes, iv: bytes):
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.backends import default_backend
+    return Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
+
 def encrypt(data: str, key: bytes) -> str:
     iv = os.urandom(16)
     padded_data = pad_data(data.encode('utf-8'))
     
-    cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
+    cipher = _cipher(key, iv)
     encryptor = cipher.encryptor()
     encrypted = encryptor.update(padded_data) + encryptor.finalize()
     
@@ -41,7 +44,7 @@ def decrypt(encrypted_data: str, key: bytes) -> str:
     iv = raw_data[:16]
     encrypted = raw_data[16:]
     
-    cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
+    cipher = _cipher(key, iv)
     decryptor = cipher.decryptor()
     decrypted = decryptor.update(encrypted) + decryptor.finalize()
     
@@ -63,16 +66,22 @@ def hash_password(password: str, salt: str) -> str:
 def verify_password(password: str, salt: str, password_hash: str) -> bool:
     return hash_password(password, salt) == password_hash
 
-def generate_token(user_id: int, timestamp: datetime, key: bytes) -> str:
+def generate_token(user_id: int, timestamp: datetime, key: bytes, purpose: str = None) -> str:
     token_data = {
         'user_id': user_id,
         'timestamp': timestamp.isoformat()
     }
+    if purpose:
+        token_data['purpose'] = purpose
     return encrypt_json(token_data, key)
 
-def verify_token(token: str, key: bytes, expiry_hours: int = 24) -> int:
+def verify_token(token: str, key: bytes, expiry_hours: float = 24, purpose: str = None) -> int:
+    # A token issued for one purpose (say, opening a stream) is not accepted
+    # for any other, nor as a bearer token.
     try:
         token_data = decrypt_json(token, key)
+        if token_data.get('purpose') != purpose:
+            return None
         user_id = token_data['user_id']
         timestamp = datetime.fromisoformat(token_data['timestamp'])
         
@@ -83,3 +92,64 @@ def verify_token(token: str, key: bytes, expiry_hours: int = 24) -> int:
         return user_id
     except Exception:
         return None
+
+KEY_ID_SEPARATOR = '.'
+
+def key_id_for(day: date) -> str:
+    return day.strftime('%Y%m%d')
+
+class KeyRing:
+    def __init__(self, salt: str, days: int = 2):
+        self.salt = salt
+        self.days = max(1, days)
+        self._state = (None, (), {})
+
+    def _current_state(self):
+        today = date.today()
+        state = self._state
+        if state[0] == today:
+            return state
+        
+        old_keys = state[2]
+        key_ids = []
+        keys = {}
+        for offset in range(self.days):
+            day = today - timedelta(days=offset)
+            key_id = key_id_for(day)
+            key_ids.append(key_id)
+            keys[key_id] = old_keys.get(key_id) or generate_key(day.isoformat(), self.salt)
+        
+        state = (today, tuple(key_ids), keys)
+        self._state = state
+        return state
+
+    def current(self) -> tuple:
+        _, key_ids, keys = self._current_state()
+        return key_ids[0], keys[key_ids[0]]
+
+    def get(self, key_id: str) -> bytes:
+        return self._current_state()[2].get(key_id)
+
+    def issue_token(self, user_id: int, timestamp: datetime, purpose: str = None) -> str:
+        key_id, key = self.current()
+        return f"{key_id}{KEY_ID_SEPARATOR}{generate_token(user_id, timestamp, key, purpose)}"
+
+    def verify(self, token: str, expiry_hours: float = 24, purpose: str = None) -> int:
+        _, key_ids, keys = self._current_state()
+        
+        if KEY_ID_SEPARATOR in token:
+            key_id, body = token.split(KEY_ID_SEPARATOR, 1)
+            key = keys.get(key_id)
+            if key is None:
+                return None
+            return verify_token(body, key, expiry_hours, purpose)
+        
+        # Tokens issued before key ids were embedded: try the ring newest first.
+        for key_id in key_ids:
+            user_id = verify_token(token, keys[key_id], expiry_hours, purpose)
+            if user_id is not None:
+                return user_id
+        return None
+
+def ring_days_for_expiry(expiry_hours: float) -> int:
+    return int(-(-expiry_hours // 24)) + 1
@@ -0,0 +1,216 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from database import (
+    save_engine_snapshot, get_engine_snapshot, delete_engine_snapshot, delete_engine_snapshots_before
+)
+from time_engine import EngineConfig, TimeEngine
+
+PRUNE_INTERVAL = 3600
+
+SESSION_DATETIME_FIELDS = ('wake_time', 'expected_sleep', 'last_update')
+
+def serialize_session(session: Dict) -> Dict:
+    data = dict(session)
+    for field in SESSION_DATETIME_FIELDS:
+        if isinstance(data.get(field), datetime):
+            data[field] = data[field].isoformat()
+    return data
+
+def deserialize_session(data: Dict) -> Dict:
+    session = dict(data)
+    for field in SESSION_DATETIME_FIELDS:
+        if isinstance(session.get(field), str):
+            session[field] = datetime.fromisoformat(session[field])
+    return session
+
+def estimate_engine_bytes(engine) -> int:
+    size = sys.getsizeof(engine)
+    state = getattr(engine, '__dict__', None)
+    if state is not None:
+        size += sys.getsizeof(state)
+        values = state.values()
+    else:
+        values = [getattr(engine, name, None) for name in getattr(engine, '__slots__', ())]
+    for value in values:
+        # Configs are shared between engines, so they are not counted here.
+        if not isinstance(value, (dict, EngineConfig)):
+            size += sys.getsizeof(value)
+    return size
+
+class EngineRegistry:
+    def __init__(self, factory: Callable[[int], TimeEngine], sessions: Dict,
+                 max_resident: int = 10000, idle_seconds: float = 1800,
+                 memory_budget_bytes: int = 0, sweep_interval: float = 60,
+                 snapshot_ttl_seconds: float = 48 * 3600,
+                 on_evict: Optional[Callable[[int], None]] = None):
+        self.factory = factory
+        self.on_evict = on_evict
+        self.sessions = sessions
+        self.max_resident = max_resident
+        self.idle_seconds = idle_seconds
+        self.memory_budget_bytes = memory_budget_bytes
+        self.sweep_interval = sweep_interval
+        self.snapshot_ttl_seconds = snapshot_ttl_seconds
+        self.engine_bytes = None
+
+        self._lock = threading.Lock()
+        self._engines = OrderedDict()
+        self._last_access = {}
+        self._pending = {}
+        self._evicted = set()
+        self._last_sweep = time.monotonic()
+        self._last_prune = 0.0
+
+        self.evictions_total = 0
+        self.rehydrations_total = 0
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._engines or user_id in self._evicted
+
+    @property
+    def evicted_count(self) -> int:
+        return len(self._evicted)
+
+    def _capacity(self) -> int:
+        if self.memory_budget_bytes and self.engine_bytes:
+            return max(1, min(self.max_resident, self.memory_budget_bytes // self.engine_bytes))
+        return self.max_resident
+
+    def _touch(self, user_id: int):
+        self._engines.move_to_end(user_id)
+        self._last_access[user_id] = time.monotonic()
+
+    def get(self, user_id: int, create: bool = False) -> Optional[TimeEngine]:
+        with self._lock:
+            engine = self._engines.get(user_id)
+            if engine is not None:
+                self._touch(user_id)
+                return engine
+            pending = self._pending.get(user_id)
+
+        engine = self._rehydrate(user_id, pending)
+        if engine is None:
+            if not create:
+                return None
+            engine = self.factory(user_id)
+            if self.engine_bytes is None:
+                self.engine_bytes = estimate_engine_bytes(engine)
+
+        with self._lock:
+            existing = self._engines.get(user_id)
+            if existing is not None:
+                self._touch(user_id)
+                return existing
+            self._engines[user_id] = engine
+            self._touch(user_id)
+            self._evicted.discard(user_id)
+            victims = self._select_victims()
+
+        self._persist(victims)
+        return engine
+
+    def _rehydrate(self, user_id: int, pending: Optional[Dict]) -> Optional[TimeEngine]:
+        snapshot = pending
+        if snapshot is None:
+            snapshot = get_engine_snapshot(user_id)
+            if snapshot is None:
+                return None
+
+        engine = self.factory(user_id)
+        engine.restore_snapshot(snapshot['engine'])
+        if snapshot.get('session') is not None and user_id not in self.sessions:
+            self.sessions[user_id] = deserialize_session(snapshot['session'])
+        self.rehydrations_total += 1
+        return engine
+
+    def _select_victims(self):
+        victims = []
+        capacity = self._capacity()
+        while len(self._engines) > capacity:
+            victims.append(self._evict_locked(next(iter(self._engines))))
+
+        now = time.monotonic()
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            cutoff = now - self.idle_seconds
+            for user_id in list(self._engines):
+                if self._last_access.get(user_id, now) > cutoff:
+                    break
+                victims.append(self._evict_locked(user_id))
+        return victims
+
+    def _evict_locked(self, user_id: int):
+        engine = self._engines.pop(user_id)
+        self._last_access.pop(user_id, None)
+        session = self.sessions.pop(user_id, None)
+        snapshot = {
+            'engine': engine.to_snapshot(),
+            'session': serialize_session(session) if session is not None else None
+        }
+        self._pending[user_id] = snapshot
+        self._evicted.add(user_id)
+        self.evictions_total += 1
+        return user_id, snapshot
+
+    def _persist(self, victims):
+        for user_id, snapshot in victims:
+            try:
+                save_engine_snapshot(user_id, snapshot)
+            finally:
+                with self._lock:
+                    if self._pending.get(user_id) is snapshot:
+                        del self._pending[user_id]
+            if self.on_evict is not None:
+                self.on_evict(user_id)
+
+    def sweep(self):
+        with self._lock:
+            self._last_sweep = 0
+            victims = self._select_victims()
+        self._persist(victims)
+
+        # A user who never comes back (or never records sleep) would keep a
+        # snapshot row and an _evicted entry forever; after the TTL the state
+        # is a previous day's anyway. Checked at most every PRUNE_INTERVAL.
+        now = time.monotonic()
+        if self.snapshot_ttl_seconds and now - self._last_prune >= PRUNE_INTERVAL:
+            self._last_prune = now
+            pruned = delete_engine_snapshots_before(
+                datetime.now() - timedelta(seconds=self.snapshot_ttl_seconds))
+            with self._lock:
+                for user_id in pruned:
+                    if user_id not in self._pending:
+                        self._evicted.discard(user_id)
+
+    def start_sweeper(self) -> threading.Thread:
+        # Eviction otherwise only runs when a new engine is added, so a quiet
+        # server would keep every idle engine resident.
+        thread = threading.Thread(target=self._sweep_loop, name='engine-sweeper', daemon=True)
+        thread.start()
+        return thread
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Engine sweep failed: {e}")
+
+    def discard(self, user_id: int):
+        with self._lock:
+            self._engines.pop(user_id, None)
+            self._last_access.pop(user_id, None)
+            self._pending.pop(user_id, None)
+            self._evicted.discard(user_id)
+        delete_engine_snapshot(user_id)
+        if self.on_evict is not None:
+            self.on_evict(user_id)
@@ -0,0 +1,88 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from database import (claim_idempotency_key, complete_idempotency_key, release_idempotency_key,
+                      prune_idempotency_keys, count_idempotency_keys)
+
+NEW = 'new'
+REPLAY = 'replay'
+IN_PROGRESS = 'in_progress'
+MISMATCH = 'mismatch'
+
+class Entry:
+    __slots__ = ('scope', 'key', 'fingerprint', 'status', 'body', 'content_type')
+
+    def __init__(self, scope, key: str, fingerprint: str):
+        self.scope = scope
+        self.key = key
+        self.fingerprint = fingerprint
+        self.status = None
+        self.body = None
+        self.content_type = None
+
+def fingerprint(method: str, path: str, body: bytes) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(method.encode('ascii'))
+    digest.update(b' ')
+    digest.update(path.encode('utf-8'))
+    digest.update(b'\n')
+    digest.update(body or b'')
+    return digest.hexdigest()
+
+class IdempotencyStore:
+    # Keys live in the database so a retry is recognised after a restart and
+    # on whichever API node it lands.
+    def __init__(self, ttl_seconds: float = 86400, in_progress_seconds: float = 300,
+                 prune_interval_seconds: float = 3600):
+        self.ttl_seconds = ttl_seconds
+        self.in_progress_seconds = in_progress_seconds
+        self.prune_interval_seconds = prune_interval_seconds
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+        self.replays_total = 0
+
+    def __len__(self) -> int:
+        return count_idempotency_keys()
+
+    def _maybe_prune(self, now: datetime):
+        with self._lock:
+            if time.monotonic() - self._last_prune < self.prune_interval_seconds:
+                return
+            self._last_prune = time.monotonic()
+        removed = prune_idempotency_keys(now)
+        if removed:
+            print(f"Pruned {removed} expired idempotency keys")
+
+    def begin(self, scope, key: str, request_fingerprint: str) -> Tuple[str, Optional[Entry]]:
+        now = datetime.now()
+        self._maybe_prune(now)
+        row = claim_idempotency_key(scope, key, request_fingerprint, now,
+                                    now + timedelta(seconds=self.ttl_seconds),
+                                    now - timedelta(seconds=self.in_progress_seconds))
+        entry = Entry(scope, key, request_fingerprint)
+        if row is None:
+            return NEW, entry
+        if row['fingerprint'] != request_fingerprint:
+            return MISMATCH, entry
+        if row['body'] is None:
+            return IN_PROGRESS, entry
+        entry.status = row['status']
+        entry.body = row['body']
+        entry.content_type = row['content_type']
+        self.replays_total += 1
+        return REPLAY, entry
+
+    def complete(self, entry: Entry, status: int, body: bytes, content_type: str):
+        try:
+            text = body.decode('utf-8')
+        except UnicodeDecodeError:
+            # Only text responses are stored; anything else runs again.
+            self.abandon(entry.scope, entry.key, entry)
+            return
+        complete_idempotency_key(entry.scope, entry.key, status, text, content_type)
+
+    def abandon(self, scope, key: str, entry: Entry):
+        release_idempotency_key(scope, key)
@@ -1,50 +1,164 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, send_file
 from flask_cors import CORS
 from datetime import datetime, date, timedelta
-import yaml
 import os
 import json
 import threading
 import atexit
+import hmac
 import time
+from typing import Optional
 
 from database import (
-    init_database, create_user, get_user_by_username, get_user_by_id,
+    ensure_schema, create_user, get_user_by_username, get_user_by_id,
     update_user_settings, get_or_create_daily_record, update_daily_record,
     get_daily_record, get_recent_daily_records, add_time_log, get_time_logs,
-    add_pomodoro_session, update_pomodoro_session, get_pomodoro_sessions,
+    add_pomodoro_session, get_pomodoro_sessions,
+    finish_pomodoro_session, get_open_pomodoro_sessions, count_completed_pomodoros,
+    get_pomodoro_session, pause_pomodoro_session, resume_pomodoro_session,
     add_ai_summary, get_ai_summaries, register_device, get_user_devices,
-    add_app_usage_log, get_app_usage_logs, get_yesterday_sleep_time,
-    get_yesterday_virtual_sleep_time
+    add_app_usage_log, add_app_usage_logs, get_app_usage_logs, get_yesterday_sleep_time,
+    get_yesterday_virtual_sleep_time, get_app_time_breakdown, get_changes,
+    get_change_log_head, get_change_log_pruned_seq, prune_change_log,
+    get_device_sync_cursor, set_device_sync_cursor
 )
 from time_engine import TimeEngine, get_config, reload_config
 from crypto import (
-    get_today_key, encrypt_json, decrypt_json, hash_password, verify_password,
-    generate_token, verify_token
+    KeyRing, ring_days_for_expiry, encrypt_json, decrypt_json, hash_password,
+    verify_password
 )
 from ai_service import AIService, should_generate_summary
+import metrics
+import profiling
+import query_log
+from change_feed import feed
+from engine_registry import EngineRegistry
+from pubsub import CLOSED, LocalHub
+from idempotency import IdempotencyStore, fingerprint, NEW, REPLAY, IN_PROGRESS
+import app_classifier
+import user_config
+import replay
+import compaction
+import snapshot
+import serializer
+import ratelimit
+from timer_wheel import TimerWheel
 
 app = Flask(__name__)
+app.json = serializer.JSONProvider(app)
 CORS(app)
 
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.yaml")
 
-user_engines = {}
 user_sessions = {}
+_key_ring = None
+_last_change_log_prune = 0.0
+
+# Built from config.yaml by create_app(), so importing this module reads no
+# config and opens no database.
+user_engines: EngineRegistry = None
+idempotency_keys: IdempotencyStore = None
+hub: LocalHub = None
+rate_limiter: ratelimit.RateLimiter = None
+load_shedder: ratelimit.LoadShedder = None
+pomodoro_timers: TimerWheel = None
+_app_created = False
+# Set once create_asgi_app() has installed the native SSE handler.
+_streaming = False
 
 def load_config():
-    with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
+    # Parsed once and re-read only when config.yaml changes on disk.
+    return get_config()
 
-def get_encryption_key():
-    config = load_config()
+def get_key_ring(config: dict = None) -> KeyRing:
+    global _key_ring
+    if config is None:
+        config = load_config()
     salt = config['security']['encryption_salt']
-    return get_today_key(salt)
+    days = ring_days_for_expiry(config['security']['token_expiry_hours'])
+    
+    ring = _key_ring
+    if ring is None or ring.salt != salt or ring.days != days:
+        ring = KeyRing(salt, days)
+        _key_ring = ring
+    return ring
+
+def create_user_engine(user_id: int) -> TimeEngine:
+    return TimeEngine(user_id, config_override=user_config.get_effective_config(user_id).config)
+
+def create_engine_registry(config: dict) -> EngineRegistry:
+    return EngineRegistry(
+        create_user_engine,
+        user_sessions,
+        max_resident=config.get('max_resident', 10000),
+        idle_seconds=config.get('idle_seconds', 1800),
+        memory_budget_bytes=int(config.get('memory_budget_mb', 0) * 1024 * 1024),
+        sweep_interval=config.get('sweep_interval_seconds', 60),
+        snapshot_ttl_seconds=config.get('snapshot_ttl_hours', 48) * 3600,
+        on_evict=feed.forget
+    )
+
+metrics.Gauge('timesetor_user_engines', 'Resident TimeEngine instances',
+              lambda: len(user_engines))
+metrics.Gauge('timesetor_user_engines_evicted', 'TimeEngine instances evicted to snapshots',
+              lambda: user_engines.evicted_count)
+metrics.CounterCallback('timesetor_engine_evictions_total', 'TimeEngine evictions since start',
+                        lambda: user_engines.evictions_total)
+metrics.CounterCallback('timesetor_engine_rehydrations_total', 'TimeEngine rehydrations since start',
+                        lambda: user_engines.rehydrations_total)
+metrics.Gauge('timesetor_snapshot_age_seconds', 'Age of the analytics read snapshot',
+              snapshot.age_seconds)
+metrics.CounterCallback('timesetor_snapshot_fallbacks_total', 'Analytics reads served live because the snapshot was stale',
+                        snapshot.fallbacks_total)
+metrics.Gauge('timesetor_user_sessions', 'Active wake sessions',
+              lambda: len(user_sessions))
+
+metrics.Gauge('timesetor_idempotency_keys', 'Stored Idempotency-Key responses',
+              lambda: len(idempotency_keys))
+metrics.CounterCallback('timesetor_idempotency_replays_total', 'Requests answered from a stored response',
+                        lambda: idempotency_keys.replays_total)
+
+metrics.Gauge('timesetor_pubsub_subscribers', 'Open state stream subscriptions',
+              lambda: hub.subscriber_count())
+metrics.CounterCallback('timesetor_rate_limited_total', 'Requests rejected by per-user or per-device rate limits',
+                        lambda: rate_limiter.limited_total if rate_limiter else 0)
+metrics.Gauge('timesetor_rate_limit_buckets', 'Token buckets held for users and devices',
+              lambda: len(rate_limiter.users) + len(rate_limiter.devices) if rate_limiter else 0)
+metrics.Gauge('timesetor_requests_in_flight', 'Requests counted against the load shedding limit',
+              lambda: load_shedder.in_flight if load_shedder else 0)
+metrics.Gauge('timesetor_pomodoro_timers', 'Open pomodoro sessions waiting to expire on the server',
+              lambda: len(pomodoro_timers) if pomodoro_timers else 0)
+metrics.CounterCallback('timesetor_pomodoro_expired_total', 'Pomodoro sessions completed by the server since start',
+                        lambda: pomodoro_timers.fired_total if pomodoro_timers else 0)
+metrics.CounterCallback('timesetor_requests_shed_total', 'Requests rejected because the server was overloaded',
+                        lambda: load_shedder.shed_total if load_shedder else 0)
+
+def load_app_overrides(user_id: int):
+    return user_config.get_user_settings(user_id).get('app_overrides')
 
-def get_user_engine(user_id: int) -> TimeEngine:
-    if user_id not in user_engines:
-        user_engines[user_id] = TimeEngine(user_id)
-    return user_engines[user_id]
+app_classifier.set_override_loader(load_app_overrides)
+
+def get_user_engine(user_id: int, create: bool = True) -> Optional[TimeEngine]:
+    # Read-only callers pass create=False so a user without an engine does
+    # not get one just by asking.
+    effective = user_config.get_effective_config(user_id)
+    engine = user_engines.get(user_id, create=create)
+    if engine is None:
+        return None
+    if engine.config is not effective.config:
+        engine.set_config(effective.config)
+    return engine
+
+def authenticate(token: str):
+    config = load_config()
+    expiry = config['security']['token_expiry_hours']
+    
+    if metrics.enabled:
+        start = time.perf_counter()
+        user_id = get_key_ring(config).verify(token, expiry)
+        metrics.TOKEN_VERIFY_LATENCY.observe(time.perf_counter() - start)
+        return user_id
+    return get_key_ring(config).verify(token, expiry)
 
 def require_auth(f):
     def decorated(*args, **kwargs):
@@ -52,21 +166,135 @@ def require_auth(f):
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({'error': 'Missing authorization token'}), 401
         
-        token = auth_header[7:]
-        key = get_encryption_key()
-        config = load_config()
-        expiry = config['security']['token_expiry_hours']
-        
-        user_id = verify_token(token, key, expiry)
+        user_id = authenticate(auth_header[7:])
         if user_id is None:
             return jsonify({'error': 'Invalid or expired token'}), 401
         
         request.user_id = user_id
+        rule = request.url_rule
+        device_id = request.headers.get('X-Device-Id') or request.args.get('device_id')
+        if not device_id:
+            body = request.get_json(silent=True)
+            if isinstance(body, dict) and isinstance(body.get('device_id'), str):
+                device_id = body['device_id']
+        wait = rate_limit_wait(user_id, device_id, rule.rule if rule else request.path)
+        if wait:
+            return retry_later(429, 'Rate limit exceeded', wait)
         return f(*args, **kwargs)
     
     decorated.__name__ = f.__name__
     return decorated
 
+def rate_limit_wait(user_id: int, device_id, route: str) -> float:
+    if rate_limiter is None:
+        return 0.0
+    return rate_limiter.check(user_id, device_id, route)
+
+def retry_later(status: int, message: str, seconds: float):
+    response = jsonify({'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = ratelimit.retry_after_header(seconds)
+    return response
+
+def idempotent(f):
+    # Must sit below require_auth: keys are scoped per user.
+    def decorated(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key or request.method not in ('POST', 'PUT', 'PATCH', 'DELETE'):
+            return f(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({'error': 'Idempotency-Key is too long'}), 400
+        
+        scope = request.user_id
+        status, entry = idempotency_keys.begin(
+            scope, key, fingerprint(request.method, request.path, request.get_data()))
+        if status == REPLAY:
+            return Response(entry.body, entry.status, mimetype=entry.content_type,
+                            headers={'Idempotent-Replayed': 'true'})
+        if status == IN_PROGRESS:
+            return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+        if status != NEW:
+            return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+        
+        try:
+            response = app.make_response(f(*args, **kwargs))
+        except Exception:
+            idempotency_keys.abandon(scope, key, entry)
+            raise
+        if response.status_code >= 500 or response.is_streamed:
+            idempotency_keys.abandon(scope, key, entry)
+        else:
+            idempotency_keys.complete(entry, response.status_code, response.get_data(), response.mimetype)
+        return response
+    
+    decorated.__name__ = f.__name__
+    return decorated
+
+def is_admin_request() -> bool:
+    admin_token = load_config().get('admin', {}).get('token') or ''
+    supplied = request.headers.get('X-Admin-Token') or ''
+    return bool(admin_token) and hmac.compare_digest(supplied, admin_token)
+
+def require_admin(f):
+    def decorated(*args, **kwargs):
+        if not is_admin_request():
+            return jsonify({'error': 'Admin token required'}), 403
+        return f(*args, **kwargs)
+    
+    decorated.__name__ = f.__name__
+    return decorated
+
+@app.before_request
+def start_request_timer():
+    if metrics.enabled:
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        rule = request.url_rule
+        metrics.observe_request(rule.rule if rule else 'unmatched', request.method,
+                                response.status_code, time.perf_counter() - started)
+    return response
+
+def admit_request():
+    rule = request.url_rule
+    if rule is not None and rule.rule in load_shedder.exempt_routes:
+        return None
+    if not load_shedder.admit():
+        return retry_later(503, 'Server overloaded', load_shedder.retry_after)
+    g.admitted_at = time.perf_counter()
+
+def release_request(exc):
+    started = g.pop('admitted_at', None)
+    if started is not None:
+        load_shedder.release(time.perf_counter() - started)
+
+def start_request_profile():
+    rule = request.url_rule
+    route = rule.rule if rule else 'unmatched'
+    requested = bool(request.headers.get('X-Profile')) and is_admin_request()
+    if profiling.should_profile(route, requested):
+        # Skipped while another request is being profiled.
+        g.profile_started = time.perf_counter()
+        g.profiler = profiling.start()
+
+def finish_request_profile(response):
+    profiler = g.get('profiler')
+    if profiler is not None:
+        rule = request.url_rule
+        name = profiling.save(profiler, request.method, rule.rule if rule else 'unmatched',
+                              time.perf_counter() - g.profile_started)
+        response.headers['X-Profile-Name'] = name
+    return response
+
+def end_request_profile(exc):
+    # Runs even when the view raised and after_request was skipped.
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiling.stop(profiler)
+
 @app.route('/api/auth/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -93,8 +321,7 @@ def register():
     
     user_id = create_user(username, password_hash, initial_settings)
     
-    key = get_encryption_key()
-    token = generate_token(user_id, datetime.now(), key)
+    token = get_key_ring(config).issue_token(user_id, datetime.now())
     
     return jsonify({
         'success': True,
@@ -121,8 +348,7 @@ def login():
     if not verify_password(password, salt, user['password_hash']):
         return jsonify({'error': 'Invalid credentials'}), 401
     
-    key = get_encryption_key()
-    token = generate_token(user['id'], datetime.now(), key)
+    token = get_key_ring(config).issue_token(user['id'], datetime.now())
     
     return jsonify({
         'success': True,
@@ -133,6 +359,7 @@ def login():
 
 @app.route('/api/user/settings', methods=['GET', 'PUT'])
 @require_auth
+@idempotent
 def user_settings():
     user_id = request.user_id
     
@@ -149,11 +376,14 @@ def user_settings():
         settings = data.get('settings', {})
         
         if update_user_settings(user_id, settings):
+            user_config.invalidate(user_id)
+            app_classifier.invalidate_user(user_id)
             return jsonify({'success': True})
         return jsonify({'error': 'Failed to update settings'}), 500
 
 @app.route('/api/device/register', methods=['POST'])
 @require_auth
+@idempotent
 def register_device_route():
     user_id = request.user_id
     data = request.get_json()
@@ -171,6 +401,7 @@ def register_device_route():
 
 @app.route('/api/time/wake', methods=['POST'])
 @require_auth
+@idempotent
 def record_wake():
     user_id = request.user_id
     data = request.get_json()
@@ -209,6 +440,7 @@ def record_wake():
         'last_activity': 'rest',
         'last_update': wake_time
     }
+    broadcast_state(user_id, engine)
     
     return jsonify({
         'success': True,
@@ -218,6 +450,7 @@ def record_wake():
 
 @app.route('/api/time/sleep', methods=['POST'])
 @require_auth
+@idempotent
 def record_sleep():
     user_id = request.user_id
     data = request.get_json()
@@ -246,41 +479,121 @@ def record_sleep():
     
     if user_id in user_sessions:
         del user_sessions[user_id]
-    if user_id in user_engines:
-        del user_engines[user_id]
+    if pomodoro_timers is not None:
+        timer = pomodoro_timers.cancel(user_id)
+        if timer is not None:
+            interrupt_pomodoro(timer)
+    broadcast_state(user_id)
+    user_engines.discard(user_id)
     
     return jsonify({
         'success': True,
         'virtual_sleep_time': virtual_sleep_display
     })
 
-@app.route('/api/time/current', methods=['GET'])
-@require_auth
-def get_current_time():
-    user_id = request.user_id
-    today = date.today()
-    daily_record = get_daily_record(user_id, today)
-    
-    if not daily_record or not daily_record.get('real_wake_time'):
-        return jsonify({
+def broadcast_state(user_id: int, engine: TimeEngine = None):
+    version = feed.publish(user_id)
+    if not hub.has_subscribers(user_id):
+        return
+    
+    event = {'type': 'state', 'version': version}
+    if engine is None:
+        event['status'] = 'not_awake'
+    else:
+        virtual_time, display = engine.get_virtual_time()
+        event.update({
+            'status': 'awake',
+            'real_time': datetime.now().isoformat(),
+            'virtual_time': virtual_time.isoformat(),
+            'virtual_time_display': display,
+            'current_speed': engine.get_current_speed(),
+            'current_activity': engine.current_activity
+        })
+    hub.publish(user_id, event)
+
+def current_time_state(user_id: int) -> dict:
+    # An engine is only created for a user who is actually awake; one who
+    # has gone to sleep would otherwise get it back on every poll.
+    if not is_awake(user_id):
+        return {
             'status': 'not_awake',
             'message': 'Please record your wake time first'
-        })
+        }
     
     engine = get_user_engine(user_id)
     virtual_time, display = engine.get_virtual_time()
     
-    return jsonify({
+    return {
         'status': 'awake',
         'real_time': datetime.now().isoformat(),
         'virtual_time': virtual_time.isoformat(),
         'virtual_time_display': display,
         'current_speed': engine.get_current_speed(),
         'current_activity': engine.current_activity
+    }
+
+@app.route('/api/time/current', methods=['GET'])
+@require_auth
+def get_current_time():
+    return jsonify(current_time_state(request.user_id))
+
+def long_poll_timeout(requested) -> float:
+    limit = load_config()['server'].get('long_poll_timeout', 30)
+    if requested is None or requested <= 0:
+        return limit
+    return min(requested, limit)
+
+def changes_state(user_id: int, version: int) -> dict:
+    state = current_time_state(user_id)
+    state['version'] = version
+    return state
+
+@app.route('/api/time/changes', methods=['GET'])
+@require_auth
+def get_time_changes():
+    user_id = request.user_id
+    since = request.args.get('since', -1, type=int)
+    timeout = long_poll_timeout(request.args.get('timeout', type=float))
+    
+    version = feed.wait(user_id, since, timeout)
+    return jsonify(changes_state(user_id, version))
+
+def sse_message(event) -> str:
+    return f"event: {event['type']}\nid: {event['version']}\ndata: {serializer.dumps(event).decode('utf-8')}\n\n"
+
+def authenticate_stream(token: str):
+    seconds = load_config().get('pubsub', {}).get('stream_token_seconds', 60)
+    return get_key_ring().verify(token, seconds / 3600, purpose='stream')
+
+@app.route('/api/time/stream/token', methods=['POST'])
+@require_auth
+def issue_stream_token():
+    # The SSE stream holds its connection open for as long as the page is, so
+    # it is only served by the async server; the threaded one would give up
+    # a worker thread per open tab. Clients poll /api/time/changes instead.
+    if not _streaming:
+        return jsonify({'error': 'Streaming is not available; poll /api/time/changes'}), 404
+    
+    # EventSource cannot send headers, so the token goes in the query string
+    # and from there into access logs. It is only good for opening a stream
+    # within the next minute.
+    return jsonify({
+        'token': get_key_ring().issue_token(request.user_id, datetime.now(), purpose='stream'),
+        'expires_in': load_config().get('pubsub', {}).get('stream_token_seconds', 60)
     })
 
+def parse_event_time(value, now: datetime) -> datetime:
+    if not value:
+        return now
+    event_time = datetime.fromisoformat(value)
+    if event_time.tzinfo is not None:
+        event_time = event_time.astimezone().replace(tzinfo=None)
+    # Client clocks drift; never accept an event from the future.
+    return min(event_time, now)
+
 @app.route('/api/activity/update', methods=['POST'])
 @require_auth
+@idempotent
 def update_activity():
     user_id = request.user_id
     data = request.get_json()
@@ -289,35 +602,40 @@ def update_activity():
     app_name = data.get('app_name')
     device_id = data.get('device_id')
     
-    config = load_config()
-    entertainment_apps = config['android'].get('entertainment_apps', [])
-    study_apps = config['android'].get('study_apps', [])
+    now = datetime.now()
+    event_time = parse_event_time(data.get('event_time'), now)
+    # Fetching the engine first rehydrates an evicted user's session as well.
+    engine = get_user_engine(user_id)
+    session = user_sessions.get(user_id)
+    
+    # Queued offline updates can arrive after newer ones; an update older than
+    # the last one applied would rewrite history, so it is acknowledged only.
+    if session and event_time < session.get('last_update', event_time):
+        return jsonify({
+            'success': True,
+            'stale': True,
+            'activity_type': engine.current_activity,
+            'speed': engine.current_speed
+        })
     
     if activity_type == 'auto' and app_name:
-        if app_name in entertainment_apps:
-            activity_type = 'entertainment'
-        elif app_name in study_apps:
-            activity_type = 'study'
-        else:
-            activity_type = 'rest'
+        activity_type = app_classifier.get_classifier().classify(app_name, user_id)
     
-    engine = get_user_engine(user_id)
-    speed = engine.update_activity(activity_type, app_name, entertainment_apps, study_apps)
+    speed = engine.update_activity(activity_type, app_name)
     
     today = date.today()
     daily_record = get_daily_record(user_id, today)
     
-    if daily_record and user_id in user_sessions:
-        session = user_sessions[user_id]
-        last_update = session.get('last_update', datetime.now())
-        duration = (datetime.now() - last_update).seconds
+    if daily_record and session is not None:
+        last_update = session.get('last_update', event_time)
+        duration = (event_time - last_update).seconds
         
         if duration > 0:
             virtual_time, virtual_display = engine.get_virtual_time()
             add_time_log(
                 user_id=user_id,
                 daily_record_id=daily_record['id'],
-                real_timestamp=datetime.now(),
+                real_timestamp=event_time,
                 virtual_timestamp=virtual_time,
                 virtual_time_display=virtual_display,
                 activity_type=session.get('last_activity', 'rest'),
@@ -329,7 +647,9 @@ def update_activity():
         session['last_activity'] = activity_type
         session['last_speed'] = speed
         session['last_app'] = app_name
-        session['last_update'] = datetime.now()
+        session['last_update'] = event_time
+    
+    broadcast_state(user_id, engine)
     
     return jsonify({
         'success': True,
@@ -337,8 +657,149 @@ def update_activity():
         'speed': speed
     })
 
+@app.route('/api/activity/app_usage', methods=['POST'])
+@require_auth
+@idempotent
+def ingest_app_usage():
+    user_id = request.user_id
+    data = request.get_json()
+    
+    device_id = data.get('device_id')
+    events = data.get('events') or []
+    if not device_id:
+        return jsonify({'error': 'Device ID required'}), 400
+    
+    packages = [event.get('app_package') for event in events]
+    if not all(packages):
+        return jsonify({'error': 'Every event needs app_package and start_time'}), 400
+    
+    activities = app_classifier.get_classifier().classify_many(packages, user_id)
+    logs = []
+    for event, activity in zip(events, activities):
+        if not event.get('start_time'):
+            return jsonify({'error': 'Every event needs app_package and start_time'}), 400
+        logs.append({
+            'device_id': device_id,
+            'app_package': event['app_package'],
+            'app_name': event.get('app_name'),
+            'start_time': event['start_time'],
+            'end_time': event.get('end_time'),
+            'duration_seconds': event.get('duration_seconds', 0),
+            'activity_type': activity
+        })
+    
+    inserted = add_app_usage_logs(user_id, logs) if logs else 0
+    
+    return jsonify({
+        'success': True,
+        'inserted': inserted,
+        'activity_types': activities
+    })
+
+def is_awake(user_id: int) -> bool:
+    daily_record = get_daily_record(user_id, date.today())
+    return bool(daily_record and daily_record.get('real_wake_time') and not daily_record.get('real_sleep_time'))
+
+def schedule_pomodoro(user_id: int, session_id: int, session_type: str, daily_record_id: int,
+                      start_time: datetime, minutes: int, paused_seconds: int = 0,
+                      paused_at: datetime = None):
+    if pomodoro_timers is None:
+        return
+    deadline = start_time.timestamp() + minutes * 60 + paused_seconds
+    fire_at = deadline
+    if paused_at is not None:
+        # A paused session does not run out; it is dropped once left paused too long.
+        paused_at = paused_at.timestamp()
+        fire_at = paused_at + load_config()['pomodoro'].get('max_pause_minutes', 60) * 60
+    previous = pomodoro_timers.cancel(user_id)
+    pomodoro_timers.schedule(user_id, fire_at,
+                             (session_id, session_type, daily_record_id, minutes, deadline, paused_at))
+    if previous is not None and previous[0] != session_id:
+        # A client that resets its timer just starts a new session; the one it
+        # dropped would otherwise stay open forever.
+        interrupt_pomodoro(previous)
+
+def interrupt_pomodoro(timer: tuple) -> bool:
+    session_id, _, _, minutes, deadline, paused_at = timer
+    remaining = deadline - (paused_at or time.time())
+    elapsed = max(0, round((minutes * 60 - remaining) / 60))
+    return finish_pomodoro_session(session_id, datetime.now(), min(elapsed, minutes), status='interrupted')
+
+def is_break_after(timer: tuple, session: dict) -> bool:
+    # A break the server starts itself begins exactly when the work session was due.
+    _, session_type, _, minutes, deadline, _ = timer
+    if session_type != 'break' or not session.get('end_time'):
+        return False
+    return abs(datetime.fromisoformat(session['end_time']).timestamp() - (deadline - minutes * 60)) < 1
+
+def expire_pomodoro(user_id: int, timer: tuple):
+    session_id, session_type, daily_record_id, minutes, deadline, paused_at = timer
+    # A user who has gone to sleep has no engine to switch and nobody waiting
+    # on a break; the session is only closed.
+    engine = get_user_engine(user_id) if is_awake(user_id) else None
+    
+    break_id = None
+    break_minutes = 0
+    if paused_at is not None:
+        status = 'interrupted'
+        if not interrupt_pomodoro(timer):
+            return
+    else:
+        status = 'completed'
+        virtual_end = engine.get_virtual_time()[0] if engine is not None else None
+        # Sessions recovered after downtime end when they were due, not now,
+        # and one left over from an earlier day does not start a break today.
+        end_time = datetime.fromtimestamp(deadline)
+        if session_type == 'work' and engine is not None and end_time.date() == date.today():
+            pomodoro_config = user_config.get_effective_config(user_id).config['pomodoro']
+            completed = count_completed_pomodoros(user_id, daily_record_id) + 1
+            if completed % pomodoro_config.get('long_break_interval', 4) == 0:
+                break_minutes = pomodoro_config.get('long_break', 15)
+            else:
+                break_minutes = pomodoro_config.get('short_break', 5)
+        
+        if not finish_pomodoro_session(session_id, end_time, minutes, virtual_end, status, break_minutes):
+            return  # the client ended it first
+        
+        if break_minutes:
+            break_id = add_pomodoro_session(user_id, daily_record_id, end_time, break_minutes, 'break', virtual_end)
+            schedule_pomodoro(user_id, break_id, 'break', daily_record_id, end_time, break_minutes)
+    
+    if engine is None:
+        return
+    # Leave the engine alone if the user has moved on to something else.
+    if engine.current_activity in ('study', 'pomodoro_break'):
+        engine.update_activity('pomodoro_break' if break_id else 'rest')
+    
+    broadcast_state(user_id, engine)
+    if hub.has_subscribers(user_id):
+        hub.publish(user_id, {
+            'type': 'pomodoro',
+            'version': feed.version(user_id),
+            'session_id': session_id,
+            'session_type': session_type,
+            'status': status,
+            'next_type': 'break' if break_id else 'rest',
+            'break_session_id': break_id,
+            'break_minutes': break_minutes
+        })
+
+def recover_pomodoro_timers() -> int:
+    # Open sessions come back from the database after a restart and overdue
+    # ones expire on the first tick. They arrive oldest first per user, so each
+    # user keeps only the latest and older ones are closed as interrupted.
+    sessions = get_open_pomodoro_sessions()
+    for session in sessions:
+        paused_at = session['paused_at']
+        schedule_pomodoro(session['user_id'], session['id'], session['session_type'] or 'work',
+                          session['daily_record_id'], datetime.fromisoformat(session['start_time']),
+                          session['planned_duration_minutes'], session['paused_seconds'] or 0,
+                          datetime.fromisoformat(paused_at) if paused_at else None)
+    return len(sessions)
+
 @app.route('/api/pomodoro/start', methods=['POST'])
 @require_auth
+@idempotent
 def start_pomodoro():
     user_id = request.user_id
     data = request.get_json()
@@ -352,20 +813,24 @@ def start_pomodoro():
     engine = get_user_engine(user_id)
     virtual_start, _ = engine.get_virtual_time()
     
+    start_time = datetime.now()
     session_id = add_pomodoro_session(
         user_id=user_id,
         daily_record_id=daily_record['id'],
-        start_time=datetime.now(),
+        start_time=start_time,
         planned_duration=duration,
         session_type=session_type,
         virtual_start_time=virtual_start
     )
+    schedule_pomodoro(user_id, session_id, session_type, daily_record['id'], start_time, duration)
     
     if session_type == 'work':
         engine.update_activity('study')
     elif session_type == 'break':
         engine.update_activity('pomodoro_break')
     
+    broadcast_state(user_id, engine)
+    
     return jsonify({
         'success': True,
         'session_id': session_id,
@@ -374,6 +839,7 @@ def start_pomodoro():
 
 @app.route('/api/pomodoro/end', methods=['POST'])
 @require_auth
+@idempotent
 def end_pomodoro():
     user_id = request.user_id
     data = request.get_json()
@@ -387,34 +853,94 @@ def end_pomodoro():
     engine = get_user_engine(user_id)
     virtual_end, _ = engine.get_virtual_time()
     
-    update_pomodoro_session(
-        session_id,
-        end_time=datetime.now().isoformat(),
-        actual_duration_minutes=actual_duration,
-        break_duration_minutes=break_duration,
-        virtual_end_time=virtual_end.isoformat(),
-        status=status
-    )
-    
-    if next_type == 'break':
+    # Guarded like the server's own expiry, so a session the server has
+    # already completed keeps its result.
+    ended = finish_pomodoro_session(session_id, datetime.now(), actual_duration, virtual_end,
+                                    status, break_duration)
+    superseded = False
+    if pomodoro_timers is not None:
+        timer = pomodoro_timers.get(user_id)
+        if timer is not None and timer[0] == session_id:
+            pomodoro_timers.cancel(user_id)
+        elif timer is not None and not ended:
+            # The server got there first and started a break the client does
+            # not know about; the client's next_type replaces it.
+            session = get_pomodoro_session(session_id)
+            if session is not None and session['user_id'] == user_id and is_break_after(timer, session):
+                pomodoro_timers.cancel(user_id)
+                interrupt_pomodoro(timer)
+            else:
+                # A late retry; the user is already in a newer session.
+                superseded = True
+    
+    if superseded:
+        pass  # leave the newer session's activity alone
+    elif next_type == 'break':
         engine.update_activity('pomodoro_break')
     elif next_type == 'work':
         engine.update_activity('study')
     else:
         engine.update_activity('rest')
     
+    broadcast_state(user_id, engine)
+    
     return jsonify({
         'success': True,
         'current_speed': engine.get_current_speed(),
         'current_activity': engine.current_activity
     })
 
+@app.route('/api/pomodoro/pause', methods=['POST'])
+@require_auth
+@idempotent
+def pause_pomodoro():
+    user_id = request.user_id
+    session_id = request.get_json().get('session_id')
+    
+    session = get_pomodoro_session(session_id)
+    if session is None or session['user_id'] != user_id:
+        return jsonify({'error': 'Session not found'}), 404
+    
+    paused_at = datetime.now()
+    if not pause_pomodoro_session(session_id, paused_at):
+        return jsonify({'error': 'Session is not running'}), 409
+    schedule_pomodoro(user_id, session_id, session['session_type'] or 'work', session['daily_record_id'],
+                      datetime.fromisoformat(session['start_time']), session['planned_duration_minutes'],
+                      session['paused_seconds'] or 0, paused_at)
+    
+    return jsonify({'success': True})
+
+@app.route('/api/pomodoro/resume', methods=['POST'])
+@require_auth
+@idempotent
+def resume_pomodoro():
+    user_id = request.user_id
+    session_id = request.get_json().get('session_id')
+    
+    session = get_pomodoro_session(session_id)
+    if session is None or session['user_id'] != user_id:
+        return jsonify({'error': 'Session not found'}), 404
+    if session['end_time'] or not session['paused_at']:
+        return jsonify({'error': 'Session is not paused'}), 409
+    
+    paused_seconds = (session['paused_seconds'] or 0) + round(
+        (datetime.now() - datetime.fromisoformat(session['paused_at'])).total_seconds())
+    if not resume_pomodoro_session(session_id, paused_seconds):
+        return jsonify({'error': 'Session is not paused'}), 409
+    schedule_pomodoro(user_id, session_id, session['session_type'] or 'work', session['daily_record_id'],
+                      datetime.fromisoformat(session['start_time']), session['planned_duration_minutes'],
+                      paused_seconds)
+    
+    return jsonify({'success': True})
+
 @app.route('/api/pomodoro/status', methods=['GET'])
 @require_auth
 def pomodoro_status():
     user_id = request.user_id
     
-    engine = get_user_engine(user_id)
+    engine = get_user_engine(user_id, create=False)
+    if engine is None:
+        return jsonify({'active': False})
     progress = engine.get_study_progress()
     
     return jsonify(progress)
@@ -440,6 +966,7 @@ def get_daily_data():
     return jsonify({
         'daily_record': daily_record,
         'time_logs': time_logs,
+        'app_breakdown': get_app_time_breakdown(daily_record['id']),
         'pomodoro_sessions': pomodoro_sessions
     })
 
@@ -459,7 +986,7 @@ def get_weekly_data():
 def get_monthly_data():
     user_id = request.user_id
     
-    records = get_recent_daily_records(user_id, 30)
+    records = get_recent_daily_records(user_id, 30, snapshot=True)
     
     return jsonify({
         'records': records
@@ -470,7 +997,10 @@ def get_monthly_data():
 def get_yearly_data():
     user_id = request.user_id
     
-    records = get_recent_daily_records(user_id, 365)
+    # Sync resets pass live=1: the snapshot can be older than the cursor
+    # /api/sync hands back, and the changes in between would be skipped.
+    live = request.args.get('live', 0, type=int)
+    records = get_recent_daily_records(user_id, 365, snapshot=not live)
     
     return jsonify({
         'records': records
@@ -490,7 +1020,7 @@ def get_range_data():
     end_date = date.fromisoformat(end_date_str)
     
     days = (end_date - start_date).days + 1
-    records = get_recent_daily_records(user_id, min(days, 365))
+    records = get_recent_daily_records(user_id, min(days, 365), snapshot=True)
     
     return jsonify({
         'records': records,
@@ -498,6 +1028,52 @@ def get_range_data():
         'end_date': end_date_str
     })
 
+def maybe_prune_change_log(sync_config: dict):
+    global _last_change_log_prune
+    now = time.monotonic()
+    if now - _last_change_log_prune < sync_config.get('prune_interval_seconds', 3600):
+        return
+    _last_change_log_prune = now
+    removed = prune_change_log(sync_config.get('retention_days', 30))
+    if removed:
+        print(f"Pruned {removed} change_log entries")
+
+@app.route('/api/sync', methods=['GET'])
+@require_auth
+def sync_changes():
+    user_id = request.user_id
+    sync_config = load_config().get('sync', {})
+    device_id = request.args.get('device_id')
+    
+    cursor = request.args.get('cursor', type=int)
+    if cursor is None and device_id:
+        cursor = get_device_sync_cursor(user_id, device_id)
+    limit = request.args.get('limit', sync_config.get('page_size', 200), type=int)
+    limit = max(1, min(limit, sync_config.get('max_page_size', 1000)))
+    
+    maybe_prune_change_log(sync_config)
+    
+    # Read before the changes and used as their upper bound: anything that
+    # commits afterwards lands above it and is picked up by the next call.
+    head = get_change_log_head()
+    if cursor is None or cursor < get_change_log_pruned_seq() or cursor > head:
+        # Unknown or expired cursor: the client reloads through /api/data/*
+        # with live=1 and continues from the returned cursor.
+        if device_id:
+            set_device_sync_cursor(user_id, device_id, head)
+        return jsonify({'reset': True, 'cursor': head, 'has_more': False, 'changes': []})
+    
+    page = get_changes(user_id, cursor, head, limit)
+    if device_id:
+        set_device_sync_cursor(user_id, device_id, page['cursor'])
+    
+    return jsonify({
+        'reset': False,
+        'cursor': page['cursor'],
+        'has_more': page['has_more'],
+        'changes': page['changes']
+    })
+
 @app.route('/api/summaries', methods=['GET'])
 @require_auth
 def get_summaries():
@@ -513,6 +1089,7 @@ def get_summaries():
 
 @app.route('/api/summaries/generate', methods=['POST'])
 @require_auth
+@idempotent
 def generate_summary():
     user_id = request.user_id
     data = request.get_json()
@@ -535,7 +1112,7 @@ def generate_summary():
             return jsonify({'success': True, 'summary': summary})
     
     elif summary_type == 'weekly':
-        records = get_recent_daily_records(user_id, 7)
+        records = get_recent_daily_records(user_id, 7, snapshot=True)
         summary = ai_service.generate_weekly_summary(records)
         if summary:
             week_start = date.today() - timedelta(days=6)
@@ -563,6 +1140,91 @@ def get_config_route():
 def health_check():
     return jsonify({'status': 'ok', 'timestamp': datetime.now().isoformat()})
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics_route():
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics disabled'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@require_admin
+def list_profiles_route():
+    return jsonify({
+        'enabled': profiling.enabled,
+        'profiles': profiling.list_profiles()
+    })
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+@require_admin
+def download_profile_route(name):
+    path = profiling.profile_path(name)
+    if not path:
+        return jsonify({'error': 'Profile not found'}), 404
+    
+    if request.args.get('format') == 'text':
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'calls'):
+            return jsonify({'error': 'Invalid sort key'}), 400
+        limit = request.args.get('limit', 40, type=int)
+        return Response(profiling.render_text(path, sort, limit), mimetype='text/plain')
+    
+    return send_file(path, as_attachment=True, download_name=name)
+
+@app.route('/api/admin/queries', methods=['GET', 'DELETE'])
+@require_admin
+def query_stats_route():
+    if request.method == 'DELETE':
+        query_log.reset()
+        return jsonify({'success': True})
+    
+    limit = request.args.get('limit', 20, type=int)
+    order = request.args.get('order', 'total')
+    return jsonify({
+        'enabled': query_log.enabled,
+        'slow_query_ms': query_log.slow_query_ms,
+        'statements': query_log.top_statements(limit, order)
+    })
+
+@app.route('/api/admin/replay', methods=['POST'])
+@require_admin
+def replay_route():
+    data = request.get_json() or {}
+    replay_config = load_config().get('replay', {})
+    
+    user_ids = data.get('user_ids') or ([data['user_id']] if data.get('user_id') else [])
+    if not user_ids:
+        return jsonify({'error': 'user_id or user_ids required'}), 400
+    
+    try:
+        end_date = date.fromisoformat(data['end_date']) if data.get('end_date') else date.today()
+        start_date = date.fromisoformat(data['start_date']) if data.get('start_date') else end_date - timedelta(days=6)
+        span = (end_date - start_date).days + 1
+        if span <= 0 or span * len(user_ids) > replay_config.get('max_user_days', 3660):
+            raise ValueError('Date range is empty or too large')
+        candidates = replay.build_candidates(
+            data.get('configs'), data.get('grid'), replay_config.get('max_configs', 10000))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    sort = data.get('sort', 'sleep')
+    if sort not in replay.SORT_KEYS:
+        return jsonify({'error': f'sort must be one of {", ".join(replay.SORT_KEYS)}'}), 400
+    
+    days = replay.load_days(user_ids, start_date, end_date)
+    return jsonify(replay.replay(days, candidates, limit=data.get('limit', 20), sort=sort))
+
+@app.route('/api/admin/compact', methods=['POST'])
+@require_admin
+def compact_route():
+    data = request.get_json(silent=True) or {}
+    compaction_config = load_config().get('compaction', {})
+    report = compaction.run_compaction(
+        stale_days=data.get('stale_days', compaction_config.get('stale_days', 1)),
+        batch_size=compaction_config.get('batch_size', 500),
+        vacuum=data.get('vacuum', compaction_config.get('vacuum', True))
+    )
+    return jsonify(report)
+
 @app.route('/api/server/info', methods=['GET'])
 def server_info():
     config = load_config()
@@ -572,14 +1234,197 @@ def server_info():
         'port': config['server']['port']
     })
 
+def create_app(config: dict = None) -> Flask:
+    global user_engines, idempotency_keys, hub, rate_limiter, load_shedder, pomodoro_timers, _app_created
+    if _app_created:
+        return app
+    if config is None:
+        config = load_config()
+    
+    metrics.configure(config.get('metrics', {}))
+    query_log.configure(config.get('query_log', {}))
+    user_engines = create_engine_registry(config.get('engines', {}))
+    idempotency_config = config.get('idempotency', {})
+    idempotency_keys = IdempotencyStore(
+        ttl_seconds=idempotency_config.get('ttl_hours', 24) * 3600,
+        in_progress_seconds=idempotency_config.get('in_progress_seconds', 300),
+        prune_interval_seconds=idempotency_config.get('prune_interval_seconds', 3600)
+    )
+    pubsub_config = config.get('pubsub', {})
+    hub = LocalHub(
+        max_queue=pubsub_config.get('max_queue', 64),
+        max_subscribers_per_user=pubsub_config.get('max_subscribers_per_user', 16)
+    )
+    
+    if config.get('rate_limit', {}).get('enabled', False):
+        rate_limiter = ratelimit.RateLimiter(config['rate_limit'])
+    if config.get('load_shedding', {}).get('enabled', False):
+        load_shedder = ratelimit.LoadShedder(config['load_shedding'])
+        app.before_request(admit_request)
+        app.teardown_request(release_request)
+    
+    # Hooks are only installed when profiling is on, so it costs nothing otherwise.
+    if profiling.configure(config.get('profiling', {}), os.path.dirname(__file__)):
+        app.before_request(start_request_profile)
+        app.after_request(finish_request_profile)
+        app.teardown_request(end_request_profile)
+    
+    ensure_schema()
+    user_engines.start_sweeper()
+    pomodoro_config = config.get('pomodoro', {})
+    if pomodoro_config.get('server_timers', False):
+        pomodoro_timers = TimerWheel(pomodoro_config.get('timer_tick_seconds', 1))
+        recovered = recover_pomodoro_timers()
+        if recovered:
+            print(f"Recovered {recovered} open pomodoro sessions")
+        pomodoro_timers.start(expire_pomodoro, name='pomodoro-timers')
+    _app_created = True
+    return app
+
+def create_asgi_app():
+    import asyncio
+    from urllib.parse import parse_qs
+    from asgi import AsyncApp, header_value, send_json
+    
+    global _streaming
+    server_config = load_config()['server']
+    async_app = AsyncApp(
+        create_app(),
+        max_workers=server_config.get('async_workers', 32),
+        max_pending=server_config.get('async_max_pending', 1024)
+    )
+    
+    def native_route(path: str):
+        # These handlers bypass Flask, so they record request metrics and go
+        # through the rate limiter themselves, the way the request hooks and
+        # require_auth do for every other route.
+        def decorator(handler):
+            async def observed(scope, receive, send):
+                if not metrics.enabled:
+                    return await handler(scope, receive, send)
+                started = time.perf_counter()
+                
+                async def observing_send(message):
+                    if message['type'] == 'http.response.start':
+                        metrics.observe_request(path, scope['method'], message['status'],
+                                                time.perf_counter() - started)
+                    await send(message)
+                await handler(scope, receive, observing_send)
+            return async_app.route(path)(observed)
+        return decorator
+    
+    async def rate_limited(scope, send, user_id: int, query: dict) -> bool:
+        device_id = header_value(scope, b'x-device-id') or query.get('device_id', [None])[0]
+        wait = rate_limit_wait(user_id, device_id, scope['path'])
+        if wait:
+            await send_json(send, {'error': 'Rate limit exceeded'}, 429,
+                            [('Retry-After', ratelimit.retry_after_header(wait))])
+        return bool(wait)
+    
+    @native_route('/api/time/changes')
+    async def time_changes_async(scope, receive, send):
+        auth_header = header_value(scope, b'authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            await send_json(send, {'error': 'Missing authorization token'}, 401)
+            return
+        
+        user_id = await async_app.run_blocking(authenticate, auth_header[7:])
+        if user_id is None:
+            await send_json(send, {'error': 'Invalid or expired token'}, 401)
+            return
+        
+        # Same fallbacks as request.args.get(..., type=...) in the threaded route.
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        if await rate_limited(scope, send, user_id, query):
+            return
+        try:
+            since = int(query.get('since', ['-1'])[0])
+        except ValueError:
+            since = -1
+        try:
+            requested = float(query['timeout'][0]) if 'timeout' in query else None
+        except ValueError:
+            requested = None
+        
+        version = await feed.wait_async(user_id, since, long_poll_timeout(requested))
+        state = await async_app.run_blocking(changes_state, user_id, version)
+        await send_json(send, state)
+    
+    @native_route('/api/time/stream')
+    async def time_stream_async(scope, receive, send):
+        user_id = None
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        auth_header = header_value(scope, b'authorization')
+        if auth_header and auth_header.startswith('Bearer '):
+            user_id = await async_app.run_blocking(authenticate, auth_header[7:])
+        elif 'token' in query:
+            user_id = await async_app.run_blocking(authenticate_stream, query['token'][0])
+        
+        if user_id is None:
+            await send_json(send, {'error': 'Invalid or expired token'}, 401)
+            return
+        if await rate_limited(scope, send, user_id, query):
+            return
+        
+        heartbeat = load_config().get('pubsub', {}).get('heartbeat_seconds', 15)
+        subscription = hub.subscribe(user_id)
+        
+        async def watch_disconnect():
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    subscription.close()
+                    return
+        
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            initial = await async_app.run_blocking(changes_state, user_id, feed.version(user_id))
+            initial['type'] = 'state'
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [(b'content-type', b'text/event-stream'),
+                            (b'cache-control', b'no-cache'),
+                            (b'access-control-allow-origin', b'*')],
+            })
+            await send({'type': 'http.response.body',
+                        'body': sse_message(initial).encode('utf-8'), 'more_body': True})
+            while True:
+                event = await subscription.get_async(heartbeat)
+                if event is CLOSED:
+                    break
+                chunk = ": keepalive\n\n" if event is None else sse_message(event)
+                await send({'type': 'http.response.body',
+                            'body': chunk.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        except OSError:
+            pass
+        finally:
+            watcher.cancel()
+            hub.unsubscribe(subscription)
+    
+    _streaming = True
+    return async_app
+
 def run_server():
     config = load_config()
     host = config['server']['host']
     port = config['server']['port']
-    
-    print(f"TimeSetor Server starting on {host}:{port}")
-    app.run(host=host, port=port, debug=False, threaded=True)
+    mode = config['server'].get('mode', 'threaded')
+    create_app(config)
+    
+    print(f"TimeSetor Server starting on {host}:{port} ({mode})")
+    if config.get('compaction', {}).get('enabled', False):
+        compaction.start_scheduler(config['compaction'])
+    if config.get('snapshot', {}).get('enabled', False):
+        snapshot.start_refresher(config['snapshot'])
+    if mode == 'async':
+        from asgi import serve
+        serve(create_asgi_app(), host, port,
+              backlog=config['server'].get('async_backlog', 4096),
+              keepalive_seconds=config['server'].get('async_keepalive_seconds', 75))
+    else:
+        app.run(host=host, port=port, debug=False, threaded=True)
 
 if __name__ == '__main__':
-    init_database()
     run_server()
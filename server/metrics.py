@@ -0,0 +1,176 @@
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, List, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+enabled = False
+
+_families = []
+
+# Counters are plain ints updated without a lock. Under the GIL an increment
+# can very rarely be lost when two threads race on the same series; that is
+# an acceptable error for monitoring and keeps the request path lock-free.
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+class _Family:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        _families.append(self)
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+
+class _LabeledFamily(_Family):
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                 new_child: Callable[[], object]):
+        self.label_names = label_names
+        self.children = {}
+        self._new_child = new_child
+        super().__init__(name, help_text)
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def _label_str(self, values, extra: str = '') -> str:
+        parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.label_names, values)]
+        if extra:
+            parts.append(extra)
+        return '{' + ','.join(parts) + '}' if parts else ''
+
+class Counter(_LabeledFamily):
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, label_names, _CounterChild)
+
+    def inc(self, amount: int = 1):
+        self.labels().inc(amount)
+
+    def render(self, lines: List[str]):
+        super().render(lines)
+        for values, child in list(self.children.items()):
+            lines.append(f"{self.name}{self._label_str(values)} {child.value}")
+
+class Histogram(_LabeledFamily):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        super().__init__(name, help_text, label_names, lambda: _HistogramChild(buckets))
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self, lines: List[str]):
+        super().render(lines)
+        for values, child in list(self.children.items()):
+            cumulative = 0
+            bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, child.counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self._label_str(values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(values)} {child.total}")
+            lines.append(f"{self.name}_count{self._label_str(values)} {child.count}")
+
+class Gauge(_Family):
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, callback: Callable[[], float]):
+        self.callback = callback
+        super().__init__(name, help_text)
+
+    def render(self, lines: List[str]):
+        super().render(lines)
+        try:
+            value = self.callback()
+        except Exception:
+            value = float('nan')
+        lines.append(f"{self.name} {value}")
+
+class CounterCallback(Gauge):
+    # A running total kept elsewhere, read at scrape time. It must only ever
+    # grow (until a restart) so that rate() works on it.
+    kind = 'counter'
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def configure(config: Dict):
+    global enabled
+    enabled = bool((config or {}).get('enabled', False))
+
+def render() -> str:
+    lines = []
+    for family in _families:
+        family.render(lines)
+    return '\n'.join(lines) + '\n'
+
+def timed(histogram: Histogram, *label_values):
+    def decorator(func):
+        child = histogram.labels(*label_values)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+HTTP_REQUESTS = Counter(
+    'timesetor_http_requests_total', 'HTTP requests by route, method and status',
+    ('route', 'method', 'status'))
+HTTP_LATENCY = Histogram(
+    'timesetor_http_request_duration_seconds', 'HTTP request latency by route',
+    ('route', 'method'))
+DB_CALL_LATENCY = Histogram(
+    'timesetor_db_call_duration_seconds', 'Time spent in each database.py function',
+    ('function',))
+TOKEN_VERIFY_LATENCY = Histogram(
+    'timesetor_token_verify_duration_seconds', 'Auth token verification time')
+AI_CALL_LATENCY = Histogram(
+    'timesetor_ai_call_duration_seconds', 'AI summary API call latency')
+AI_CALL_ERRORS = Counter(
+    'timesetor_ai_call_errors_total', 'AI summary API calls that failed')
+
+def observe_request(route: str, method: str, status: int, seconds: float):
+    HTTP_REQUESTS.labels(route, method, status).inc()
+    HTTP_LATENCY.labels(route, method).observe(seconds)
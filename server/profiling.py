@@ -0,0 +1,101 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+enabled = False
+sample_rate = 0.0
+routes = ()
+max_profiles = 50
+directory = None
+
+_lock = threading.Lock()
+_active = threading.Lock()
+_NAME_RE = re.compile(r'^(\d{8}T\d{12})_([A-Z]+)_(.+)_(\d+)us\.prof$')
+
+def configure(config: Dict, base_dir: str) -> bool:
+    global enabled, sample_rate, routes, max_profiles, directory
+    config = config or {}
+    enabled = bool(config.get('enabled', False))
+    sample_rate = float(config.get('sample_rate', 0.0))
+    routes = tuple(config.get('routes') or ())
+    max_profiles = max(1, int(config.get('max_profiles', 50)))
+    directory = os.path.join(base_dir, config.get('directory', 'profiles'))
+    return enabled
+
+def should_profile(route: str, requested: bool) -> bool:
+    if routes and route not in routes:
+        return False
+    if requested:
+        return True
+    return sample_rate > 0 and random.random() < sample_rate
+
+def start() -> Optional[cProfile.Profile]:
+    # One request at a time: Python 3.12+ refuses a second active profiler,
+    # and on earlier versions two would record each other's threads anyway.
+    if not _active.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def stop(profiler: cProfile.Profile):
+    profiler.disable()
+    _active.release()
+
+def _slug(route: str) -> str:
+    return re.sub(r'[^A-Za-z0-9]+', '-', route).strip('-') or 'root'
+
+def save(profiler: cProfile.Profile, method: str, route: str, seconds: float) -> str:
+    profiler.disable()
+    name = (f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}_{method}_{_slug(route)}_"
+            f"{int(seconds * 1e6)}us.prof")
+
+    with _lock:
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, name))
+
+        names = sorted(n for n in os.listdir(directory) if _NAME_RE.match(n))
+        for old in names[:-max_profiles]:
+            try:
+                os.remove(os.path.join(directory, old))
+            except OSError:
+                pass
+    return name
+
+def list_profiles() -> List[Dict]:
+    if not directory or not os.path.isdir(directory):
+        return []
+
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        match = _NAME_RE.match(name)
+        if not match:
+            continue
+        created, method, route, micros = match.groups()
+        profiles.append({
+            'name': name,
+            'created_at': datetime.strptime(created, '%Y%m%dT%H%M%S%f').isoformat(),
+            'method': method,
+            'route': route,
+            'duration_ms': int(micros) / 1000,
+            'size_bytes': os.path.getsize(os.path.join(directory, name)),
+        })
+    return profiles
+
+def profile_path(name: str) -> Optional[str]:
+    if not directory or not _NAME_RE.match(name):
+        return None
+    path = os.path.join(directory, name)
+    return path if os.path.isfile(path) else None
+
+def render_text(path: str, sort: str = 'cumulative', limit: int = 40) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Dict
+
+CLOSED = object()
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+class Subscription:
+    def __init__(self, user_id: int, max_queue: int):
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.queue = deque()
+        self.closed = False
+        self.dropped = False
+        self._condition = threading.Condition()
+        self._waiter = None
+
+    def _notify(self):
+        self._condition.notify_all()
+        waiter = self._waiter
+        if waiter is not None:
+            self._waiter = None
+            loop, future = waiter
+            loop.call_soon_threadsafe(_wake, future)
+
+    def offer(self, event) -> bool:
+        with self._condition:
+            if self.closed:
+                return False
+            if len(self.queue) >= self.max_queue:
+                # A consumer that cannot keep up is cut off rather than buffered
+                # without bound; the client reconnects and resyncs from scratch.
+                self.closed = True
+                self.dropped = True
+                self.queue.clear()
+                self._notify()
+                return False
+            self.queue.append(event)
+            self._notify()
+            return True
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._notify()
+
+    def get(self, timeout: float):
+        with self._condition:
+            if not self.queue and not self.closed:
+                self._condition.wait(timeout)
+            if self.queue:
+                return self.queue.popleft()
+            return CLOSED if self.closed else None
+
+    async def get_async(self, timeout: float):
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if self.queue:
+                return self.queue.popleft()
+            if self.closed:
+                return CLOSED
+            future = loop.create_future()
+            self._waiter = (loop, future)
+
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        with self._condition:
+            self._waiter = None
+            if self.queue:
+                return self.queue.popleft()
+            return CLOSED if self.closed else None
+
+class LocalHub:
+    def __init__(self, max_queue: int = 64, max_subscribers_per_user: int = 16):
+        self.max_queue = max_queue
+        self.max_subscribers_per_user = max_subscribers_per_user
+        self._lock = threading.Lock()
+        # user_id -> tuple of subscriptions, replaced on every (un)subscribe so
+        # publish can read it without taking the lock.
+        self._subscribers = {}
+        self.dropped_total = 0
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, self.max_queue)
+        evicted = ()
+        with self._lock:
+            current = self._subscribers.get(user_id, ())
+            if len(current) >= self.max_subscribers_per_user:
+                cut = len(current) - self.max_subscribers_per_user + 1
+                evicted, current = current[:cut], current[cut:]
+            self._subscribers[user_id] = current + (subscription,)
+        for old in evicted:
+            old.close()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.close()
+        with self._lock:
+            current = self._subscribers.get(subscription.user_id, ())
+            remaining = tuple(s for s in current if s is not subscription)
+            if remaining:
+                self._subscribers[subscription.user_id] = remaining
+            else:
+                self._subscribers.pop(subscription.user_id, None)
+
+    def publish(self, user_id: int, event: Dict) -> int:
+        delivered = 0
+        for subscription in self._subscribers.get(user_id, ()):
+            if subscription.offer(event):
+                delivered += 1
+            elif subscription.dropped:
+                self.dropped_total += 1
+                self.unsubscribe(subscription)
+        return delivered
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return user_id in self._subscribers
+
+    def subscriber_count(self) -> int:
+        return sum(len(subs) for subs in list(self._subscribers.values()))
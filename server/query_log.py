@@ -0,0 +1,179 @@
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+enabled = False
+slow_query_ms = 100.0
+plan_sample_seconds = 300.0
+large_table_rows = 10000
+
+_lock = threading.Lock()
+_statements = {}
+_table_sizes = {}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+_ALIAS_RE = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+_PLANNABLE = {'SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH'}
+_ALIAS_STOPWORDS = {'WHERE', 'JOIN', 'ON', 'SET', 'ORDER', 'GROUP', 'LIMIT', 'VALUES',
+                    'LEFT', 'INNER', 'USING', 'DEFAULT'}
+
+class StatementStats:
+    __slots__ = ('sql', 'calls', 'total_seconds', 'max_seconds', 'slow_calls',
+                 'last_plan_at', 'plan', 'full_scans')
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.slow_calls = 0
+        self.last_plan_at = 0.0
+        self.plan = []
+        self.full_scans = []
+
+    def to_dict(self) -> Dict:
+        return {
+            'sql': self.sql,
+            'calls': self.calls,
+            'total_ms': self.total_seconds * 1000,
+            'mean_ms': (self.total_seconds / self.calls * 1000) if self.calls else 0.0,
+            'max_ms': self.max_seconds * 1000,
+            'slow_calls': self.slow_calls,
+            'plan': self.plan,
+            'full_scans': self.full_scans,
+        }
+
+def configure(config: Dict):
+    global enabled, slow_query_ms, plan_sample_seconds, large_table_rows
+    config = config or {}
+    enabled = bool(config.get('enabled', False))
+    slow_query_ms = float(config.get('slow_query_ms', 100))
+    plan_sample_seconds = float(config.get('plan_sample_seconds', 300))
+    large_table_rows = int(config.get('large_table_rows', 10000))
+
+def normalize(sql: str) -> str:
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _SPACE_RE.sub(' ', sql).strip()
+    return _IN_LIST_RE.sub('(?+)', sql)
+
+def _table_aliases(sql: str) -> Dict[str, str]:
+    aliases = {}
+    for table, alias in _ALIAS_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in _ALIAS_STOPWORDS:
+            aliases[alias] = table
+    return aliases
+
+def _table_size(conn: sqlite3.Connection, table: str) -> int:
+    cached = _table_sizes.get(table)
+    now = time.monotonic()
+    if cached and now - cached[1] < plan_sample_seconds:
+        return cached[0]
+    try:
+        row = sqlite3.Connection.execute(conn, f'SELECT MAX(rowid) FROM "{table}"').fetchone()
+        size = row[0] or 0
+    except sqlite3.Error:
+        size = 0
+    _table_sizes[table] = (size, now)
+    return size
+
+def _sample_plan(conn: sqlite3.Connection, stats: StatementStats, sql: str, params):
+    try:
+        rows = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    except sqlite3.Error:
+        return
+
+    plan = [row[3] for row in rows]
+    aliases = _table_aliases(sql)
+    full_scans = []
+    for detail in plan:
+        match = _SCAN_RE.match(detail)
+        if not match:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        rows_estimate = _table_size(conn, table)
+        if rows_estimate >= large_table_rows:
+            full_scans.append({'table': table, 'rows': rows_estimate, 'detail': detail})
+
+    stats.plan = plan
+    stats.full_scans = full_scans
+    if full_scans:
+        tables = ', '.join(f"{scan['table']} (~{scan['rows']} rows)" for scan in full_scans)
+        print(f"Query plan warning: full scan of {tables} in: {stats.sql}")
+
+def record(conn: sqlite3.Connection, sql: str, params, seconds: float, many: bool = False):
+    shape = normalize(sql)
+    with _lock:
+        stats = _statements.get(shape)
+        if stats is None:
+            stats = _statements[shape] = StatementStats(shape)
+        stats.calls += 1
+        stats.total_seconds += seconds
+        if seconds > stats.max_seconds:
+            stats.max_seconds = seconds
+        slow = seconds * 1000 >= slow_query_ms
+        if slow:
+            stats.slow_calls += 1
+        now = time.monotonic()
+        sample = (not many and shape.split(' ', 1)[0].upper() in _PLANNABLE
+                  and (stats.last_plan_at == 0.0 or now - stats.last_plan_at >= plan_sample_seconds))
+        if sample:
+            stats.last_plan_at = now
+
+    if slow:
+        count = len(params) if params is not None and not many else 0
+        print(f"Slow query ({seconds * 1000:.1f} ms, {count} params redacted): {shape}")
+    if sample:
+        _sample_plan(conn, stats, sql, params if params is not None else ())
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            record(self.connection, sql, params, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            record(self.connection, sql, None, time.perf_counter() - start, many=True)
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+def connection_factory():
+    return InstrumentedConnection if enabled else sqlite3.Connection
+
+def top_statements(limit: int = 20, order: str = 'total') -> List[Dict]:
+    keys = {
+        'total': lambda s: s.total_seconds,
+        'mean': lambda s: s.total_seconds / s.calls if s.calls else 0.0,
+        'max': lambda s: s.max_seconds,
+        'calls': lambda s: s.calls,
+    }
+    with _lock:
+        ranked = sorted(_statements.values(), key=keys.get(order, keys['total']), reverse=True)
+        return [stats.to_dict() for stats in ranked[:limit]]
+
+def reset():
+    with _lock:
+        _statements.clear()
+        _table_sizes.clear()
@@ -0,0 +1,146 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Hashable, Optional
+
+class TokenBucketLimiter:
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000, shards: int = 16):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        # Keys are spread over independently locked shards so concurrent
+        # requests for different users rarely wait on each other.
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self._max_per_shard = max(1, max_keys // shards)
+        self._refill_seconds = self.burst / self.rate
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for _, buckets in self._shards)
+
+    def acquire(self, key: Hashable, cost: float = 1.0, now: float = None) -> float:
+        # Returns 0 when the request may go ahead, otherwise the seconds until
+        # the bucket holds enough tokens. Rejected requests spend nothing.
+        if now is None:
+            now = time.monotonic()
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            state = buckets.pop(key, None)
+            if state is None:
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / self.rate
+            buckets[key] = (tokens, now)
+
+            # Buckets stay in last-used order. One that has refilled since its
+            # last use is the same as a new bucket, so it can go; checking at
+            # most two per call keeps this O(1).
+            for _ in range(2):
+                oldest, (_, last_used) = next(iter(buckets.items()))
+                if oldest == key or (len(buckets) <= self._max_per_shard
+                                     and now - last_used < self._refill_seconds):
+                    break
+                del buckets[oldest]
+            return wait
+
+    def refund(self, key: Hashable, cost: float = 1.0):
+        # Gives back what acquire() took when the request was then turned
+        # away by another limiter.
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            state = buckets.get(key)
+            if state is not None:
+                buckets[key] = (min(self.burst, state[0] + cost), state[1])
+
+class RateLimiter:
+    def __init__(self, config: Dict = None):
+        config = config or {}
+        max_keys = config.get('max_keys', 100000)
+        user = config.get('user', {})
+        device = config.get('device', {})
+        self.users = TokenBucketLimiter(user.get('rate_per_second', 6), user.get('burst', 30), max_keys)
+        self.devices = TokenBucketLimiter(device.get('rate_per_second', 3), device.get('burst', 15), max_keys)
+        self.default_cost = config.get('default_cost', 1)
+        self.costs = dict(config.get('costs') or {})
+        self.limited_total = 0
+
+    def cost(self, route: str) -> float:
+        return self.costs.get(route, self.default_cost)
+
+    def check(self, user_id: int, device_id: Optional[str], route: str) -> float:
+        cost = self.cost(route)
+        if cost <= 0:
+            return 0.0
+        # A device has its own, smaller bucket so one looping client cannot
+        # use up the whole account's allowance.
+        wait = self.devices.acquire((user_id, device_id), cost) if device_id else 0.0
+        if not wait:
+            wait = self.users.acquire(user_id, cost)
+            # The device is only charged for requests both buckets admit.
+            if wait and device_id:
+                self.devices.refund((user_id, device_id), cost)
+        if wait:
+            self.limited_total += 1
+        return wait
+
+class LoadShedder:
+    def __init__(self, config: Dict = None):
+        config = config or {}
+        self.max_in_flight = config.get('max_in_flight', 64)
+        self.p99_threshold = config.get('p99_ms', 0) / 1000
+        self.window_seconds = config.get('window_seconds', 10)
+        self.min_samples = config.get('min_samples', 50)
+        self.retry_after = config.get('retry_after_seconds', 2)
+        self.exempt_routes = frozenset(config.get('exempt_routes') or ())
+
+        self.in_flight = 0
+        self.p99 = 0.0
+        self.shed_total = 0
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=config.get('max_samples', 5000))
+        self._next_update = 0.0
+
+    def limit(self) -> int:
+        # Over the latency target, concurrency is halved rather than cut to
+        # zero, so requests keep finishing and the p99 can recover.
+        if self.p99_threshold and self.p99 > self.p99_threshold:
+            return max(1, self.max_in_flight // 2)
+        return self.max_in_flight
+
+    def admit(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_update:
+                self._update_p99(now)
+            if self.in_flight >= self.limit():
+                self.shed_total += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, seconds: float):
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            if self.p99_threshold:
+                self._samples.append((now, seconds))
+
+    def _update_p99(self, now: float):
+        # Runs at most once a second; the per-request cost stays O(1).
+        self._next_update = now + 1.0
+        samples = self._samples
+        cutoff = now - self.window_seconds
+        while samples and samples[0][0] < cutoff:
+            samples.popleft()
+        if len(samples) < self.min_samples:
+            self.p99 = 0.0
+            return
+        latencies = sorted(seconds for _, seconds in samples)
+        self.p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,357 @@
+import argparse
+import itertools
+import json
+import math
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from database import get_daily_records_between, get_time_logs_between
+from time_engine import (
+    get_config, to_minutes, minutes_to_time_str, approach_time,
+    STUDY_CURVES, LINEAR, EXPONENTIAL, EASE_OUT
+)
+
+TUNABLE_KEYS = (
+    'rest_speed', 'entertainment_base_speed', 'break_speed',
+    'study_start_speed', 'study_end_speed', 'study_curve_type', 'study_transition_minutes',
+    'target_wake_time', 'target_sleep_time', 'time_approach_rate',
+    'target_entertainment_hours', 'target_study_hours'
+)
+TIME_KEYS = ('target_wake_time', 'target_sleep_time')
+SORT_KEYS = ('sleep', 'entertainment', 'study', 'total')
+
+class DayTrace:
+    __slots__ = ('user_id', 'date', 'wake_minutes', 'real_seconds', 'rest_seconds',
+                 'break_seconds', 'entertainment_seconds', 'study_segments',
+                 'tail_seconds', 'logged_virtual')
+
+    def __init__(self, user_id: int, day: str, wake_minutes: int):
+        self.user_id = user_id
+        self.date = day
+        self.wake_minutes = wake_minutes
+        self.real_seconds = 0.0
+        self.rest_seconds = 0.0
+        self.break_seconds = 0.0
+        self.entertainment_seconds = 0.0
+        self.study_segments = []
+        self.tail_seconds = 0.0
+        # Virtual seconds per activity at the speeds that were actually logged.
+        self.logged_virtual = {'entertainment': 0.0, 'study': 0.0, 'rest': 0.0}
+
+def _parse_time(value) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def build_day(user_id: int, record: Dict, logs: List[Dict]) -> Optional[DayTrace]:
+    real_wake = _parse_time(record.get('real_wake_time'))
+    if real_wake is None:
+        return None
+
+    day = DayTrace(user_id, record['date'], real_wake.hour * 60 + real_wake.minute)
+    covered_until = real_wake
+    for log in logs:
+        seconds = float(log['duration_seconds'] or 0)
+        speed = log['speed_multiplier'] if log['speed_multiplier'] is not None else 1.0
+        activity = log['activity_type']
+        day.real_seconds += seconds
+        if activity == 'sleep':
+            pass
+        elif activity == 'entertainment':
+            day.entertainment_seconds += seconds
+            day.logged_virtual['entertainment'] += seconds * speed
+        elif activity == 'study':
+            day.study_segments.append(seconds)
+            day.logged_virtual['study'] += seconds * speed
+        else:
+            if activity == 'pomodoro_break':
+                day.break_seconds += seconds
+            else:
+                day.rest_seconds += seconds
+            day.logged_virtual['rest'] += seconds * speed
+        covered_until = max(covered_until, _parse_time(log['real_timestamp']))
+
+    # Whatever happened between the last logged switch and going to sleep is
+    # never written to time_logs; it is replayed as rest.
+    real_sleep = _parse_time(record.get('real_sleep_time'))
+    if real_sleep is not None and real_sleep > covered_until:
+        day.tail_seconds = (real_sleep - covered_until).total_seconds()
+        day.rest_seconds += day.tail_seconds
+        day.real_seconds += day.tail_seconds
+    return day
+
+def load_days(user_ids: Iterable[int], start_date: date, end_date: date) -> List[DayTrace]:
+    days = []
+    for user_id in user_ids:
+        logs_by_record = {}
+        for log in get_time_logs_between(user_id, start_date, end_date, snapshot=True):
+            logs_by_record.setdefault(log['daily_record_id'], []).append(log)
+        for record in get_daily_records_between(user_id, start_date, end_date, snapshot=True):
+            day = build_day(user_id, record, logs_by_record.get(record['id'], []))
+            if day is not None:
+                days.append(day)
+    return days
+
+class ReplayParams:
+    __slots__ = ('overrides', 'rest_speed', 'break_speed', 'entertainment_speed',
+                 'study_start_speed', 'study_end_speed', 'study_curve', 'study_transition_seconds',
+                 'target_wake_minutes', 'target_sleep_minutes', 'approach_rate',
+                 'target_entertainment_minutes', 'target_study_minutes')
+
+    def __init__(self, time_config: Dict, overrides: Dict):
+        config = dict(time_config)
+        config.update(overrides)
+        self.overrides = overrides
+        self.rest_speed = config['rest_speed']
+        self.break_speed = config.get('break_speed', 1.0)
+        # The engine runs entertainment at the per-day multiplier computed at
+        # wake, so the logged speed is kept unless the candidate sets one.
+        self.entertainment_speed = overrides.get('entertainment_base_speed')
+        self.study_start_speed = config['study_start_speed']
+        self.study_end_speed = config['study_end_speed']
+        self.study_curve = STUDY_CURVES.get(config.get('study_curve_type', 'linear'), LINEAR)
+        self.study_transition_seconds = config.get('study_transition_minutes', 60) * 60
+        self.target_wake_minutes = to_minutes(config['target_wake_time'])
+        self.target_sleep_minutes = to_minutes(config['target_sleep_time'])
+        self.approach_rate = config['time_approach_rate']
+        self.target_entertainment_minutes = config['target_entertainment_hours'] * 60
+        self.target_study_minutes = config['target_study_hours'] * 60
+
+def study_virtual_seconds(duration: float, transition: float, start_speed: float,
+                          end_speed: float, curve: int) -> float:
+    if transition <= 0 or start_speed <= end_speed:
+        return duration * end_speed
+
+    ramp = min(duration, transition)
+    progress = ramp / transition
+    if curve == EXPONENTIAL:
+        ratio = end_speed / start_speed
+        if ratio <= 0:
+            area = 0.0
+        else:
+            area = start_speed * (ratio ** progress - 1) / math.log(ratio)
+    elif curve == EASE_OUT:
+        area = (start_speed * progress
+                - (start_speed - end_speed) * (progress - (1 - (1 - progress) ** 3) / 3))
+    else:
+        area = start_speed * progress - (start_speed - end_speed) * progress * progress / 2
+    return area * transition + max(0.0, duration - transition) * end_speed
+
+def wrap_minutes(minutes: float) -> float:
+    return (minutes + 720) % 1440 - 720
+
+def _summarize(params: ReplayParams, totals: Dict, count: int) -> Dict:
+    if not count:
+        return {'config': params.overrides, 'days': 0}
+    sleep_divergence = totals['sleep_divergence'] / count
+    entertainment = totals['entertainment'] / count
+    study = totals['study'] / count
+    return {
+        'config': params.overrides,
+        'days': count,
+        'virtual_sleep': minutes_to_time_str(int(round(params.target_sleep_minutes + sleep_divergence)) % 1440),
+        'sleep_divergence_minutes': round(sleep_divergence, 1),
+        'sleep_divergence_abs_minutes': round(totals['sleep_divergence_abs'] / count, 1),
+        'virtual_minutes': {
+            'entertainment': round(entertainment, 1),
+            'study': round(study, 1),
+            'rest': round(totals['rest'] / count, 1)
+        },
+        'entertainment_divergence_minutes': round(entertainment - params.target_entertainment_minutes, 1),
+        'study_divergence_minutes': round(study - params.target_study_minutes, 1)
+    }
+
+def _accumulate(totals: Dict, params: ReplayParams, wake_minutes: int,
+                entertainment: float, study: float, rest: float):
+    virtual_wake = approach_time(wake_minutes, params.target_wake_minutes, params.approach_rate)
+    virtual_sleep = virtual_wake + (entertainment + study + rest) / 60
+    divergence = wrap_minutes(virtual_sleep - params.target_sleep_minutes)
+    totals['sleep_divergence'] += divergence
+    totals['sleep_divergence_abs'] += abs(divergence)
+    totals['entertainment'] += entertainment / 60
+    totals['study'] += study / 60
+    totals['rest'] += rest / 60
+
+def _empty_totals() -> Dict:
+    return dict.fromkeys(('sleep_divergence', 'sleep_divergence_abs', 'entertainment', 'study', 'rest'), 0.0)
+
+def study_totals(days: List[DayTrace], study_args: tuple) -> List[float]:
+    totals = []
+    for day in days:
+        study = 0.0
+        for seconds in day.study_segments:
+            study += study_virtual_seconds(seconds, *study_args)
+        totals.append(study)
+    return totals
+
+def evaluate(params: ReplayParams, days: List[DayTrace], study_cache: Dict = None) -> Dict:
+    totals = _empty_totals()
+    entertainment_speed = params.entertainment_speed
+    study_args = (params.study_transition_seconds, params.study_start_speed,
+                  params.study_end_speed, params.study_curve)
+    # Grids usually vary a few speeds at a time, so many candidates share the
+    # same study curve and its per-day totals only need computing once.
+    if study_cache is None:
+        study_cache = {}
+    studies = study_cache.get(study_args)
+    if studies is None:
+        studies = study_cache[study_args] = study_totals(days, study_args)
+
+    for day, study in zip(days, studies):
+        if entertainment_speed is None:
+            entertainment = day.logged_virtual['entertainment']
+        else:
+            entertainment = day.entertainment_seconds * entertainment_speed
+        rest = day.rest_seconds * params.rest_speed + day.break_seconds * params.break_speed
+        _accumulate(totals, params, day.wake_minutes, entertainment, study, rest)
+    return _summarize(params, totals, len(days))
+
+def evaluate_logged(params: ReplayParams, days: List[DayTrace]) -> Dict:
+    totals = _empty_totals()
+    for day in days:
+        logged = day.logged_virtual
+        rest = logged['rest'] + day.tail_seconds * params.rest_speed
+        _accumulate(totals, params, day.wake_minutes, logged['entertainment'], logged['study'], rest)
+    return _summarize(params, totals, len(days))
+
+def validate_override(key: str, value):
+    if key not in TUNABLE_KEYS:
+        raise ValueError(f"Unknown replay parameter: {key}")
+    if key == 'study_curve_type':
+        if value not in STUDY_CURVES:
+            raise ValueError(f"Unknown study_curve_type: {value}")
+    elif key in TIME_KEYS:
+        try:
+            to_minutes(value)
+        except (AttributeError, ValueError, IndexError):
+            raise ValueError(f"Invalid time for {key}: {value}")
+    elif isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{key} must be a number")
+
+def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+    keys = list(grid)
+    values = [v if isinstance(v, list) else [v] for v in grid.values()]
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+def build_candidates(configs: List[Dict] = None, grid: Dict[str, List] = None,
+                     max_configs: int = 10000) -> List[Dict]:
+    candidates = list(configs or [])
+    if grid:
+        count = 1
+        for values in grid.values():
+            count *= len(values) if isinstance(values, list) else 1
+        if count + len(candidates) > max_configs:
+            raise ValueError(f"Too many configurations: {count + len(candidates)} > {max_configs}")
+        candidates.extend(expand_grid(grid))
+    if len(candidates) > max_configs:
+        raise ValueError(f"Too many configurations: {len(candidates)} > {max_configs}")
+
+    for candidate in candidates:
+        if not isinstance(candidate, dict):
+            raise ValueError("Each configuration must be an object")
+        for key, value in candidate.items():
+            validate_override(key, value)
+    return candidates
+
+def _sort_key(sort: str):
+    if sort == 'entertainment':
+        return lambda r: abs(r['entertainment_divergence_minutes'])
+    if sort == 'study':
+        return lambda r: abs(r['study_divergence_minutes'])
+    if sort == 'total':
+        return lambda r: (r['sleep_divergence_abs_minutes']
+                          + abs(r['entertainment_divergence_minutes'])
+                          + abs(r['study_divergence_minutes']))
+    return lambda r: r['sleep_divergence_abs_minutes']
+
+def replay(days: List[DayTrace], candidates: List[Dict], base_config: Dict = None,
+           limit: int = 20, sort: str = 'sleep') -> Dict:
+    started = time.perf_counter()
+    time_config = (base_config or get_config())['time']
+    current = ReplayParams(time_config, {})
+
+    study_cache = {}
+    results = [evaluate(ReplayParams(time_config, overrides), days, study_cache)
+               for overrides in candidates]
+    if days:
+        results.sort(key=_sort_key(sort))
+
+    return {
+        'days': len(days),
+        'users': len({day.user_id for day in days}),
+        'configs': len(candidates),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        'logged': evaluate_logged(current, days),
+        'current': evaluate(current, days, study_cache),
+        'results': results[:limit] if limit else results
+    }
+
+def _parse_value(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+def parse_grid(specs: List[str]) -> Dict[str, List]:
+    grid = {}
+    for spec in specs or []:
+        key, _, values = spec.partition('=')
+        if not values:
+            raise ValueError(f"Grid spec must look like key=v1,v2: {spec}")
+        grid[key.strip()] = [_parse_value(v.strip()) for v in values.split(',') if v.strip()]
+    return grid
+
+def _format_row(label: str, result: Dict) -> str:
+    if not result.get('days'):
+        return f"{label:<8} (no days)"
+    minutes = result['virtual_minutes']
+    return (f"{label:<8} {result['virtual_sleep']:>6} {result['sleep_divergence_minutes']:>+9.1f} "
+            f"{minutes['entertainment']:>8.1f} {minutes['study']:>8.1f} {minutes['rest']:>8.1f}  "
+            f"{json.dumps(result['config'], ensure_ascii=False)}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay stored days under candidate time configs')
+    parser.add_argument('--user', type=int, action='append', required=True, dest='users')
+    parser.add_argument('--start', type=date.fromisoformat)
+    parser.add_argument('--end', type=date.fromisoformat)
+    parser.add_argument('--grid', action='append', default=[],
+                        help='key=v1,v2,... ; repeat to build a cartesian grid')
+    parser.add_argument('--config', action='append', default=[],
+                        help='JSON object of overrides; may be repeated')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--sort', choices=SORT_KEYS, default='sleep')
+    parser.add_argument('--max-configs', type=int,
+                        default=get_config().get('replay', {}).get('max_configs', 10000))
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    end = args.end or date.today()
+    start = args.start or end - timedelta(days=6)
+    try:
+        candidates = build_candidates([json.loads(c) for c in args.config],
+                                      parse_grid(args.grid), args.max_configs)
+    except ValueError as e:
+        parser.error(str(e))
+
+    result = replay(load_days(args.users, start, end), candidates, limit=args.limit, sort=args.sort)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{result['days']} days from {result['users']} users, {result['configs']} configs "
+          f"replayed in {result['elapsed_ms']} ms")
+    print(f"{'':<8} {'sleep':>6} {'vs target':>9} {'ent min':>8} {'study':>8} {'rest':>8}  config")
+    print(_format_row('logged', result['logged']))
+    print(_format_row('current', result['current']))
+    for rank, row in enumerate(result['results'], 1):
+        print(_format_row(f"#{rank}", row))
+
+if __name__ == '__main__':
+    main()
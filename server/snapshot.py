@@ -0,0 +1,34 @@
+import threading
+import time
+from typing import Dict, Optional
+
+import database
+
+def age_seconds() -> float:
+    current = database.backend.snapshot
+    age = current.age_seconds() if current is not None else None
+    return float('nan') if age is None else age
+
+def fallbacks_total() -> int:
+    current = database.backend.snapshot
+    return current.fallbacks_total if current is not None else 0
+
+def _refresh_loop(interval: float):
+    while True:
+        try:
+            database.refresh_snapshot()
+        except Exception as e:
+            print(f"Analytics snapshot refresh failed: {e}")
+        time.sleep(interval)
+
+def start_refresher(config: Dict) -> Optional[threading.Thread]:
+    max_staleness = config.get('max_staleness_seconds', 120)
+    interval = min(config.get('refresh_seconds', 30), max_staleness)
+    if not database.enable_snapshot(max_staleness, config.get('backup_pages', 256),
+                                    config.get('backup_step_sleep_seconds', 0.01)):
+        print(f"Analytics snapshot not supported by the {database.backend.name} backend; reading live")
+        return None
+    thread = threading.Thread(target=_refresh_loop, args=(interval,),
+                              name='analytics-snapshot', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,587 @@
+import glob
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import query_log
+
+# Timestamps are stored the way route code already writes them, as
+# datetime.isoformat(), instead of sqlite3's deprecated default adapter which
+# uses a space separator.
+sqlite3.register_adapter(datetime, datetime.isoformat)
+sqlite3.register_adapter(date, date.isoformat)
+
+class RowSet:
+    # Query results kept as column names plus value tuples, so responses can be
+    # encoded without building a dict per row. Iterating yields dicts for code
+    # that wants them.
+    __slots__ = ('columns', 'rows')
+
+    def __init__(self, columns, rows: list):
+        self.columns = tuple(columns)
+        self.rows = rows
+
+    @classmethod
+    def from_cursor(cls, cursor) -> 'RowSet':
+        return cls([column[0] for column in cursor.description], cursor.fetchall())
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self):
+        columns = self.columns
+        return (dict(zip(columns, row)) for row in self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RowSet(self.columns, self.rows[index])
+        return dict(zip(self.columns, self.rows[index]))
+
+    def to_dicts(self) -> List[Dict]:
+        return list(self)
+
+# database.py owns every query and writes them in the subset of SQL both
+# backends accept, with "?" placeholders. A backend supplies connections and
+# the few pieces that cannot be shared: schema types, change triggers, column
+# migrations, generated ids and storage maintenance.
+
+class _BackupRestarted(Exception):
+    pass
+
+class SQLiteSnapshot:
+    def __init__(self, source_path: str, max_staleness_seconds: float = 120, directory: str = None,
+                 pages: int = 256, step_sleep: float = 0.01, max_restarts: int = 3):
+        self.source_path = source_path
+        self.max_staleness_seconds = max_staleness_seconds
+        self.directory = directory or source_path + '.snapshots'
+        self.pages = pages
+        self.step_sleep = step_sleep
+        self.max_restarts = max_restarts
+        self._refresh_lock = threading.Lock()
+        self._generation = 0
+        # (path, monotonic time the copy started); swapped in one assignment so
+        # a reader sees either the old complete copy or the new one.
+        self._current = None
+        self.refreshes_total = 0
+        self.fallbacks_total = 0
+
+    def _prefix(self) -> str:
+        return os.path.join(self.directory, f"snapshot-{os.getpid()}-")
+
+    def age_seconds(self) -> Optional[float]:
+        current = self._current
+        return None if current is None else time.monotonic() - current[1]
+
+    def refresh(self) -> Dict:
+        with self._refresh_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self._generation += 1
+            path = f"{self._prefix()}{self._generation}.db"
+            started = time.monotonic()
+            source = sqlite3.connect(self.source_path)
+            target = sqlite3.connect(path)
+            try:
+                self._copy(source, target)
+            except _BackupRestarted:
+                # Writes kept landing between steps; take the read lock for one
+                # full copy rather than chase them indefinitely.
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            self._current = (path, started)
+            self.refreshes_total += 1
+            self._remove_old(keep=self._generation - 1, current=path)
+            return {
+                'path': path,
+                'bytes': os.path.getsize(path),
+                'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+            }
+
+    def _copy(self, source, target):
+        # In pages, so writers can commit between steps instead of waiting on
+        # a read lock held for the whole copy.
+        if self.pages <= 0:
+            source.backup(target)
+            return
+        previous = None
+        restarts = 0
+
+        def progress(status, remaining, total):
+            nonlocal previous, restarts
+            # A commit from another connection restarts the copy from page one.
+            if previous is not None and remaining > previous:
+                restarts += 1
+                if restarts > self.max_restarts:
+                    raise _BackupRestarted()
+            previous = remaining
+
+        source.backup(target, pages=self.pages, progress=progress, sleep=self.step_sleep)
+
+    def _remove_old(self, keep: int, current: str):
+        # The previous copy stays until the next refresh, so a reader that has
+        # just picked it up can still open it. Copies left by earlier processes
+        # are removed once they are too old for anyone to be reading them.
+        prefix = self._prefix()
+        stale_before = time.time() - 2 * self.max_staleness_seconds
+        for path in glob.glob(os.path.join(glob.escape(self.directory), 'snapshot-*.db')):
+            if path == current:
+                continue
+            if path.startswith(prefix):
+                try:
+                    remove = int(path[len(prefix):-3]) < keep
+                except ValueError:
+                    continue
+            else:
+                try:
+                    remove = os.path.getmtime(path) < stale_before
+                except OSError:
+                    continue
+            if remove:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def connect(self):
+        current = self._current
+        if current is None or time.monotonic() - current[1] > self.max_staleness_seconds:
+            self.fallbacks_total += 1
+            return None
+        # immutable=1 skips file locking entirely; the copy never changes.
+        uri = Path(current[0]).absolute().as_uri() + '?mode=ro&immutable=1'
+        conn = sqlite3.connect(uri, uri=True, factory=query_log.connection_factory())
+        conn.row_factory = sqlite3.Row
+        return conn
+
+class SQLiteBackend:
+    name = 'sqlite'
+    # Writers are serialized, so change_log.seq is already in commit order.
+    change_position = 'seq'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.snapshot = None
+
+    def enable_snapshot(self, max_staleness_seconds: float = 120, pages: int = 256,
+                        step_sleep: float = 0.01) -> SQLiteSnapshot:
+        if self.snapshot is None:
+            self.snapshot = SQLiteSnapshot(self.path, max_staleness_seconds)
+        self.snapshot.max_staleness_seconds = max_staleness_seconds
+        self.snapshot.pages = pages
+        self.snapshot.step_sleep = step_sleep
+        return self.snapshot
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, factory=query_log.connection_factory())
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def prepare_database(self, cursor):
+        # Only takes effect on a fresh database; existing files are converted
+        # by vacuum(convert=True), i.e. timesetor-admin compact --convert-vacuum.
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    def schema_version(self, cursor) -> int:
+        return cursor.execute("PRAGMA user_version").fetchone()[0]
+
+    def set_schema_version(self, cursor, version: int):
+        cursor.execute(f"PRAGMA user_version = {int(version)}")
+
+    def create_table(self, cursor, ddl: str):
+        cursor.execute(ddl)
+
+    def create_change_trigger(self, cursor, table: str, event: str, entity: str,
+                              row: str, op: str, id_column: str = 'id',
+                              user_column: str = 'user_id', column: str = None):
+        name = f"{table}_change_{column or event.lower()}"
+        event_clause = f"{event} OF {column}" if column else event
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name}
+            AFTER {event_clause} ON {table}
+            BEGIN
+                INSERT INTO change_log (user_id, entity, entity_id, op)
+                VALUES ({row}.{user_column}, '{entity}', {row}.{id_column}, '{op}');
+            END
+        """)
+
+    def prepare_change_log(self, cursor):
+        pass
+
+    def change_log_head(self, cursor) -> int:
+        return cursor.execute("SELECT MAX(seq) FROM change_log").fetchone()[0] or 0
+
+    def add_column(self, cursor, table: str, column: str, definition: str):
+        columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def insert(self, cursor, sql: str, params) -> int:
+        cursor.execute(sql, params)
+        return cursor.lastrowid
+
+    def database_size(self) -> Dict:
+        conn = self.connect()
+        try:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            return {
+                'page_size': page_size,
+                'page_count': page_count,
+                'freelist_count': freelist_count,
+                'bytes': page_size * page_count
+            }
+        finally:
+            conn.close()
+
+    def vacuum(self, pages: int = 0, convert: bool = False) -> Dict:
+        conn = self.connect()
+        try:
+            mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if mode != 2:
+                if not convert:
+                    return {'mode': 'none'}
+                # Switching an existing file to incremental needs one full
+                # VACUUM, which locks and rewrites the whole database.
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+                return {'mode': 'full'}
+            if pages:
+                conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+            else:
+                conn.execute("PRAGMA incremental_vacuum").fetchall()
+            return {'mode': 'incremental'}
+        finally:
+            conn.close()
+
+    def index_health(self, indexes: Dict) -> Dict:
+        conn = self.connect()
+        try:
+            present = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            # integrity_check also cross-checks every index entry against its row.
+            errors = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+            return {
+                'missing': [name for name in indexes if name not in present],
+                'invalid': [],
+                'errors': [] if errors == ['ok'] else errors
+            }
+        finally:
+            conn.close()
+
+    def reindex(self, names: List[str]):
+        conn = self.connect()
+        try:
+            for name in names:
+                conn.execute(f"REINDEX {name}")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def close(self):
+        pass
+
+_PLACEHOLDER_RE = re.compile(r"'(?:[^']|'')*'|\?|%")
+_TYPE_REPLACEMENTS = (
+    (re.compile(r"\b(\w+) INTEGER PRIMARY KEY AUTOINCREMENT"), r"\1 BIGSERIAL PRIMARY KEY"),
+    (re.compile(r"\bINTEGER\b"), "BIGINT"),
+    (re.compile(r"\bREAL\b"), "DOUBLE PRECISION"),
+)
+
+def _translate(sql: str) -> str:
+    def replace(match):
+        token = match.group(0)
+        if token == '?':
+            return '%s'
+        # psycopg reads "%" everywhere, string literals included.
+        return token.replace('%', '%%')
+    return _PLACEHOLDER_RE.sub(replace, sql)
+
+def _to_sqlite_value(value):
+    # Keep rows identical to what the SQLite backend hands back, where dates
+    # and timestamps come back as the ISO strings they were written as.
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+class Row(tuple):
+    __slots__ = ()
+    _columns = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._columns[key])
+        return tuple.__getitem__(self, key)
+
+    def keys(self) -> List[str]:
+        return list(self._columns)
+
+_row_classes = {}
+
+def _row_factory(cursor):
+    names = tuple(column.name for column in cursor.description or ())
+    row_class = _row_classes.get(names)
+    if row_class is None:
+        row_class = _row_classes[names] = type(
+            'Row', (Row,), {'__slots__': (), '_columns': {name: i for i, name in enumerate(names)}})
+
+    def make_row(values):
+        return row_class(_to_sqlite_value(value) for value in values)
+    return make_row
+
+class PostgresCursor:
+    def __init__(self, backend, cursor):
+        self._backend = backend
+        self._cursor = cursor
+
+    def execute(self, sql: str, params=()):
+        self._cursor.execute(self._backend.translate(sql), params)
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        if seq_of_params:
+            self._cursor.executemany(self._backend.translate(sql), seq_of_params)
+        return self
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor.fetchall())
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+class PostgresConnection:
+    def __init__(self, backend, conn):
+        self._backend = backend
+        self._conn = conn
+
+    def cursor(self) -> PostgresCursor:
+        return PostgresCursor(self._backend, self._conn.cursor(row_factory=_row_factory))
+
+    def execute(self, sql: str, params=()) -> PostgresCursor:
+        return self.cursor().execute(sql, params)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        if self._conn is not None:
+            # Reads leave a transaction open; end it before the pool sees it.
+            self._conn.rollback()
+            self._backend.pool.putconn(self._conn)
+            self._conn = None
+
+class PostgresBackend:
+    name = 'postgres'
+    # Reads already use MVCC snapshots here; a read replica URL would be the
+    # equivalent of the SQLite copy.
+    snapshot = None
+    # seq comes from a sequence at insert time, so a transaction can commit a
+    # lower seq after a higher one has been read. Changes are positioned by
+    # the writing transaction's id instead.
+    change_position = 'txid'
+
+    def __init__(self, url: str, min_size: int = 1, max_size: int = 10,
+                 prepare_threshold: int = 0):
+        self.url = url
+        self.min_size = min_size
+        self.max_size = max_size
+        self.prepare_threshold = prepare_threshold
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._translated = {}
+
+    @property
+    def pool(self):
+        # Opened on first use so importing database.py never connects.
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    try:
+                        from psycopg_pool import ConnectionPool
+                    except ImportError:
+                        raise RuntimeError("The postgres backend requires psycopg: "
+                                           "pip install 'psycopg[binary]' psycopg_pool")
+                    # prepare_threshold=0 prepares every statement on first use; the pool
+                    # keeps connections (and their prepared statements) alive across calls.
+                    self._pool = ConnectionPool(
+                        self.url, min_size=self.min_size, max_size=self.max_size, open=True,
+                        kwargs={'prepare_threshold': self.prepare_threshold, 'client_encoding': 'utf8',
+                                'options': '-c timezone=UTC'}
+                    )
+        return self._pool
+
+    def translate(self, sql: str) -> str:
+        translated = self._translated.get(sql)
+        if translated is None:
+            translated = self._translated[sql] = _translate(sql)
+        return translated
+
+    def connect(self) -> PostgresConnection:
+        return PostgresConnection(self, self.pool.getconn())
+
+    def prepare_database(self, cursor):
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION change_log_capture() RETURNS trigger AS $$
+            DECLARE
+                source RECORD;
+            BEGIN
+                IF TG_OP = 'DELETE' THEN source := OLD; ELSE source := NEW; END IF;
+                EXECUTE format('INSERT INTO change_log (user_id, entity, entity_id, op) SELECT ($1).%I, %L, ($1).%I, %L',
+                               TG_ARGV[2], TG_ARGV[0], TG_ARGV[3], TG_ARGV[1])
+                USING source;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+
+    def schema_version(self, cursor) -> int:
+        cursor.execute("SELECT to_regclass('sync_state') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            return 0
+        cursor.execute("SELECT value FROM sync_state WHERE key = 'schema_version'")
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def set_schema_version(self, cursor, version: int):
+        cursor.execute(
+            """INSERT INTO sync_state (key, value) VALUES ('schema_version', ?)
+               ON CONFLICT (key) DO UPDATE SET value = excluded.value""",
+            (version,)
+        )
+
+    def create_table(self, cursor, ddl: str):
+        for pattern, replacement in _TYPE_REPLACEMENTS:
+            ddl = pattern.sub(replacement, ddl)
+        cursor.execute(ddl)
+
+    def create_change_trigger(self, cursor, table: str, event: str, entity: str,
+                              row: str, op: str, id_column: str = 'id',
+                              user_column: str = 'user_id', column: str = None):
+        name = f"{table}_change_{column or event.lower()}"
+        event_clause = f"{event} OF {column}" if column else event
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        cursor.execute(f"""
+            CREATE TRIGGER {name}
+            AFTER {event_clause} ON {table}
+            FOR EACH ROW EXECUTE FUNCTION
+            change_log_capture('{entity}', '{op}', '{user_column}', '{id_column}')
+        """)
+
+    def enable_snapshot(self, max_staleness_seconds: float = 120, pages: int = 256,
+                        step_sleep: float = 0.01):
+        return None
+
+    def prepare_change_log(self, cursor):
+        cursor.execute(
+            """SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'change_log' AND column_name = 'txid'"""
+        )
+        if cursor.fetchone() is None:
+            self.add_column(cursor, 'change_log', 'txid',
+                            "BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint)")
+            # Cursors handed out before were seq values. Marking everything up
+            # to this transaction as pruned makes those clients resync once.
+            cursor.execute(
+                """INSERT INTO sync_state (key, value)
+                   VALUES ('pruned_seq', pg_current_xact_id()::text::bigint)
+                   ON CONFLICT (key) DO UPDATE SET value = excluded.value"""
+            )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_user_txid ON change_log (user_id, txid)")
+
+    def change_log_head(self, cursor) -> int:
+        # Every transaction below the snapshot's xmin has finished, so nothing
+        # can still commit at or below this position.
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint - 1")
+        return cursor.fetchone()[0]
+
+    def add_column(self, cursor, table: str, column: str, definition: str):
+        for pattern, replacement in _TYPE_REPLACEMENTS:
+            definition = pattern.sub(replacement, definition)
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}")
+
+    def insert(self, cursor, sql: str, params) -> int:
+        cursor.execute(sql + " RETURNING id", params)
+        return cursor.fetchone()[0]
+
+    def database_size(self) -> Dict:
+        conn = self.connect()
+        try:
+            size = conn.execute("SELECT pg_database_size(current_database())").fetchone()[0]
+            return {'page_size': 8192, 'page_count': size // 8192, 'freelist_count': 0, 'bytes': size}
+        finally:
+            conn.close()
+
+    def vacuum(self, pages: int = 0, convert: bool = False) -> Dict:
+        # VACUUM cannot run inside a transaction block.
+        conn = self.pool.getconn()
+        try:
+            conn.autocommit = True
+            conn.execute("VACUUM time_logs")
+            return {'mode': 'vacuum'}
+        finally:
+            conn.autocommit = False
+            self.pool.putconn(conn)
+
+    def index_health(self, indexes: Dict) -> Dict:
+        conn = self.connect()
+        try:
+            # An index left behind by a failed CREATE INDEX CONCURRENTLY stays
+            # invalid and is never used by the planner.
+            rows = conn.execute(
+                """SELECT c.relname, i.indisvalid AND i.indisready FROM pg_index i
+                   JOIN pg_class c ON c.oid = i.indexrelid
+                   WHERE c.relname = ANY(?)""",
+                (list(indexes),)
+            ).fetchall()
+            valid = {row[0]: row[1] for row in rows}
+            return {
+                'missing': [name for name in indexes if name not in valid],
+                'invalid': [name for name, ok in valid.items() if not ok],
+                'errors': []
+            }
+        finally:
+            conn.close()
+
+    def reindex(self, names: List[str]):
+        conn = self.connect()
+        try:
+            for name in names:
+                conn.execute(f"REINDEX INDEX {name}")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+def create_backend(path: str, url: Optional[str] = None, pool_size: int = 10):
+    if url and url.startswith(('postgres://', 'postgresql://')):
+        return PostgresBackend(url, max_size=pool_size)
+    if url:
+        raise ValueError(f"Unsupported database URL: {url}")
+    return SQLiteBackend(path)
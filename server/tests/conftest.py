@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+import database
+from storage import create_backend
+
+# Postgres runs only against a scratch database named here; it is written to
+# and its change_log is pruned.
+POSTGRES_URL = os.environ.get('TIMESETOR_TEST_DB_URL')
+
+@pytest.fixture(scope='module', params=['sqlite', 'postgres'])
+def db(request, tmp_path_factory):
+    if request.param == 'postgres':
+        if not POSTGRES_URL:
+            pytest.skip('TIMESETOR_TEST_DB_URL not set')
+        pytest.importorskip('psycopg_pool')
+        backend = create_backend(None, POSTGRES_URL, 4)
+    else:
+        backend = create_backend(str(tmp_path_factory.mktemp('storage') / 'contract.db'), None, 4)
+
+    # database.py reads its backend from a module global on every call, so the
+    # contract can run against each one in turn within a single process.
+    saved = database.backend, database._schema_ready
+    database.backend, database._schema_ready = backend, False
+    try:
+        yield database
+    finally:
+        backend.close()
+        database.backend, database._schema_ready = saved
+
+@pytest.fixture
+def tag() -> str:
+    # Usernames are unique, and a Postgres scratch database outlives the run.
+    return f"{time.time_ns():x}"
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SERVER_DIR
+
+# Importing a module must be cheap and must not touch the database: tools,
+# workers and scripts import these without ever serving a request. Budgets are
+# cumulative `python -X importtime` microseconds on a warm bytecode cache, with
+# enough headroom for a slower machine; TIMESETOR_IMPORT_BUDGET_SCALE adjusts
+# them all at once.
+BUDGETS_US = {
+    'storage': 15000,
+    'database': 20000,
+    'time_engine': 10000,
+    'crypto': 15000,
+    'ai_service': 15000,
+    'user_config': 25000,
+    'compaction': 25000,
+    'replay': 30000,
+    'snapshot': 25000,
+    'ratelimit': 10000,
+    'timer_wheel': 10000,
+    'main': 250000,
+}
+
+# Only needed once a request actually uses them.
+DEFERRED_MODULES = ('requests', 'cryptography', 'yaml', 'psycopg', 'psycopg_pool', 'numpy')
+
+SCALE = float(os.environ.get('TIMESETOR_IMPORT_BUDGET_SCALE', 1.0))
+REPEAT = 3
+
+def import_once(module: str, env: dict):
+    code = (f"import sys; import {module}; "
+            f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=SERVER_DIR,
+                            env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr.strip().splitlines()[-1]
+    cumulative = None
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        # Nested imports are indented under their parent; ours is the top-level row.
+        if len(parts) == 3 and parts[2] == f" {module}":
+            cumulative = int(parts[1])
+    deferred = [m for m in result.stdout.strip().split(',') if m]
+    return cumulative, deferred
+
+@pytest.fixture
+def import_env(tmp_path):
+    db_path = tmp_path / 'import.db'
+    env = dict(os.environ, TIMESETOR_DB_PATH=str(db_path))
+    env.pop('TIMESETOR_DB_URL', None)
+    # Measure cached imports, as a deployed server sees them.
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env, db_path
+
+@pytest.mark.parametrize('module', list(BUDGETS_US))
+def test_import_budget(module, import_env):
+    env, db_path = import_env
+    import_once(module, env)  # warm the bytecode cache
+    best, deferred = min(import_once(module, env) for _ in range(REPEAT))
+    budget = BUDGETS_US[module] * SCALE
+    assert best <= budget, f"import {module} took {best / 1000:.1f} ms, budget {budget / 1000:.1f} ms"
+    assert not deferred, f"import {module} eagerly imports {', '.join(deferred)}"
+    assert not db_path.exists(), f"import {module} creates the database"
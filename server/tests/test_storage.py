@@ -0,0 +1,256 @@
+import time
+from datetime import date, datetime, timedelta
+
+# The database.py contract. Tests only go through the public database
+# functions, so the same tests must pass on every backend the db fixture in
+# conftest.py provides.
+
+def test_users(db, tag):
+    user_id = db.create_user(f"contract_{tag}", 'hash', {'theme': 'dark'})
+    assert isinstance(user_id, int), 'create_user returns an int id'
+    by_name = db.get_user_by_username(f"contract_{tag}")
+    assert by_name['id'] == user_id and by_name['password_hash'] == 'hash', 'lookup by username'
+    assert db.get_user_by_id(user_id)['username'] == f"contract_{tag}", 'lookup by id'
+    assert db.get_user_by_username(f"missing_{tag}") is None, 'unknown username returns None'
+    assert db.update_user_settings(user_id, {'theme': 'light'}), 'settings update reports a change'
+    assert db.get_user_by_id(user_id)['settings'] == '{"theme": "light"}', 'settings stored as JSON text'
+    assert not db.update_user_settings(user_id + 10 ** 6, {}), 'updating a missing user reports no change'
+
+def test_daily_records(db, tag):
+    user_id = db.create_user(f"daily_{tag}", 'hash')
+    today = date.today()
+    record = db.get_or_create_daily_record(user_id, today)
+    assert db.get_or_create_daily_record(user_id, today)['id'] == record['id'], 'get_or_create is idempotent'
+    assert record['date'] == today.isoformat(), 'dates come back as ISO strings'
+    assert record['actual_study_minutes'] == 0 and record['status'] == 'pending', 'column defaults'
+
+    wake = datetime.now().replace(microsecond=0) - timedelta(hours=3)
+    assert db.update_daily_record(record['id'], real_wake_time=wake, status='active'), \
+        'update reports a change'
+    assert not db.update_daily_record(record['id']), 'empty update is a no-op'
+    stored = db.get_daily_record(user_id, today)
+    assert datetime.fromisoformat(stored['real_wake_time']) == wake, 'timestamps round-trip'
+    assert db.get_daily_record(user_id, today - timedelta(days=1)) is None, 'missing day returns None'
+
+    for offset in (1, 2, 3):
+        earlier = db.get_or_create_daily_record(user_id, today - timedelta(days=offset))
+        db.update_daily_record(earlier['id'], real_sleep_time=wake - timedelta(days=offset),
+                               virtual_sleep_time=wake - timedelta(days=offset, minutes=30))
+    recent = db.get_recent_daily_records(user_id, 3)
+    assert [r['date'] for r in recent] == [(today - timedelta(days=n)).isoformat() for n in range(3)], \
+        'recent records newest first'
+    between = db.get_daily_records_between(user_id, today - timedelta(days=2), today - timedelta(days=1))
+    assert [r['date'] for r in between] == [(today - timedelta(days=n)).isoformat() for n in (2, 1)], \
+        'records between dates, oldest first'
+    assert db.get_yesterday_sleep_time(user_id) == wake - timedelta(days=1), 'latest real sleep time'
+    assert db.get_yesterday_virtual_sleep_time(user_id) == wake - timedelta(days=1, minutes=30), \
+        'latest virtual sleep time'
+
+def test_time_logs(db, tag):
+    user_id = db.create_user(f"logs_{tag}", 'hash')
+    day = date.today() - timedelta(days=5)
+    record = db.get_or_create_daily_record(user_id, day)
+    start = datetime.combine(day, datetime.min.time()).replace(hour=8)
+    segments = [('study', 5.0, 'ide'), ('study', 5.0, 'ide'), ('entertainment', 2.0, 'video'),
+                ('rest', 1.0, None), ('rest', 1.0, None), ('rest', 1.0, None)]
+    for i, (activity, speed, app) in enumerate(segments):
+        log_id = db.add_time_log(user_id, record['id'], start + timedelta(minutes=i), activity,
+                                 speed, 60, app, start + timedelta(minutes=i * speed))
+        assert isinstance(log_id, int), 'add_time_log returns an int id'
+
+    logs = db.get_time_logs(user_id, day)
+    assert [log['activity_type'] for log in logs] == [s[0] for s in segments], 'logs ordered by time'
+    assert len(db.get_time_logs_between(user_id, day, day)) == len(segments), 'logs between dates'
+    before = {(r['activity_type'], r['app_name']): r['duration_seconds']
+              for r in db.get_app_time_breakdown(record['id'])}
+
+    compactable = db.get_compactable_daily_records(date.today(), 1, 10000)
+    assert record['id'] in {r['id'] for r in compactable}, 'stale day is compactable'
+    assert db.compact_time_logs(record['id']) == {'rows_before': 6, 'rows_after': 3}, 'runs are merged'
+    assert sum(log['duration_seconds'] for log in db.get_time_logs(user_id, day)) == 360, 'totals kept'
+    after = {(r['activity_type'], r['app_name']): r['duration_seconds']
+             for r in db.get_app_time_breakdown(record['id'])}
+    assert before == after, 'app breakdown survives compaction'
+    assert record['id'] not in {r['id'] for r in db.get_compactable_daily_records(date.today(), 1, 10000)}, \
+        'compacted day is not picked again'
+
+def test_pomodoros(db, tag):
+    user_id = db.create_user(f"pomodoro_{tag}", 'hash')
+    today = date.today()
+    record = db.get_or_create_daily_record(user_id, today)
+    started = datetime.now().replace(microsecond=0)
+    session_id = db.add_pomodoro_session(user_id, record['id'], started, 25, 'work', started)
+    assert isinstance(session_id, int), 'add_pomodoro_session returns an int id'
+    assert db.update_pomodoro_session(session_id, status='completed', actual_duration_minutes=24), \
+        'session update reports a change'
+    assert not db.update_pomodoro_session(session_id), 'empty update is a no-op'
+    sessions = db.get_pomodoro_sessions(user_id, today)
+    assert len(sessions) == 1 and sessions[0]['actual_duration_minutes'] == 24, 'session stored'
+    assert datetime.fromisoformat(sessions[0]['start_time']) == started, 'start time round-trips'
+
+    open_id = db.add_pomodoro_session(user_id, record['id'], started, 25, 'work', started)
+    assert db.pause_pomodoro_session(open_id, started), 'open session pauses'
+    assert not db.pause_pomodoro_session(open_id, started), 'paused session does not pause again'
+    paused = [s for s in db.get_open_pomodoro_sessions() if s['id'] == open_id]
+    assert paused and datetime.fromisoformat(paused[0]['paused_at']) == started, 'pause listed as open'
+    assert db.resume_pomodoro_session(open_id, 90), 'paused session resumes'
+    assert not db.resume_pomodoro_session(open_id, 90), 'running session does not resume'
+    assert db.get_pomodoro_session(open_id)['paused_seconds'] == 90, 'paused time kept'
+    assert db.finish_pomodoro_session(open_id, started, 25), 'open session finishes'
+    assert not db.finish_pomodoro_session(open_id, started, 25, status='interrupted'), \
+        'finished session is not finished twice'
+    assert db.get_pomodoro_session(open_id)['status'] == 'completed', 'first finish wins'
+
+def test_summaries(db, tag):
+    user_id = db.create_user(f"summary_{tag}", 'hash')
+    today = date.today()
+    first = db.add_ai_summary(user_id, 'daily', today, today, 'one', {'n': 1})
+    db.add_ai_summary(user_id, 'weekly', today - timedelta(days=6), today, 'two')
+    assert isinstance(first, int), 'add_ai_summary returns an int id'
+    assert len(db.get_ai_summaries(user_id)) == 2, 'all summaries'
+    daily = db.get_ai_summaries(user_id, 'daily')
+    assert len(daily) == 1 and daily[0]['source_data'] == '{"n": 1}', 'filtered by type'
+    assert daily[0]['period_start'] == today.isoformat(), 'period dates as ISO strings'
+    assert len(db.get_ai_summaries(user_id, limit=1)) == 1, 'limit applies'
+
+def test_devices(db, tag):
+    user_id = db.create_user(f"device_{tag}", 'hash')
+    assert db.register_device(user_id, 'phone', 'Phone', 'android'), 'register_device'
+    db.register_device(user_id, 'phone', 'Phone', 'android')
+    db.register_device(user_id, 'laptop', 'Laptop', 'web')
+    assert len(db.get_user_devices(user_id)) == 2, 'registering twice keeps one row'
+    assert db.get_device_sync_cursor(user_id, 'phone') is None, 'registered device has no cursor until it syncs'
+    assert db.get_device_sync_cursor(user_id, 'tablet') is None, 'unknown device has no cursor'
+    db.set_device_sync_cursor(user_id, 'tablet', 42)
+    db.set_device_sync_cursor(user_id, 'phone', 7)
+    assert db.get_device_sync_cursor(user_id, 'tablet') == 42, 'cursor stored for a new device'
+    assert db.get_device_sync_cursor(user_id, 'phone') == 7, 'cursor updated for a known device'
+    db.set_device_sync_cursor(user_id, 'laptop', 0)
+    assert db.get_device_sync_cursor(user_id, 'laptop') == 0, 'a synced cursor of 0 is kept'
+
+def test_app_usage(db, tag):
+    user_id = db.create_user(f"usage_{tag}", 'hash')
+    now = datetime.now().replace(microsecond=0)
+    yesterday = now - timedelta(days=1)
+    log_id = db.add_app_usage_log(user_id, 'phone', 'com.example', yesterday, 'study', 'Example',
+                                  yesterday + timedelta(minutes=5), 300)
+    assert isinstance(log_id, int), 'add_app_usage_log returns an int id'
+    inserted = db.add_app_usage_logs(user_id, [
+        {'device_id': 'phone', 'app_package': 'com.a', 'start_time': now.isoformat(), 'duration_seconds': 10},
+        {'device_id': 'phone', 'app_package': 'com.b', 'start_time': now.isoformat(), 'activity_type': 'rest'},
+    ])
+    assert inserted == 2, 'bulk insert reports the row count'
+    assert len(db.get_app_usage_logs(user_id, now.date())) == 2, 'usage logs by start date'
+    assert len(db.get_app_usage_logs(user_id, yesterday.date())) == 1, 'earlier day kept apart'
+
+def test_engine_snapshots(db, tag):
+    user_id = db.create_user(f"snapshot_{tag}", 'hash')
+    count = db.count_engine_snapshots()
+    assert db.get_engine_snapshot(user_id) is None, 'no snapshot yet'
+    db.save_engine_snapshot(user_id, {'offset': 1.5})
+    db.save_engine_snapshot(user_id, {'offset': 2.5, 'activity': 'study'})
+    assert db.get_engine_snapshot(user_id) == {'offset': 2.5, 'activity': 'study'}, 'latest snapshot wins'
+    assert db.count_engine_snapshots() == count + 1, 'one snapshot per user'
+    assert user_id not in db.delete_engine_snapshots_before(datetime.now() - timedelta(hours=1)), \
+        'fresh snapshot kept'
+    assert user_id in db.delete_engine_snapshots_before(datetime.now() + timedelta(seconds=1)), \
+        'stale snapshot pruned'
+    assert db.get_engine_snapshot(user_id) is None, 'pruned snapshot gone'
+    db.save_engine_snapshot(user_id, {'offset': 3.5})
+    assert db.delete_engine_snapshot(user_id), 'delete reports a change'
+    assert not db.delete_engine_snapshot(user_id), 'second delete reports nothing'
+
+def test_idempotency_keys(db, tag):
+    user_id = db.create_user(f"idem_{tag}", 'hash')
+    now = datetime.now()
+    later, stale = now + timedelta(hours=1), now - timedelta(minutes=5)
+    assert db.claim_idempotency_key(user_id, 'k1', 'fp', now, later, stale) is None, 'first claim wins'
+    running = db.claim_idempotency_key(user_id, 'k1', 'fp', now, later, stale)
+    assert running['fingerprint'] == 'fp' and running['body'] is None, 'second claim sees the running request'
+    assert db.complete_idempotency_key(user_id, 'k1', 201, '{"id": 1}', 'application/json'), 'complete'
+    done = db.claim_idempotency_key(user_id, 'k1', 'fp', now, later, stale)
+    assert (done['status'], done['body']) == (201, '{"id": 1}'), 'stored response returned'
+    assert not db.release_idempotency_key(user_id, 'k1'), 'a completed key is not released'
+    
+    assert db.claim_idempotency_key(user_id, 'k2', 'fp', now, later, stale) is None
+    assert db.release_idempotency_key(user_id, 'k2'), 'release frees a running key'
+    assert db.claim_idempotency_key(user_id, 'k2', 'fp', now, later, stale) is None, 'released key claimed again'
+    assert db.claim_idempotency_key(user_id, 'k2', 'other', now, later, now + timedelta(seconds=1)) is None, \
+        'a key left running too long is taken over'
+    
+    count = db.count_idempotency_keys()
+    assert db.claim_idempotency_key(user_id, 'k3', 'fp', now, now, stale) is None
+    assert db.prune_idempotency_keys(now + timedelta(seconds=1)) >= 1, 'expired keys pruned'
+    assert db.count_idempotency_keys() <= count, 'pruned key gone'
+    assert db.claim_idempotency_key(user_id, 'k1', 'fp', now, later, stale)['status'] == 201, 'live key kept'
+
+def test_change_log(db, tag):
+    user_id = db.create_user(f"sync_{tag}", 'hash')
+    head = db.get_change_log_head()
+    record = db.get_or_create_daily_record(user_id, date.today())
+    db.update_daily_record(record['id'], actual_study_minutes=10)
+    db.add_time_log(user_id, record['id'], datetime.now(), 'study', 5.0, 60)
+    db.update_user_settings(user_id, {'sync': True})
+
+    cursor = db.get_change_log_head()
+    page = db.get_changes(user_id, head, cursor)
+    changes = page['changes']
+    keyed = {(c['entity'], c['entity_id']): c for c in changes}
+    assert len(changes) == 3, 'one change per row, edits coalesced'
+    assert keyed[('daily_record', record['id'])]['data']['actual_study_minutes'] == 10, \
+        'change carries the current row'
+    assert keyed[('settings', user_id)]['data'] == {'sync': True}, 'settings change carries parsed JSON'
+    assert page['cursor'] == cursor and not page['has_more'], 'a complete page ends at the head'
+    first_page = db.get_changes(user_id, head, cursor, limit=1)
+    assert first_page['has_more'] and first_page['changes'], 'limit applies'
+    rest = db.get_changes(user_id, first_page['cursor'], cursor)['changes']
+    assert sorted(c['seq'] for c in first_page['changes'] + rest) == sorted(c['seq'] for c in changes), \
+        'pages cover every change once'
+
+    assert cursor > head, 'head advances'
+    first = db.add_time_log(user_id, record['id'], datetime.now(), 'study', 5.0, 60)
+    second = db.add_time_log(user_id, record['id'], datetime.now() + timedelta(seconds=1), 'study', 5.0, 60)
+    db.compact_time_logs(record['id'])
+    page = db.get_changes(user_id, cursor, db.get_change_log_head())
+    ops = {c['entity_id']: c['op'] for c in page['changes'] if c['entity'] == 'time_log'}
+    assert ops.get(first) == 'delete' and ops.get(second) == 'upsert', 'merged rows reported deleted'
+
+    if db.backend.name == 'postgres':
+        # A transaction that started first but commits last must not be skipped.
+        cursor = page['cursor']
+        slow = db.get_connection()
+        slow.execute("UPDATE daily_records SET actual_study_minutes = 11 WHERE id = ?", (record['id'],))
+        db.update_user_settings(user_id, {'sync': False})
+        page = db.get_changes(user_id, cursor, db.get_change_log_head())
+        assert not page['changes'], 'head stays behind an open transaction'
+        slow.commit()
+        slow.close()
+        page = db.get_changes(user_id, page['cursor'], db.get_change_log_head())
+        assert {c['entity'] for c in page['changes']} == {'daily_record', 'settings'}, \
+            'late commit delivered after it finishes'
+
+    time.sleep(1.1)
+    removed = db.prune_change_log(0)
+    assert removed > 0, 'prune removes old entries'
+    pruned_seq = db.get_change_log_pruned_seq()
+    assert pruned_seq >= cursor, 'pruned position recorded'
+    db.prune_change_log(0)
+    assert db.get_change_log_pruned_seq() >= pruned_seq, 'pruned position never moves back'
+
+def test_maintenance(db, tag):
+    size = db.get_database_size()
+    assert size['bytes'] > 0, 'database size reported'
+    assert db.incremental_vacuum()['mode'] is not None, 'vacuum runs'
+
+def test_sqlite_vacuum_conversion(tmp_path):
+    # SQLite only: a file created before incremental auto_vacuum is left
+    # alone unless the conversion is asked for explicitly.
+    import sqlite3
+    from storage import create_backend
+    path = str(tmp_path / 'legacy.db')
+    sqlite3.connect(path).execute("CREATE TABLE t (x)").connection.close()
+    backend = create_backend(path, None, 1)
+    assert backend.vacuum()['mode'] == 'none', 'no full VACUUM from routine maintenance'
+    assert backend.vacuum(convert=True)['mode'] == 'full', 'explicit conversion'
+    assert backend.vacuum()['mode'] == 'incremental', 'incremental once converted'
+    backend.close()
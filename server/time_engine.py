@@ -1,4 +1,3 @@
-import yaml
 from datetime import datetime, timedelta, time, date
 from typing import Optional, Dict, Tuple
 import os
@@ -6,26 +5,45 @@ import os
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.yaml")
 
 def load_config():
+    import yaml
     with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
         return yaml.safe_load(f)
 
 _config = None
+_config_mtime = None
+_config_version = 0
+
+def _config_file_mtime():
+    try:
+        return os.stat(CONFIG_PATH).st_mtime_ns
+    except OSError:
+        return None
 
 def get_config():
-    global _config
-    if _config is None:
-        _config = load_config()
+    if _config is None or _config_file_mtime() != _config_mtime:
+        return reload_config()
     return _config
 
 def reload_config():
-    global _config
+    global _config, _config_mtime, _config_version
+    _config_mtime = _config_file_mtime()
     _config = load_config()
+    _config_version += 1
     return _config
 
+def get_config_version() -> int:
+    get_config()
+    return _config_version
+
 def time_str_to_minutes(time_str: str) -> int:
     parts = time_str.split(':')
     return int(parts[0]) * 60 + int(parts[1])
 
+def to_minutes(value) -> int:
+    if isinstance(value, int):
+        return value
+    return time_str_to_minutes(value)
+
 def minutes_to_time_str(minutes: int) -> str:
     hours = (minutes // 60) % 24
     mins = minutes % 60
@@ -52,7 +70,7 @@ def approach_time(current_minutes: int, target_minutes: int, rate: float) -> int
 
 def calculate_virtual_wake_time(real_wake_time: datetime, target_wake_str: str,
                                  approach_rate: float) -> Tuple[datetime, str]:
-    target_minutes = time_str_to_minutes(target_wake_str)
+    target_minutes = to_minutes(target_wake_str)
     real_minutes = real_wake_time.hour * 60 + real_wake_time.minute
     
     virtual_minutes = approach_time(real_minutes, target_minutes, approach_rate)
@@ -70,7 +88,7 @@ def calculate_virtual_wake_time(real_wake_time: datetime, target_wake_str: str,
 
 def calculate_expected_sleep_time(yesterday_sleep: datetime, target_sleep_str: str,
                                    approach_rate: float) -> datetime:
-    target_minutes = time_str_to_minutes(target_sleep_str)
+    target_minutes = to_minutes(target_sleep_str)
     yesterday_minutes = yesterday_sleep.hour * 60 + yesterday_sleep.minute
     
     expected_minutes = approach_time(yesterday_minutes, target_minutes, approach_rate)
@@ -116,28 +134,121 @@ def calculate_entertainment_multiplier(real_wake: datetime, expected_sleep: date
     
     return x
 
+EPOCH = datetime(1970, 1, 1)
+
+ACTIVITIES = ('rest', 'entertainment', 'study', 'sleep', 'pomodoro_break')
+REST, ENTERTAINMENT, STUDY, SLEEP, POMODORO_BREAK = range(len(ACTIVITIES))
+ACTIVITY_CODES = {name: code for code, name in enumerate(ACTIVITIES)}
+
+LINEAR, EXPONENTIAL, EASE_OUT = range(3)
+STUDY_CURVES = {'linear': LINEAR, 'exponential': EXPONENTIAL, 'ease_out': EASE_OUT}
+
+def to_seconds(value: datetime) -> float:
+    return (value - EPOCH).total_seconds()
+
+def from_seconds(seconds: float) -> datetime:
+    return EPOCH + timedelta(seconds=seconds)
+
+class EngineConfig:
+    __slots__ = ('config', 'time_config', 'normal_speed', 'rest_speed',
+                 'entertainment_base_speed', 'break_speed', 'study_start_speed',
+                 'study_end_speed', 'study_curve', 'study_transition_seconds')
+
+    def __init__(self, config: Dict):
+        time_config = config['time']
+        self.config = config
+        self.time_config = time_config
+        self.normal_speed = time_config['normal_speed']
+        self.rest_speed = time_config['rest_speed']
+        self.entertainment_base_speed = time_config['entertainment_base_speed']
+        self.break_speed = time_config.get('break_speed', 1.0)
+        self.study_start_speed = time_config['study_start_speed']
+        self.study_end_speed = time_config['study_end_speed']
+        self.study_curve = STUDY_CURVES.get(time_config.get('study_curve_type', 'linear'), LINEAR)
+        self.study_transition_seconds = time_config.get('study_transition_minutes', 60) * 60
+
+_engine_configs = {}
+_ENGINE_CONFIG_LIMIT = 4096
+
+def intern_engine_config(config: Dict) -> EngineConfig:
+    engine_config = _engine_configs.get(id(config))
+    if engine_config is not None and engine_config.config is config:
+        return engine_config
+    if len(_engine_configs) >= _ENGINE_CONFIG_LIMIT:
+        _engine_configs.clear()
+    engine_config = _engine_configs[id(config)] = EngineConfig(config)
+    return engine_config
+
 class TimeEngine:
+    __slots__ = ('user_id', 'engine_config', 'current_speed', 'activity', 'offset',
+                 'last_update', 'study_start', 'study_planned_duration',
+                 'study_elapsed_seconds', 'entertainment_multiplier')
+
     def __init__(self, user_id: int, config_override: Dict = None):
         self.user_id = user_id
-        self.config = config_override or get_config()
-        self.time_config = self.config['time']
+        self.set_config(config_override or get_config())
         
-        self.current_speed = self.time_config['normal_speed']
-        self.current_activity = 'rest'
+        self.current_speed = self.engine_config.normal_speed
+        self.activity = REST
         
-        self.virtual_time_offset = timedelta(0)
-        self.last_update_time = None
+        self.offset = 0.0
+        self.last_update = None
         
-        self.study_start_time = None
+        self.study_start = None
         self.study_planned_duration = 0
         self.study_elapsed_seconds = 0
+        self.entertainment_multiplier = None
+    
+    def set_config(self, config: Dict):
+        self.engine_config = intern_engine_config(config)
+    
+    @property
+    def config(self) -> Dict:
+        return self.engine_config.config
+    
+    @property
+    def time_config(self) -> Dict:
+        return self.engine_config.time_config
+    
+    @property
+    def current_activity(self) -> str:
+        return ACTIVITIES[self.activity]
+    
+    @current_activity.setter
+    def current_activity(self, activity_type: str):
+        self.activity = ACTIVITY_CODES.get(activity_type, REST)
+    
+    @property
+    def virtual_time_offset(self) -> timedelta:
+        return timedelta(seconds=self.offset)
+    
+    @virtual_time_offset.setter
+    def virtual_time_offset(self, value: timedelta):
+        self.offset = value.total_seconds()
+    
+    @property
+    def last_update_time(self) -> Optional[datetime]:
+        return from_seconds(self.last_update) if self.last_update is not None else None
+    
+    @last_update_time.setter
+    def last_update_time(self, value: Optional[datetime]):
+        self.last_update = to_seconds(value) if value is not None else None
+    
+    @property
+    def study_start_time(self) -> Optional[datetime]:
+        return from_seconds(self.study_start) if self.study_start is not None else None
+    
+    @study_start_time.setter
+    def study_start_time(self, value: Optional[datetime]):
+        self.study_start = to_seconds(value) if value is not None else None
         
     def initialize_day(self, real_wake_time: datetime, 
                        yesterday_sleep: datetime = None,
                        yesterday_virtual_sleep: datetime = None):
-        target_wake = self.time_config['target_wake_time']
-        target_sleep = self.time_config['target_sleep_time']
-        approach_rate = self.time_config['time_approach_rate']
+        time_config = self.engine_config.time_config
+        target_wake = time_config.get('target_wake_minutes', time_config['target_wake_time'])
+        target_sleep = time_config.get('target_sleep_minutes', time_config['target_sleep_time'])
+        approach_rate = time_config['time_approach_rate']
         
         virtual_wake, virtual_wake_display = calculate_virtual_wake_time(
             real_wake_time, target_wake, approach_rate
@@ -148,7 +259,7 @@ class TimeEngine:
                 yesterday_sleep, target_sleep, approach_rate
             )
         else:
-            target_minutes = time_str_to_minutes(target_sleep)
+            target_minutes = to_minutes(target_sleep)
             today = date.today()
             expected_sleep = datetime.combine(today, time(target_minutes // 60, target_minutes % 60))
             if target_minutes < 720:
@@ -157,12 +268,12 @@ class TimeEngine:
         entertainment_multiplier = calculate_entertainment_multiplier(
             real_wake_time, expected_sleep,
             virtual_wake, yesterday_virtual_sleep,
-            self.time_config['target_entertainment_hours'],
-            self.time_config['target_study_hours']
+            time_config['target_entertainment_hours'],
+            time_config['target_study_hours']
         )
         
-        self.virtual_time_offset = virtual_wake - real_wake_time
-        self.last_update_time = real_wake_time
+        self.offset = (virtual_wake - real_wake_time).total_seconds()
+        self.last_update = to_seconds(real_wake_time)
         
         return {
             'virtual_wake_time': virtual_wake,
@@ -175,52 +286,54 @@ class TimeEngine:
                         app_name: str = None,
                         entertainment_apps: list = None,
                         study_apps: list = None):
-        self.current_activity = activity_type
+        activity = ACTIVITY_CODES.get(activity_type, REST)
+        engine_config = self.engine_config
+        self.activity = activity
         
-        if activity_type == 'sleep':
+        if activity == SLEEP:
             self.current_speed = 0
-        elif activity_type == 'entertainment':
-            entertainment_multiplier = getattr(self, 'entertainment_multiplier', 
-                                               self.time_config['entertainment_base_speed'])
-            self.current_speed = entertainment_multiplier
-        elif activity_type == 'study':
-            self.study_start_time = datetime.now()
-            self.study_planned_duration = self.time_config.get('study_transition_minutes', 60) * 60
+        elif activity == ENTERTAINMENT:
+            if self.entertainment_multiplier is not None:
+                self.current_speed = self.entertainment_multiplier
+            else:
+                self.current_speed = engine_config.entertainment_base_speed
+        elif activity == STUDY:
+            self.study_start = to_seconds(datetime.now())
+            self.study_planned_duration = engine_config.study_transition_seconds
             self.current_speed = self._calculate_study_speed()
-        elif activity_type == 'pomodoro_break':
-            self.current_speed = self.time_config.get('break_speed', 1.0)
+        elif activity == POMODORO_BREAK:
+            self.current_speed = engine_config.break_speed
         else:
-            self.current_speed = self.time_config['rest_speed']
+            self.current_speed = engine_config.rest_speed
         
         return self.current_speed
     
     def start_study_session(self, planned_duration_minutes: int):
-        self.study_start_time = datetime.now()
+        self.study_start = to_seconds(datetime.now())
         self.study_planned_duration = planned_duration_minutes * 60
         self.study_elapsed_seconds = 0
-        self.current_activity = 'study'
+        self.activity = STUDY
         
     def _calculate_study_speed(self) -> float:
-        if self.study_start_time is None or self.study_planned_duration <= 0:
-            return self.time_config['study_end_speed']
+        engine_config = self.engine_config
+        end_speed = engine_config.study_end_speed
+        if self.study_start is None or self.study_planned_duration <= 0:
+            return end_speed
         
-        elapsed = (datetime.now() - self.study_start_time).total_seconds()
+        elapsed = to_seconds(datetime.now()) - self.study_start
         self.study_elapsed_seconds = elapsed
         
         if elapsed >= self.study_planned_duration:
-            return self.time_config['study_end_speed']
+            return end_speed
         
         progress = elapsed / self.study_planned_duration
         
-        start_speed = self.time_config['study_start_speed']
-        end_speed = self.time_config['study_end_speed']
-        curve_type = self.time_config.get('study_curve_type', 'linear')
+        start_speed = engine_config.study_start_speed
+        curve = engine_config.study_curve
         
-        if curve_type == 'linear':
-            speed = start_speed - (start_speed - end_speed) * progress
-        elif curve_type == 'exponential':
+        if curve == EXPONENTIAL:
             speed = start_speed * ((end_speed / start_speed) ** progress)
-        elif curve_type == 'ease_out':
+        elif curve == EASE_OUT:
             speed = start_speed - (start_speed - end_speed) * (1 - (1 - progress) ** 2)
         else:
             speed = start_speed - (start_speed - end_speed) * progress
@@ -230,41 +343,65 @@ class TimeEngine:
     def get_virtual_time(self, real_time: datetime = None) -> Tuple[datetime, str]:
         if real_time is None:
             real_time = datetime.now()
+        now = (real_time - EPOCH).total_seconds()
         
-        if self.last_update_time is None:
-            self.last_update_time = real_time
-            return real_time + self.virtual_time_offset, real_time.strftime("%H:%M")
-        
-        elapsed = (real_time - self.last_update_time).total_seconds()
-        virtual_elapsed = elapsed * self.current_speed
+        if self.last_update is None:
+            self.last_update = now
+            return real_time + timedelta(seconds=self.offset), real_time.strftime("%H:%M")
         
-        self.virtual_time_offset += timedelta(seconds=virtual_elapsed - elapsed)
-        self.last_update_time = real_time
+        self.offset += (now - self.last_update) * (self.current_speed - 1)
+        self.last_update = now
         
-        virtual_time = real_time + self.virtual_time_offset
-        display = virtual_time.strftime("%H:%M")
+        virtual_seconds = now + self.offset
+        display = minutes_to_time_str(int(virtual_seconds // 60))
         
-        return virtual_time, display
+        return real_time + timedelta(seconds=self.offset), display
     
     def get_current_speed(self) -> float:
-        if self.current_activity == 'study':
+        if self.activity == STUDY:
             return self._calculate_study_speed()
         return self.current_speed
     
     def set_entertainment_multiplier(self, multiplier: float):
         self.entertainment_multiplier = multiplier
-        if self.current_activity == 'entertainment':
+        if self.activity == ENTERTAINMENT:
             self.current_speed = multiplier
     
     def record_sleep(self, real_sleep_time: datetime) -> Tuple[datetime, str]:
         virtual_time, display = self.get_virtual_time(real_sleep_time)
         return virtual_time, display
     
+    def to_snapshot(self) -> Dict:
+        last_update_time = self.last_update_time
+        study_start_time = self.study_start_time
+        return {
+            'current_speed': self.current_speed,
+            'current_activity': ACTIVITIES[self.activity],
+            'virtual_time_offset': self.offset,
+            'last_update_time': last_update_time.isoformat() if last_update_time else None,
+            'study_start_time': study_start_time.isoformat() if study_start_time else None,
+            'study_planned_duration': self.study_planned_duration,
+            'study_elapsed_seconds': self.study_elapsed_seconds,
+            'entertainment_multiplier': self.entertainment_multiplier
+        }
+    
+    def restore_snapshot(self, snapshot: Dict):
+        self.current_speed = snapshot['current_speed']
+        self.current_activity = snapshot['current_activity']
+        self.offset = float(snapshot['virtual_time_offset'])
+        last_update = snapshot.get('last_update_time')
+        self.last_update_time = datetime.fromisoformat(last_update) if last_update else None
+        study_start = snapshot.get('study_start_time')
+        self.study_start_time = datetime.fromisoformat(study_start) if study_start else None
+        self.study_planned_duration = snapshot.get('study_planned_duration', 0)
+        self.study_elapsed_seconds = snapshot.get('study_elapsed_seconds', 0)
+        self.entertainment_multiplier = snapshot.get('entertainment_multiplier')
+    
     def get_study_progress(self) -> Dict:
-        if self.study_start_time is None:
+        if self.study_start is None:
             return {'active': False}
         
-        elapsed = (datetime.now() - self.study_start_time).total_seconds()
+        elapsed = to_seconds(datetime.now()) - self.study_start
         progress = min(1.0, elapsed / self.study_planned_duration) if self.study_planned_duration > 0 else 0
         
         return {
@@ -294,18 +431,14 @@ def calculate_daily_stats(real_wake: datetime, real_sleep: datetime,
     }
     
     for log in time_logs:
-        duration_minutes = log.get('duration_seconds', 0) / 60
-        speed = log.get('speed_multiplier', 1.0)
-        activity = log.get('activity_type', 'rest')
-        
-        if activity == 'entertainment':
-            stats['entertainment_minutes'] += duration_minutes
-            stats['virtual_entertainment_minutes'] += duration_minutes * speed
-        elif activity == 'study':
-            stats['study_minutes'] += duration_minutes
-            stats['virtual_study_minutes'] += duration_minutes * speed
-        else:
-            stats['rest_minutes'] += duration_minutes
-            stats['virtual_rest_minutes'] += duration_minutes * speed
+        duration = log.get('duration_seconds', 0)
+        add_activity_minutes(stats, log.get('activity_type', 'rest'), duration,
+                             duration * log.get('speed_multiplier', 1.0))
     
     return stats
+
+def add_activity_minutes(stats: Dict, activity: str, duration_seconds: float, virtual_seconds: float):
+    # Everything that is neither entertainment nor study counts as rest.
+    kind = activity if activity in ('entertainment', 'study') else 'rest'
+    stats[f'{kind}_minutes'] += duration_seconds / 60
+    stats[f'virtual_{kind}_minutes'] += virtual_seconds / 60
@@ -0,0 +1,85 @@
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Tuple
+
+class TimerWheel:
+    def __init__(self, tick_seconds: float = 1.0, slots: int = 4096):
+        # Hashed timing wheel: a timer lives in the slot its deadline tick maps
+        # to, so scheduling and cancelling are a couple of dict operations
+        # however many timers are pending. Deadlines further out than one turn
+        # simply stay in their slot until the wheel comes round to their tick.
+        self.tick_seconds = tick_seconds
+        self._slots: List[Dict[Hashable, Tuple[int, float, object]]] = [{} for _ in range(slots)]
+        self._timers: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self._tick = self._tick_of(time.time())
+        self.fired_total = 0
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def _tick_of(self, deadline: float) -> int:
+        return int(deadline // self.tick_seconds)
+
+    def schedule(self, key: Hashable, deadline: float, payload=None):
+        # One timer per key; scheduling again replaces the earlier one.
+        tick = self._tick_of(deadline)
+        with self._lock:
+            if tick < self._tick:
+                tick = self._tick  # already due, fire on the next advance
+            slot = self._timers.pop(key, None)
+            if slot is not None:
+                self._slots[slot].pop(key, None)
+            slot = tick % len(self._slots)
+            self._slots[slot][key] = (tick, deadline, payload)
+            self._timers[key] = slot
+
+    def get(self, key: Hashable):
+        with self._lock:
+            slot = self._timers.get(key)
+            return None if slot is None else self._slots[slot][key][2]
+
+    def cancel(self, key: Hashable):
+        with self._lock:
+            slot = self._timers.pop(key, None)
+            if slot is None:
+                return None
+            return self._slots[slot].pop(key)[2]
+
+    def advance(self, now: float = None) -> List[Tuple[Hashable, object]]:
+        # Returns (key, payload) for every timer due by `now`, in tick order.
+        if now is None:
+            now = time.time()
+        target = self._tick_of(now)
+        due = []
+        with self._lock:
+            # After a long stall every slot gets visited once, not once per tick.
+            stop = min(target, self._tick + len(self._slots) - 1)
+            while self._tick <= stop:
+                slot = self._slots[self._tick % len(self._slots)]
+                expired = [key for key, (tick, _, _) in slot.items() if tick <= target]
+                for key in expired:
+                    due.append((key, slot.pop(key)[2]))
+                    del self._timers[key]
+                self._tick += 1
+            self._tick = max(self._tick, target + 1)
+            self.fired_total += len(due)
+        return due
+
+    def run(self, callback: Callable[[Hashable, object], None], stop: threading.Event = None):
+        stop = stop or threading.Event()
+        while not stop.wait(self.tick_seconds - time.time() % self.tick_seconds):
+            # Callbacks run outside the lock so they may schedule new timers.
+            for key, payload in self.advance():
+                try:
+                    callback(key, payload)
+                except Exception as e:
+                    print(f"Timer {key!r} failed: {e}")
+
+    def start(self, callback: Callable[[Hashable, object], None], name: str = 'timer-wheel') -> threading.Thread:
+        thread = threading.Thread(target=self.run, args=(callback,), name=name, daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,122 @@
+import json
+import threading
+from typing import Callable, Dict, Optional
+
+from database import get_user_by_id
+from time_engine import STUDY_CURVES, get_config, get_config_version, time_str_to_minutes
+
+TIME_KEYS = ('target_wake_time', 'target_sleep_time', 'initial_wake_time', 'initial_sleep_time')
+
+class EffectiveConfig:
+    __slots__ = ('user_id', 'config_version', 'settings', 'config')
+
+    def __init__(self, user_id: int, config_version: int, settings: Dict, config: Dict):
+        self.user_id = user_id
+        self.config_version = config_version
+        self.settings = settings
+        self.config = config
+
+def _is_time(value) -> bool:
+    try:
+        time_str_to_minutes(value)
+        return True
+    except (AttributeError, ValueError, IndexError, TypeError):
+        return False
+
+def _number(low: float, high: float, low_open: bool = False) -> Callable[[object], bool]:
+    def check(value) -> bool:
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return False
+        return (value > low if low_open else value >= low) and value <= high
+    return check
+
+_speed = _number(0, 100, low_open=True)
+
+# The only `time` keys a user may override, each with the range the engine
+# can work with. Anything else in their settings is ignored, so a bad value
+# (a zero speed, say) cannot break every later request for that user.
+USER_TUNABLE = {
+    'target_wake_time': _is_time,
+    'target_sleep_time': _is_time,
+    'initial_wake_time': _is_time,
+    'initial_sleep_time': _is_time,
+    'target_entertainment_hours': _number(0, 24),
+    'target_study_hours': _number(0, 24),
+    'time_approach_rate': _number(0, 1, low_open=True),
+    'normal_speed': _speed,
+    'rest_speed': _speed,
+    'entertainment_base_speed': _speed,
+    'break_speed': _speed,
+    'study_start_speed': _speed,
+    'study_end_speed': _speed,
+    'study_curve_type': lambda value: value in STUDY_CURVES,
+    'study_transition_minutes': _number(0, 24 * 60),
+}
+
+def compile_config(global_config: Dict, settings: Dict) -> Dict:
+    time_config = dict(global_config['time'])
+    for key, value in (settings or {}).items():
+        check = USER_TUNABLE.get(key)
+        if check is not None and key in time_config and check(value):
+            time_config[key] = value
+
+    for key in TIME_KEYS:
+        if key in time_config:
+            time_config[key.replace('_time', '_minutes')] = time_str_to_minutes(time_config[key])
+
+    config = dict(global_config)
+    config['time'] = time_config
+    return config
+
+def _load_settings(user_id: int) -> Dict:
+    user = get_user_by_id(user_id)
+    if not user or not user['settings']:
+        return {}
+    return json.loads(user['settings'])
+
+_settings_loader = _load_settings
+MAX_CACHED_USERS = 10000
+_cache = {}
+_shared = (None, None)
+_lock = threading.Lock()
+
+def _intern(config: Dict, version: int) -> Dict:
+    global _shared
+    shared_version, shared = _shared
+    if shared_version != version:
+        shared = compile_config(get_config(), {})
+        _shared = (version, shared)
+    # Users without effective overrides all share one compiled config, so
+    # their engines share one EngineConfig as well.
+    return shared if config['time'] == shared['time'] else config
+
+def set_settings_loader(loader: Callable[[int], Dict]):
+    global _settings_loader
+    _settings_loader = loader
+    _cache.clear()
+
+def get_effective_config(user_id: int) -> EffectiveConfig:
+    version = get_config_version()
+    effective = _cache.get(user_id)
+    if effective is not None and effective.config_version == version:
+        return effective
+
+    settings = _settings_loader(user_id) or {}
+    config = _intern(compile_config(get_config(), settings), version)
+    effective = EffectiveConfig(user_id, version, settings, config)
+    with _lock:
+        if len(_cache) >= MAX_CACHED_USERS:
+            # Clearing is cheaper than LRU bookkeeping and the hot set refills fast.
+            _cache.clear()
+        _cache[user_id] = effective
+    return effective
+
+def get_user_settings(user_id: int) -> Dict:
+    return get_effective_config(user_id).settings
+
+def invalidate(user_id: Optional[int] = None):
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
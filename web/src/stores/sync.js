@@ -0,0 +1,73 @@
+import { defineStore } from 'pinia'
+import { ref, computed } from 'vue'
+import api from '../utils/api'
+
+function localDate(offsetDays = 0) {
+  const date = new Date()
+  date.setDate(date.getDate() + offsetDays)
+  const pad = (n) => String(n).padStart(2, '0')
+  return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())}`
+}
+
+function deviceId() {
+  let id = localStorage.getItem('deviceId')
+  if (!id) {
+    id = `web-${Date.now().toString(36)}${Math.random().toString(36).slice(2, 8)}`
+    localStorage.setItem('deviceId', id)
+  }
+  return id
+}
+
+export const useSyncStore = defineStore('sync', () => {
+  const cacheKey = () => `syncCache:${localStorage.getItem('userId') || ''}`
+  const saved = JSON.parse(localStorage.getItem(cacheKey()) || '{}')
+  const cursor = ref(saved.cursor ?? null)
+  const records = ref(saved.records || {})
+  const summaries = ref(saved.summaries || {})
+  let pulling = null
+
+  const todayRecord = computed(() => Object.values(records.value).find((r) => r.date === localDate()) || null)
+  const weeklyRecords = computed(() => {
+    const since = localDate(-6)
+    return Object.values(records.value).filter((r) => r.date >= since).sort((a, b) => b.date.localeCompare(a.date))
+  })
+  const summaryList = computed(() => Object.values(summaries.value).sort((a, b) => b.id - a.id))
+
+  function persist() {
+    localStorage.setItem(cacheKey(), JSON.stringify({ cursor: cursor.value, records: records.value, summaries: summaries.value }))
+  }
+
+  async function reload() {
+    const [yearly, summaryResponse] = await Promise.all([api.get('/data/yearly', { params: { live: 1 } }), api.get('/summaries', { params: { limit: 100 } })])
+    records.value = Object.fromEntries((yearly.data.records || []).map((r) => [r.id, r]))
+    summaries.value = Object.fromEntries((summaryResponse.data.summaries || []).map((s) => [s.id, s]))
+  }
+
+  function apply(change) {
+    const target = change.entity === 'daily_record' ? records : change.entity === 'ai_summary' ? summaries : null
+    if (!target) return
+    if (change.op === 'delete') delete target.value[change.entity_id]
+    else target.value[change.entity_id] = change.data
+  }
+
+  async function run() {
+    for (;;) {
+      const params = { device_id: deviceId() }
+      if (cursor.value !== null) params.cursor = cursor.value
+      const response = await api.get('/sync', { params })
+      const { reset, changes, has_more: hasMore } = response.data
+      if (reset) await reload()
+      changes.forEach(apply)
+      cursor.value = response.data.cursor
+      persist()
+      if (!hasMore) return
+    }
+  }
+
+  function pull() {
+    if (!pulling) pulling = run().catch(() => {}).finally(() => { pulling = null })
+    return pulling
+  }
+
+  return { cursor, todayRecord, weeklyRecords, summaryList, pull }
+})
@@ -10,17 +10,49 @@ export const useTimeStore = defineStore('time', () => {
   const status = ref('unknown')
   const isAwake = computed(() => status.value === 'awake')
   let updateInterval = null
+  let stateStream = null
+  let live = false
+  let version = -1
 
-  async function fetchCurrentTime() {
-    try {
-      const response = await api.get('/time/current')
-      status.value = response.data.status
-      virtualTime.value = response.data.virtual_time_display || ''
-      realTime.value = response.data.real_time || ''
-      currentSpeed.value = response.data.current_speed || 1.0
-      currentActivity.value = response.data.current_activity || 'rest'
-      return response.data
-    } catch (error) { return null }
+  // Only the async server streams; otherwise long-poll /time/changes, which
+  // answers as soon as the state changes or after the timeout.
+  async function startStream() {
+    if (live || !localStorage.getItem('token')) return
+    live = true
+    if (typeof EventSource !== 'undefined') {
+      try {
+        const response = await api.post('/time/stream/token')
+        if (!live) return
+        stateStream = new EventSource(`/api/time/stream?token=${encodeURIComponent(response.data.token)}`)
+        stateStream.addEventListener('state', (event) => applyState(JSON.parse(event.data)))
+        // The token only opens a stream for a minute, so a reconnect that
+        // the browser gave up on starts over with a fresh one.
+        stateStream.onerror = () => {
+          if (stateStream?.readyState !== EventSource.CLOSED) return
+          stopStream()
+          setTimeout(() => { if (updateInterval) startStream() }, 5000)
+        }
+        return
+      } catch (error) {}
+    }
+    pollChanges()
+  }
+
+  async function pollChanges() {
+    while (live) {
+      try {
+        const response = await api.get('/time/changes', { params: { since: version, timeout: 25 }, timeout: 35000 })
+        version = response.data.version
+        applyState(response.data)
+      } catch (error) {
+        await new Promise((resolve) => setTimeout(resolve, 5000))
+      }
+    }
+  }
+
+  function stopStream() {
+    live = false
+    if (stateStream) { stateStream.close(); stateStream = null }
   }
 
   async function recordWake() {
@@ -55,11 +87,13 @@ export const useTimeStore = defineStore('time', () => {
   }
 
   function startAutoUpdate() {
+    startStream()
     if (updateInterval) return
     updateInterval = setInterval(fetchCurrentTime, 1000)
   }
 
   function stopAutoUpdate() {
+    stopStream()
     if (updateInterval) { clearInterval(updateInterval); updateInterval = null }
   }
 
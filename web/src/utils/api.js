@@ -6,9 +6,24 @@ const api = axios.create({
   headers: { 'Content-Type': 'application/json' }
 })
 
+const WRITE_METHODS = ['post', 'put', 'patch', 'delete']
+const MAX_WRITE_RETRIES = 2
+
+function idempotencyKey() {
+  if (window.crypto?.randomUUID) return window.crypto.randomUUID()
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`
+}
+
 api.interceptors.request.use((config) => {
   const token = localStorage.getItem('token')
   if (token) { config.headers.Authorization = `Bearer ${token}` }
+  const deviceId = localStorage.getItem('deviceId')
+  if (deviceId) { config.headers['X-Device-Id'] = deviceId }
+  // One key per write; a retry of the same config keeps it, so the server
+  // replays the first response instead of applying the write twice.
+  if (WRITE_METHODS.includes(config.method) && !config.headers['Idempotency-Key']) {
+    config.headers['Idempotency-Key'] = idempotencyKey()
+  }
   return config
 }, (error) => Promise.reject(error))
 
@@ -18,7 +33,16 @@ api.interceptors.response.use((response) => response, (error) => {
     localStorage.removeItem('userId')
     window.location.href = '/login'
   }
+  const config = error.config
+  // No response means the write may or may not have landed: resend it under
+  // the same key.
+  if (config?.headers?.['Idempotency-Key'] && !error.response) {
+    config.writeRetries = (config.writeRetries || 0) + 1
+    if (config.writeRetries <= MAX_WRITE_RETRIES) {
+      return new Promise((resolve) => setTimeout(resolve, 500 * config.writeRetries)).then(() => api(config))
+    }
+  }
   return Promise.reject(error)
 })
 
-export default api
\ No newline at end of file
+export default api